@@ -2,19 +2,28 @@
 
 import os
 import json
-import shutil
 import logging
 from datetime import datetime
+from dataclasses import asdict
 
-from flask import Flask, render_template, request, jsonify, redirect, url_for
+from flask import Flask, Response, render_template, request, jsonify, redirect, url_for
 from werkzeug.middleware.proxy_fix import ProxyFix
 
 from database import db
 from models import User, PasswordResetToken, GroceryList  # OAuth model not required
-from folder_manager import FolderManager
-from recipe_extractor import extract_recipe_from_url, create_manual_recipe, save_recipe_to_file, Recipe
-from meal_planner import load_recipes_from_directory, parse_ingredient_line_with_gemini, consolidate_ingredients
-from smart_recipe_search import search_local_recipes, search_web_recipes_simple, save_search_result_to_file
+from recipe_extractor import extract_recipe_from_url, create_manual_recipe, Recipe
+from meal_planner import load_recipes_from_directory, ingredient_cache
+from recipe_enrichment import (get_stored_structured_ingredients, iter_structured_ingredients,
+                               load_structured_ingredients, lookup_structured_ingredients)
+from meal_plan_jobs import meal_plan_jobs
+from llm_client import llm_client
+from grocery_aggregate import GroceryAggregate, is_grocery_aggregate
+from recipe_manifest import get_recipe_manifest
+from recipe_cache import recipe_cache
+from recipe_repository import get_recipe_repository, import_recipes_to_database
+from recipe_autocomplete import MAX_SUGGESTIONS, recipe_name_candidates, recipe_name_variant, resolve_recipe_name, suggest
+from smart_recipe_search import (MAX_SEARCH_PAGE_SIZE, search_by_pantry, search_saved_recipes,
+                                 search_web_recipes_simple, save_search_result_to_file)
 
 from flask_login import (LoginManager, login_required, current_user,
                          logout_user, login_user)
@@ -116,16 +125,40 @@ def _debug_redirect():
     except Exception:
         return base + "/google_login/callback"
 
+# Internal cache and LLM counters are per process, so they are served over HTTP
+# rather than the CLI; only to signed-in users, and only when STATS_ROUTES=1
+STATS_ROUTES_ENABLED = os.environ.get("STATS_ROUTES", "0") == "1"
+
+
+def _stats_response(stats):
+    if not STATS_ROUTES_ENABLED:
+        return jsonify({'error': 'Not found'}), 404
+    return jsonify(stats())
+
+
+@app.route("/_ingredient_cache_stats")
+@login_required
+def _ingredient_cache_stats():
+    return _stats_response(ingredient_cache.stats)
+
+
+@app.route("/_recipe_cache_stats")
+@login_required
+def _recipe_cache_stats():
+    return _stats_response(recipe_cache.stats)
+
+
+@app.route("/_llm_stats")
+@login_required
+def _llm_stats():
+    return _stats_response(llm_client.stats)
+
 
 @app.route('/api/folders', methods=['GET'])
 @login_required
 def get_folders():
     """Get all folders with recipe counts for the current user."""
-    # Use user-specific folder manager
-    user_folder_manager = FolderManager(
-        folders_file=f"user_data/{current_user.id}/folders.json",
-        recipes_dir=f"user_data/{current_user.id}/saved_recipes")
-    folders = user_folder_manager.get_all_folders()
+    folders = get_recipe_repository(current_user.id).list_folders()
     folder_list = []
     for folder in folders:
         folder_list.append({
@@ -148,10 +181,7 @@ def create_folder():
         return jsonify({'error': 'Folder name is required'}), 400
 
     try:
-        user_folder_manager = FolderManager(
-            folders_file=f"user_data/{current_user.id}/folders.json",
-            recipes_dir=f"user_data/{current_user.id}/saved_recipes")
-        folder = user_folder_manager.create_folder(name)
+        folder = get_recipe_repository(current_user.id).create_folder(name)
         return jsonify({
             'success': True,
             'folder': {
@@ -176,10 +206,7 @@ def rename_folder(folder_id):
         return jsonify({'error': 'Folder name is required'}), 400
 
     try:
-        user_folder_manager = FolderManager(
-            folders_file=f"user_data/{current_user.id}/folders.json",
-            recipes_dir=f"user_data/{current_user.id}/saved_recipes")
-        success = user_folder_manager.rename_folder(folder_id, new_name)
+        success = get_recipe_repository(current_user.id).rename_folder(folder_id, new_name)
         if success:
             return jsonify({
                 'success': True,
@@ -196,10 +223,7 @@ def rename_folder(folder_id):
 def delete_folder(folder_id):
     """Delete a folder for the current user."""
     try:
-        user_folder_manager = FolderManager(
-            folders_file=f"user_data/{current_user.id}/folders.json",
-            recipes_dir=f"user_data/{current_user.id}/saved_recipes")
-        success = user_folder_manager.delete_folder(folder_id)
+        success = get_recipe_repository(current_user.id).delete_folder(folder_id)
         if success:
             return jsonify({
                 'success': True,
@@ -217,35 +241,8 @@ def delete_folder(folder_id):
 def get_folder_recipes(folder_id):
     """Get all recipes in a specific folder for the current user."""
     try:
-        folder_path = os.path.join(
-            f"user_data/{current_user.id}/saved_recipes", folder_id)
-        if not os.path.exists(folder_path):
-            return jsonify([])
-
-        recipes = []
-        for filename in os.listdir(folder_path):
-            if filename.endswith('.json'):
-                filepath = os.path.join(folder_path, filename)
-                try:
-                    with open(filepath, 'r', encoding='utf-8') as f:
-                        data = json.load(f)
-                        recipe = Recipe.model_validate(data)
-                        recipes.append({
-                            'name':
-                            recipe.name,
-                            'serving_size':
-                            recipe.serving_size,
-                            'ingredients_count':
-                            len(recipe.ingredients),
-                            'instructions_count':
-                            len(recipe.instructions),
-                            'folder_id':
-                            folder_id
-                        })
-                except Exception as e:
-                    print(f"Error loading recipe from {filename}: {e}")
-
-        return jsonify(recipes)
+        recipes = get_recipe_repository(current_user.id).list_recipes(folder_id)
+        return jsonify([summary.to_dict() for summary in recipes])
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -255,39 +252,14 @@ def get_folder_recipes(folder_id):
 def get_recipes():
     """Get all saved recipes organized by folders for the current user."""
     try:
-        user_folder_manager = FolderManager(
-            folders_file=f"user_data/{current_user.id}/folders.json",
-            recipes_dir=f"user_data/{current_user.id}/saved_recipes")
-        folders = user_folder_manager.get_all_folders()
+        repository = get_recipe_repository(current_user.id)
+        folder_names = {folder.id: folder.name for folder in repository.list_folders()}
         all_recipes = []
 
-        for folder in folders:
-            folder_path = os.path.join(
-                f"user_data/{current_user.id}/saved_recipes", folder.id)
-            if os.path.exists(folder_path):
-                for filename in os.listdir(folder_path):
-                    if filename.endswith('.json'):
-                        filepath = os.path.join(folder_path, filename)
-                        try:
-                            with open(filepath, 'r', encoding='utf-8') as f:
-                                data = json.load(f)
-                                recipe = Recipe.model_validate(data)
-                                all_recipes.append({
-                                    'name':
-                                    recipe.name,
-                                    'serving_size':
-                                    recipe.serving_size,
-                                    'ingredients_count':
-                                    len(recipe.ingredients),
-                                    'instructions_count':
-                                    len(recipe.instructions),
-                                    'folder_id':
-                                    folder.id,
-                                    'folder_name':
-                                    folder.name
-                                })
-                        except Exception as e:
-                            print(f"Error loading recipe from {filename}: {e}")
+        for summary in repository.list_recipes():
+            if summary.folder_id not in folder_names:
+                continue
+            all_recipes.append({**summary.to_dict(), 'folder_name': folder_names[summary.folder_id]})
 
         return jsonify(all_recipes)
     except Exception as e:
@@ -299,36 +271,75 @@ def get_recipes():
 def get_recipe_details(folder_id, recipe_name):
     """Get details for a specific recipe in a folder for the current user."""
     try:
-        folder_path = os.path.join(
-            f"user_data/{current_user.id}/saved_recipes", folder_id)
-
-        # Use consistent filename generation (same as in recipe_extractor.py)
-        filename = "".join(c if c.isalnum() else "_"
-                           for c in recipe_name).lower()
-        filepath = os.path.join(folder_path, f"{filename}.json")
-
-        if os.path.exists(filepath):
-            with open(filepath, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                recipe = Recipe.model_validate(data)
-                return jsonify(recipe.model_dump())
-
-        # If not found, try to find any file in the folder that matches
-        if os.path.exists(folder_path):
-            for file in os.listdir(folder_path):
-                if file.endswith('.json'):
-                    with open(os.path.join(folder_path, file),
-                              'r',
-                              encoding='utf-8') as f:
-                        try:
-                            data = json.load(f)
-                            recipe = Recipe.model_validate(data)
-                            if recipe.name == recipe_name:
-                                return jsonify(recipe.model_dump())
-                        except:
-                            continue
-
-        return jsonify({'error': 'Recipe not found'}), 404
+        repository = get_recipe_repository(current_user.id)
+        recipe = repository.get_recipe(folder_id, recipe_name)
+        if recipe is None:
+            # The same name in a different case or punctuation, e.g. a sanitized filename
+            recipe_id = recipe_name_variant(repository, recipe_name, folder_id)
+            found = repository.get_recipe_by_id(recipe_id) if recipe_id else None
+            recipe = found[1] if found else None
+        if recipe:
+            return jsonify(recipe.model_dump())
+
+        # Only with ?resolve=1 is the closest match opened (a typo, or a recipe in
+        # another folder, which folder_id reports); otherwise the caller gets the
+        # candidates to choose from
+        if request.args.get('resolve') == '1':
+            recipe_id = resolve_recipe_name(repository, recipe_name, folder_id)
+            found = repository.get_recipe_by_id(recipe_id) if recipe_id else None
+            if found:
+                return jsonify({**found[1].model_dump(), 'folder_id': found[0]})
+
+        candidates = recipe_name_candidates(repository, recipe_name)[:5]
+        return jsonify({'error': 'Recipe not found',
+                        'candidates': [asdict(candidate) for candidate in candidates]}), 404
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/recipes/<recipe_id>', methods=['GET'])
+@login_required
+def get_recipe_by_id(recipe_id):
+    """Get a saved recipe by its ID, wherever it is filed."""
+    try:
+        found = get_recipe_repository(current_user.id).get_recipe_by_id(recipe_id)
+        if not found:
+            return jsonify({'error': 'Recipe not found'}), 404
+
+        folder_id, recipe = found
+        return jsonify({**recipe.model_dump(), 'folder_id': folder_id})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/recipes/<recipe_id>', methods=['DELETE'])
+@login_required
+def delete_recipe_by_id(recipe_id):
+    """Delete a saved recipe by its ID."""
+    try:
+        if not get_recipe_repository(current_user.id).delete_recipe_by_id(recipe_id):
+            return jsonify({'error': 'Recipe not found'}), 404
+
+        return jsonify({'success': True, 'message': 'Recipe deleted successfully'})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/recipes/<recipe_id>/move', methods=['POST'])
+@login_required
+def move_recipe_by_id(recipe_id):
+    """Move a saved recipe, addressed by ID, to another folder."""
+    data = request.get_json()
+    target_folder = data.get('target_folder')
+
+    if not target_folder:
+        return jsonify({'error': 'Missing required parameters'}), 400
+
+    try:
+        if not get_recipe_repository(current_user.id).move_recipe_by_id(recipe_id, target_folder):
+            return jsonify({'error': 'Recipe not found'}), 404
+
+        return jsonify({'success': True, 'message': f'Recipe moved successfully to {target_folder}'})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -347,25 +358,14 @@ def extract_recipe():
     try:
         recipe = extract_recipe_from_url(url)
         if recipe:
-            # Ensure user directory exists
-            user_dir = f"user_data/{current_user.id}/saved_recipes"
-            os.makedirs(user_dir, exist_ok=True)
-            filepath = save_recipe_to_file(
-                recipe,
-                directory=f"user_data/{current_user.id}/saved_recipes",
-                folder_id=folder_id)
-            # Update folder recipe count
-            user_folder_manager = FolderManager(
-                folders_file=f"user_data/{current_user.id}/folders.json",
-                recipes_dir=f"user_data/{current_user.id}/saved_recipes")
-            user_folder_manager._update_recipe_counts()
+            get_recipe_repository(current_user.id).save_recipe(recipe, folder_id)
             return jsonify({
                 'success':
                 True,
                 'recipe':
                 recipe.model_dump(),
                 'message':
-                f'Recipe saved successfully to {filepath}'
+                f'Recipe saved successfully to {folder_id}'
             })
         else:
             return jsonify({
@@ -388,152 +388,221 @@ def save_manual_recipe():
                         serving_size=data.get('serving_size'),
                         ingredients=data['ingredients'],
                         instructions=data['instructions'])
-        # Ensure user directory exists
-        user_dir = f"user_data/{current_user.id}/saved_recipes"
-        os.makedirs(user_dir, exist_ok=True)
-        filepath = save_recipe_to_file(
-            recipe,
-            directory=f"user_data/{current_user.id}/saved_recipes",
-            folder_id=folder_id)
-        # Update folder recipe count
-        user_folder_manager = FolderManager(
-            folders_file=f"user_data/{current_user.id}/folders.json",
-            recipes_dir=f"user_data/{current_user.id}/saved_recipes")
-        user_folder_manager._update_recipe_counts()
+        get_recipe_repository(current_user.id).save_recipe(recipe, folder_id)
         return jsonify({
             'success': True,
             'recipe': recipe.model_dump(),
-            'message': f'Recipe saved successfully to {filepath}'
+            'message': f'Recipe saved successfully to {folder_id}'
         })
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
-@app.route('/api/create-meal-plan', methods=['POST'])
-@login_required
-def create_meal_plan_api():
-    """Create a meal plan and generate grocery list for the current user."""
-    data = request.get_json()
+def _load_user_recipes(user_id, recipe_names):
+    """
+    Load the named saved recipes for a user from any folder. Returns
+    ({name: Recipe}, {name: recipe ID}, repository); names that aren't
+    found are left out.
+    """
+    repository = get_recipe_repository(user_id)
+    all_recipes, recipe_ids = repository.load_recipes(recipe_names)
+    return all_recipes, recipe_ids, repository
+
+
+def _prepare_meal_plan(data):
+    """
+    Validate a meal plan request and load the selected recipes.
+    Returns (plan, None) on success or (None, (error_response, status)) on failure,
+    where plan holds the recipe names, selected recipes, the repository they
+    came from with their keys in it, and the formatted date range.
+    """
     recipe_names = data.get('recipes', [])
     start_date = data.get('start_date')
     end_date = data.get('end_date')
 
     if not recipe_names:
-        return jsonify({'error': 'No recipes selected'}), 400
+        return None, (jsonify({'error': 'No recipes selected'}), 400)
 
     if not start_date or not end_date:
-        return jsonify({'error': 'Start date and end date are required'}), 400
+        return None, (jsonify({'error': 'Start date and end date are required'}), 400)
 
+    # Validate and parse dates
     try:
-        from datetime import datetime
-
-        # Validate and parse dates
         start_dt = datetime.strptime(start_date, '%Y-%m-%d')
         end_dt = datetime.strptime(end_date, '%Y-%m-%d')
+    except ValueError:
+        return None, (jsonify({'error': 'Invalid date format. Use YYYY-MM-DD'}), 400)
+
+    if start_dt > end_dt:
+        return None, (jsonify({'error': 'End date must be after start date'}), 400)
+
+    # Calculate number of days
+    date_diff = (end_dt - start_dt).days + 1
+
+    # Load the selected recipes from the user's folders
+    all_recipes, recipe_ids, repository = _load_user_recipes(current_user.id, recipe_names)
+
+    selected_recipes = []
+    for recipe_name in recipe_names:
+        if recipe_name in all_recipes:
+            selected_recipes.append(all_recipes[recipe_name])
+        else:
+            return None, (jsonify({'error':
+                                   f'Recipe "{recipe_name}" not found'}), 400)
+
+    return {
+        'recipe_names': recipe_names,
+        'recipes': selected_recipes,
+        'repository': repository,
+        'recipe_ids': {recipe.name: recipe_ids[recipe.name] for recipe in selected_recipes},
+        'date_range': {
+            'start': start_dt.strftime('%B %d, %Y'),
+            'end': end_dt.strftime('%B %d, %Y'),
+            'days': date_diff
+        }
+    }, None
+
+
+def _finish_meal_plan(plan, parsed_by_recipe):
+    """Consolidate a prepared meal plan's parsed ingredients and return the API payload."""
+    # Recipes saved before enrichment (or under an older parser) were just
+    # parsed; store the results so the next plan can skip parsing.
+    # The lines are cached by now, so this is cheap.
+    for recipe in plan['recipes']:
+        if get_stored_structured_ingredients(recipe) is None:
+            plan['repository'].schedule_enrichment(plan['recipe_ids'][recipe.name])
+
+    aggregate = GroceryAggregate.from_recipes(
+        [(recipe.name, parsed_lines) for recipe, parsed_lines in zip(plan['recipes'], parsed_by_recipe)])
+
+    return {
+        'success': True,
+        'meal_plan': plan['recipe_names'],
+        'grocery_list': aggregate.render(),
+        'grocery_items': aggregate.structured_lines(),
+        'date_range': plan['date_range']
+    }
+
+
+def _build_meal_plan(plan, on_progress=None):
+    """Generate the grocery list for a prepared meal plan from stored parsed ingredients."""
+    parsed_by_recipe = load_structured_ingredients(plan['recipes'], on_progress=on_progress)
+    return _finish_meal_plan(plan, parsed_by_recipe)
+
+
+def _sse_event(event, data):
+    """Format one Server-Sent Events message."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.route('/api/create-meal-plan', methods=['POST'])
+@login_required
+def create_meal_plan_api():
+    """Create a meal plan and generate grocery list for the current user."""
+    data = request.get_json()
+
+    try:
+        plan, error = _prepare_meal_plan(data)
+        if error:
+            return error
+
+        return jsonify(_build_meal_plan(plan))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
 
-        if start_dt > end_dt:
-            return jsonify({'error': 'End date must be after start date'}), 400
-
-        # Calculate number of days
-        date_diff = (end_dt - start_dt).days + 1
-
-        # Load recipes from all user folders
-        all_recipes = {}
-        user_folder_manager = FolderManager(
-            folders_file=f"user_data/{current_user.id}/folders.json",
-            recipes_dir=f"user_data/{current_user.id}/saved_recipes")
-        folders = user_folder_manager.get_all_folders()
-
-        for folder in folders:
-            folder_path = os.path.join(
-                f"user_data/{current_user.id}/saved_recipes", folder.id)
-            if os.path.exists(folder_path):
-                for filename in os.listdir(folder_path):
-                    if filename.endswith('.json'):
-                        filepath = os.path.join(folder_path, filename)
-                        try:
-                            with open(filepath, 'r', encoding='utf-8') as f:
-                                data = json.load(f)
-                                recipe = Recipe.model_validate(data)
-                                all_recipes[recipe.name] = recipe
-                        except Exception as e:
-                            print(f"Error loading recipe from {filename}: {e}")
-
-        selected_recipes = []
-        for recipe_name in recipe_names:
-            if recipe_name in all_recipes:
-                selected_recipes.append(all_recipes[recipe_name])
-            else:
-                return jsonify({'error':
-                                f'Recipe "{recipe_name}" not found'}), 400
-
-        # Parse ingredients and generate grocery list
-        all_parsed_ingredients = []
-        for recipe in selected_recipes:
-            for ingredient_text in recipe.ingredients:
-                parsed = parse_ingredient_line_with_gemini(ingredient_text)
-                if parsed:
-                    all_parsed_ingredients.append(parsed)
-
-        grocery_list = consolidate_ingredients(all_parsed_ingredients)
 
+@app.route('/api/create-meal-plan/stream', methods=['POST'])
+@login_required
+def stream_meal_plan():
+    """
+    Create a meal plan as a Server-Sent Events stream: one 'ingredient' event per
+    parsed ingredient as recipes finish, then a 'grocery_list' event with the
+    same payload /api/create-meal-plan returns. If the client disconnects, the
+    generator is closed and outstanding parse work is cancelled.
+    """
+    data = request.get_json()
+
+    try:
+        plan, error = _prepare_meal_plan(data)
+        if error:
+            return error
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+    def generate():
+        recipes = plan['recipes']
+        parsed_by_recipe = [[None] * len(recipe.ingredients) for recipe in recipes]
+        events = iter_structured_ingredients(recipes)
+        try:
+            yield _sse_event('start', {
+                'total': sum(len(recipe.ingredients) for recipe in recipes)
+            })
+            for recipe_index, parsed_lines in events:
+                parsed_by_recipe[recipe_index] = parsed_lines
+                recipe = recipes[recipe_index]
+                for line_index, parsed in enumerate(parsed_lines):
+                    yield _sse_event('ingredient', {
+                        'recipe': recipe.name,
+                        'index': line_index,
+                        'text': recipe.ingredients[line_index],
+                        'parsed': parsed.model_dump() if parsed else None
+                    })
+            yield _sse_event('grocery_list', _finish_meal_plan(plan, parsed_by_recipe))
+        except Exception as e:
+            logging.error(f"Error streaming meal plan: {e}")
+            yield _sse_event('error', {'error': str(e)})
+        finally:
+            # Runs on normal completion and when the client goes away
+            events.close()
+
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+
+@app.route('/api/meal-plan-jobs', methods=['POST'])
+@login_required
+def create_meal_plan_job():
+    """Queue meal plan generation in the background and return a job ID to poll."""
+    data = request.get_json()
+
+    try:
+        plan, error = _prepare_meal_plan(data)
+        if error:
+            return error
+
+        total = sum(len(recipe.ingredients) for recipe in plan['recipes'])
+        job = meal_plan_jobs.submit(
+            current_user.id, total,
+            lambda report_progress: _build_meal_plan(plan, on_progress=report_progress))
         return jsonify({
             'success': True,
-            'meal_plan': recipe_names,
-            'grocery_list': grocery_list,
-            'date_range': {
-                'start': start_dt.strftime('%B %d, %Y'),
-                'end': end_dt.strftime('%B %d, %Y'),
-                'days': date_diff
-            }
-        })
-    except ValueError as e:
-        return jsonify({'error': 'Invalid date format. Use YYYY-MM-DD'}), 400
+            'job_id': job.id,
+            'status_url': url_for('get_meal_plan_job', job_id=job.id)
+        }), 202
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
+@app.route('/api/meal-plan-jobs/<job_id>', methods=['GET'])
+@login_required
+def get_meal_plan_job(job_id):
+    """Get the progress, and once finished the grocery list, of a meal plan job."""
+    job = meal_plan_jobs.get(job_id, current_user.id)
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job.to_dict())
+
+
 @app.route('/api/delete-recipe/<folder_id>/<recipe_name>', methods=['DELETE'])
 @login_required
 def delete_recipe(folder_id, recipe_name):
     """Delete a saved recipe from a specific folder for the current user."""
     try:
-        folder_path = os.path.join(
-            f"user_data/{current_user.id}/saved_recipes", folder_id)
+        if not get_recipe_repository(current_user.id).delete_recipe(folder_id, recipe_name):
+            return jsonify({'error': 'Recipe file not found'}), 404
 
-        # Try consistent filename generation first
-        filename = "".join(c if c.isalnum() else "_"
-                           for c in recipe_name).lower()
-        filepath = os.path.join(folder_path, f"{filename}.json")
-
-        if os.path.exists(filepath):
-            os.remove(filepath)
-        else:
-            # If not found, search by recipe name in all files in the folder
-            found = False
-            if os.path.exists(folder_path):
-                for file in os.listdir(folder_path):
-                    if file.endswith('.json'):
-                        full_path = os.path.join(folder_path, file)
-                        try:
-                            with open(full_path, 'r', encoding='utf-8') as f:
-                                data = json.load(f)
-                                recipe = Recipe.model_validate(data)
-                                if recipe.name == recipe_name:
-                                    os.remove(full_path)
-                                    found = True
-                                    break
-                        except:
-                            continue
-
-            if not found:
-                return jsonify({'error': 'Recipe file not found'}), 404
-
-        # Update folder recipe counts
-        user_folder_manager = FolderManager(
-            folders_file=f"user_data/{current_user.id}/folders.json",
-            recipes_dir=f"user_data/{current_user.id}/saved_recipes")
-        user_folder_manager._update_recipe_counts()
         return jsonify({
             'success':
             True,
@@ -562,48 +631,10 @@ def move_recipe():
                         'Recipe is already in the target folder'}), 400
 
     try:
-        # Find the actual recipe file by searching for the recipe name in the folder
-        source_folder_path = os.path.join(
-            f"user_data/{current_user.id}/saved_recipes", current_folder)
-
-        if not os.path.exists(source_folder_path):
-            return jsonify({'error': 'Source folder not found'}), 404
-
-        # Find the file that contains this recipe
-        recipe_file = None
-        for filename in os.listdir(source_folder_path):
-            if filename.endswith('.json'):
-                filepath = os.path.join(source_folder_path, filename)
-                try:
-                    with open(filepath, 'r', encoding='utf-8') as f:
-                        data = json.load(f)
-                        if data.get('name') == recipe_name:
-                            recipe_file = filename
-                            break
-                except Exception:
-                    continue
-
-        if not recipe_file:
+        repository = get_recipe_repository(current_user.id)
+        if not repository.move_recipe(recipe_name, current_folder, target_folder):
             return jsonify({'error': 'Recipe not found in source folder'}), 404
 
-        # Define paths using the found filename
-        source_path = os.path.join(source_folder_path, recipe_file)
-        target_dir = os.path.join(f"user_data/{current_user.id}/saved_recipes",
-                                  target_folder)
-        target_path = os.path.join(target_dir, recipe_file)
-
-        # Create target directory if it doesn't exist
-        os.makedirs(target_dir, exist_ok=True)
-
-        # Move the file
-        shutil.move(source_path, target_path)
-
-        # Update folder recipe counts
-        user_folder_manager = FolderManager(
-            folders_file=f"user_data/{current_user.id}/folders.json",
-            recipes_dir=f"user_data/{current_user.id}/saved_recipes")
-        user_folder_manager._update_recipe_counts()
-
         return jsonify({
             'success':
             True,
@@ -614,6 +645,67 @@ def move_recipe():
         return jsonify({'error': str(e)}), 500
 
 
+def _grocery_list_payload(grocery_list):
+    """API representation of a saved grocery list; structured lists are rendered to strings here."""
+    payload = {
+        'id': grocery_list.id,
+        'grocery_list': grocery_list.grocery_list,
+        'grocery_items': None,
+        'meal_plan': grocery_list.meal_plan,
+        'date_range': grocery_list.date_range,
+        'created_at': grocery_list.created_at.isoformat(),
+        'updated_at': grocery_list.updated_at.isoformat()
+    }
+    if is_grocery_aggregate(grocery_list.grocery_list):
+        aggregate = GroceryAggregate(grocery_list.grocery_list)
+        payload['grocery_list'] = aggregate.render()
+        payload['grocery_items'] = aggregate.structured_lines()
+    return payload
+
+
+def _build_grocery_aggregate(user_id, recipe_names, parse=True):
+    """
+    Builds a structured grocery list for a meal plan from the recipes' stored
+    parsed ingredients. Without parse, lines that would need Gemini are left
+    out rather than parsed. Returns (aggregate, missing recipe names).
+    """
+    all_recipes, _, _ = _load_user_recipes(user_id, recipe_names)
+    recipes = [all_recipes[name] for name in recipe_names if name in all_recipes]
+    missing = [name for name in recipe_names if name not in all_recipes]
+    parsed_by_recipe = load_structured_ingredients(recipes) if parse else lookup_structured_ingredients(recipes)
+    aggregate = GroceryAggregate.from_recipes(
+        [(recipe.name, parsed_lines) for recipe, parsed_lines in zip(recipes, parsed_by_recipe)])
+    return aggregate, missing
+
+
+def _load_grocery_aggregate(grocery_list):
+    """
+    Returns the saved list's GroceryAggregate, or None for lists saved as plain
+    strings: those only change incrementally once `flask migrate-grocery-lists`
+    has converted them.
+    """
+    if is_grocery_aggregate(grocery_list.grocery_list):
+        return GroceryAggregate(grocery_list.grocery_list)
+    return None
+
+
+_UNMIGRATED_GROCERY_LIST_ERROR = 'This grocery list is saved as plain text and has to be migrated before it can be edited'
+
+
+def _save_grocery_aggregate(grocery_list, aggregate, changes):
+    """Stores an updated aggregate and returns the API payload with the changed lines."""
+    # Assign new objects so SQLAlchemy sees the JSON columns change
+    grocery_list.grocery_list = aggregate.to_dict()
+    grocery_list.meal_plan = aggregate.meal_plan
+    db.session.commit()
+    return {
+        'success': True,
+        'id': grocery_list.id,
+        'meal_plan': aggregate.meal_plan,
+        'changes': changes
+    }
+
+
 @app.route('/api/grocery-lists', methods=['GET'])
 @login_required
 def get_grocery_lists():
@@ -623,18 +715,7 @@ def get_grocery_lists():
             user_id=current_user.id).order_by(
                 GroceryList.created_at.desc()).all()
 
-        result = []
-        for grocery_list in grocery_lists:
-            result.append({
-                'id': grocery_list.id,
-                'grocery_list': grocery_list.grocery_list,
-                'meal_plan': grocery_list.meal_plan,
-                'date_range': grocery_list.date_range,
-                'created_at': grocery_list.created_at.isoformat(),
-                'updated_at': grocery_list.updated_at.isoformat()
-            })
-
-        return jsonify(result)
+        return jsonify([_grocery_list_payload(grocery_list) for grocery_list in grocery_lists])
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -651,8 +732,19 @@ def save_grocery_list():
                 {'error':
                  'Missing required data: groceryList and mealPlan'}), 400
 
+        # Store the structured list when the parses the meal plan just used (stored
+        # or cached, never re-parsed here) reproduce exactly the posted lines;
+        # otherwise keep the strings the user saw
+        grocery_data = data['groceryList']
+        try:
+            aggregate, missing = _build_grocery_aggregate(current_user.id, data['mealPlan'], parse=False)
+            if not missing and aggregate.render() == grocery_data:
+                grocery_data = aggregate.to_dict()
+        except Exception as e:
+            logging.warning(f"Saving grocery list as plain text; structured build failed: {e}")
+
         grocery_list = GroceryList(user_id=current_user.id,
-                                   grocery_list=data['groceryList'],
+                                   grocery_list=grocery_data,
                                    meal_plan=data['mealPlan'],
                                    date_range=data.get('dateRange'))
 
@@ -680,14 +772,7 @@ def get_grocery_list(grocery_list_id):
         if not grocery_list:
             return jsonify({'error': 'Grocery list not found'}), 404
 
-        return jsonify({
-            'id': grocery_list.id,
-            'grocery_list': grocery_list.grocery_list,
-            'meal_plan': grocery_list.meal_plan,
-            'date_range': grocery_list.date_range,
-            'created_at': grocery_list.created_at.isoformat(),
-            'updated_at': grocery_list.updated_at.isoformat()
-        })
+        return jsonify(_grocery_list_payload(grocery_list))
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -715,6 +800,96 @@ def delete_grocery_list(grocery_list_id):
         return jsonify({'error': str(e)}), 500
 
 
+@app.route('/api/grocery-lists/<grocery_list_id>/recipes', methods=['POST'])
+@login_required
+def add_recipe_to_grocery_list(grocery_list_id):
+    """
+    Add a recipe to a saved grocery list's meal plan. Only the recipe's own
+    ingredients are applied; the response lists the lines that changed as
+    {'key', 'previous', 'line'} (previous is null for new lines).
+    """
+    try:
+        data = request.get_json() or {}
+        recipe_name = data.get('recipe')
+        if not recipe_name:
+            return jsonify({'error': 'Recipe name is required'}), 400
+
+        grocery_list = GroceryList.query.filter_by(
+            id=grocery_list_id, user_id=current_user.id).first()
+        if not grocery_list:
+            return jsonify({'error': 'Grocery list not found'}), 404
+
+        all_recipes, recipe_ids, repository = _load_user_recipes(current_user.id, [recipe_name])
+        recipe = all_recipes.get(recipe_name)
+        if not recipe:
+            return jsonify({'error': f'Recipe "{recipe_name}" not found'}), 404
+
+        aggregate = _load_grocery_aggregate(grocery_list)
+        if aggregate is None:
+            return jsonify({'error': _UNMIGRATED_GROCERY_LIST_ERROR}), 409
+        parsed_lines = load_structured_ingredients([recipe])[0]
+        if get_stored_structured_ingredients(recipe) is None:
+            repository.schedule_enrichment(recipe_ids[recipe.name])
+
+        changes = aggregate.add_recipe(recipe.name, parsed_lines)
+        return jsonify(_save_grocery_aggregate(grocery_list, aggregate, changes))
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/grocery-lists/<grocery_list_id>/recipes/<path:recipe_name>', methods=['DELETE'])
+@login_required
+def remove_recipe_from_grocery_list(grocery_list_id, recipe_name):
+    """Remove one occurrence of a recipe from a saved grocery list; returns the changed lines."""
+    try:
+        grocery_list = GroceryList.query.filter_by(
+            id=grocery_list_id, user_id=current_user.id).first()
+        if not grocery_list:
+            return jsonify({'error': 'Grocery list not found'}), 404
+
+        aggregate = _load_grocery_aggregate(grocery_list)
+        if aggregate is None:
+            return jsonify({'error': _UNMIGRATED_GROCERY_LIST_ERROR}), 409
+        changes = aggregate.remove_recipe(recipe_name)
+        if changes is None:
+            return jsonify({'error': f'Recipe "{recipe_name}" is not in this meal plan'}), 404
+
+        return jsonify(_save_grocery_aggregate(grocery_list, aggregate, changes))
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/recipe-autocomplete', methods=['GET'])
+@login_required
+def recipe_autocomplete():
+    """Typeahead suggestions (saved recipe names and ingredients) for a partly typed query."""
+    query = request.args.get('q', '')
+    try:
+        limit = int(request.args.get('limit', 8))
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
+    if not 1 <= limit <= MAX_SUGGESTIONS:
+        return jsonify({'error': f'limit must be between 1 and {MAX_SUGGESTIONS}'}), 400
+
+    try:
+        suggestions = suggest(get_recipe_repository(current_user.id), query, limit)
+        return jsonify({'query': query, 'suggestions': [asdict(suggestion) for suggestion in suggestions]})
+    except Exception as e:
+        logging.error(f"Error in recipe autocomplete: {e}")
+        return jsonify({'error': 'Recipe autocomplete failed'}), 500
+
+
+def _number_option(data, name, default, cast, minimum, maximum):
+    """data[name] converted with cast if it lies in [minimum, maximum], else None."""
+    try:
+        value = cast(data.get(name, default))
+    except (TypeError, ValueError, OverflowError):
+        return None
+    return value if minimum <= value <= maximum else None  # NaN fails both comparisons
+
+
 @app.route('/api/recipe-search', methods=['POST'])
 @login_required
 def recipe_search():
@@ -723,24 +898,49 @@ def recipe_search():
         data = request.get_json()
         search_term = data.get('description', '').strip() or data.get(
             'search_term', '').strip()
-        search_type = data.get('search_type', 'saved')  # 'saved' or 'web'
+        search_type = data.get('search_type', 'saved')  # 'saved', 'semantic', 'pantry' or 'web'
+
+        # 'pantry' takes on-hand ingredients as a list, or comma-separated in the description
+        on_hand = []
+        if search_type == 'pantry':
+            on_hand = data.get('ingredients') or [item for item in search_term.split(',') if item.strip()]
+            if not isinstance(on_hand, list) or not all(isinstance(item, str) for item in on_hand):
+                return jsonify({'error': 'ingredients must be a list of strings'}), 400
 
-        if not search_term:
+        if not search_term and not on_hand:
             return jsonify({'error': 'Search term is required'}), 400
 
+        limit = _number_option(data, 'limit', 5, int, 1, MAX_SEARCH_PAGE_SIZE)
+        if limit is None:
+            return jsonify({'error': f'limit must be an integer between 1 and {MAX_SEARCH_PAGE_SIZE}'}), 400
+        min_score = _number_option(data, 'min_score', 0, float, 0.0, float('inf'))
+        if min_score is None:
+            return jsonify({'error': 'min_score must be a non-negative number'}), 400
+        min_coverage = _number_option(data, 'min_coverage', 0, float, 0.0, 1.0)
+        if min_coverage is None:
+            return jsonify({'error': 'min_coverage must be a number between 0 and 1'}), 400
+
         recipes = []
+        next_cursor = None
 
-        if search_type == 'saved':
-            # Search through user's saved recipes
-            search_results = search_local_recipes(search_term, current_user.id)
-            recipes = [{
-                'name': recipe.name,
-                'ingredients': recipe.ingredients,
-                'instructions': recipe.instructions,
-                'serving_size': recipe.serving_size,
-                'url': recipe.url,
-                'match_score': recipe.match_score
-            } for recipe in search_results]
+        if search_type in ('saved', 'semantic'):
+            # Search through user's saved recipes, by keywords or by similarity;
+            # hits are summaries; bodies come from /api/recipes/<id>
+            try:
+                search_results, next_cursor = search_saved_recipes(
+                    search_term, current_user.id,
+                    limit=limit,
+                    min_score=min_score,
+                    cursor=data.get('cursor'),
+                    semantic=search_type == 'semantic')
+            except ValueError as e:
+                # A malformed cursor, or semantic search without NumPy
+                return jsonify({'error': str(e)}), 400
+            recipes = [asdict(hit) for hit in search_results]
+        elif search_type == 'pantry':
+            # What can be cooked from on-hand ingredients, best covered first
+            search_results = search_by_pantry(on_hand, current_user.id, limit=limit, min_coverage=min_coverage)
+            recipes = [asdict(hit) for hit in search_results]
         elif search_type == 'web':
             # Search web for new recipes (simplified version without AI)
             search_results = search_web_recipes_simple(search_term)
@@ -754,6 +954,7 @@ def recipe_search():
 
         return jsonify({
             'recipes': recipes,
+            'next_cursor': next_cursor,
             'search_term': search_term,
             'search_type': search_type
         })
@@ -829,24 +1030,12 @@ def save_search_result():
         folder_id = data.get('folder_id', 'uncategorized')
 
         # Create Recipe object from the data and save it directly
-        from recipe_extractor import Recipe, save_recipe_to_file
         recipe = Recipe(name=recipe_data.get('name', ''),
                         serving_size=recipe_data.get('serving_size'),
                         ingredients=recipe_data.get('ingredients', []),
                         instructions=recipe_data.get('instructions', []))
 
-        # Ensure user directory exists
-        user_dir = f"user_data/{current_user.id}/saved_recipes"
-        os.makedirs(user_dir, exist_ok=True)
-
-        # Save recipe directly using the recipe_extractor function
-        save_recipe_to_file(recipe, directory=user_dir, folder_id=folder_id)
-
-        # Update folder recipe counts
-        user_folder_manager = FolderManager(
-            folders_file=f"user_data/{current_user.id}/folders.json",
-            recipes_dir=f"user_data/{current_user.id}/saved_recipes")
-        user_folder_manager._update_recipe_counts()
+        get_recipe_repository(current_user.id).save_recipe(recipe, folder_id)
 
         return jsonify({'message': 'Recipe saved successfully'})
 
@@ -855,6 +1044,75 @@ def save_search_result():
         return jsonify({'error': 'Failed to save recipe'}), 500
 
 
+@app.cli.command('rebuild-recipe-manifests')
+def rebuild_recipe_manifests():
+    """
+    Rebuild every user's recipe manifest from their recipe files, and store the
+    IDs of recipe files that don't hold theirs yet (saved before recipes had IDs).
+    """
+    if not os.path.isdir("user_data"):
+        return
+    for user_id in sorted(os.listdir("user_data")):
+        if os.path.isdir(f"user_data/{user_id}/saved_recipes"):
+            manifest = get_recipe_manifest(f"user_data/{user_id}/saved_recipes")
+            # IDs first, so recipes keep the ones they are indexed under now
+            written = manifest.backfill_ids()
+            count = manifest.rebuild()
+            print(f"User {user_id}: {count} recipes indexed, {written} recipe files given their ID")
+
+
+@app.cli.command('import-recipes')
+def import_recipes():
+    """Copy every user's recipe files and folders into the database (RECIPE_STORAGE=database)."""
+    if not os.path.isdir("user_data"):
+        return
+    for user_id in sorted(os.listdir("user_data")):
+        if not os.path.isdir(f"user_data/{user_id}/saved_recipes"):
+            continue
+        if not db.session.get(User, user_id):
+            print(f"Skipping {user_id}: no such user")
+            continue
+        folders, recipes = import_recipes_to_database(user_id)
+        print(f"User {user_id}: {folders} folders, {recipes} recipes imported")
+
+
+@app.cli.command('rebuild-recipe-search')
+def rebuild_recipe_search():
+    """Recompute search postings for recipes stored in the database (file indexes rebuild themselves)."""
+    for (user_id,) in db.session.query(User.id).order_by(User.id):
+        count = get_recipe_repository(user_id, "database").rebuild_search_index()
+        print(f"User {user_id}: {count} recipes indexed")
+
+
+@app.cli.command('migrate-grocery-lists')
+def migrate_grocery_lists():
+    """Convert grocery lists saved as plain strings to the structured format."""
+    migrated = skipped = 0
+    for grocery_list in GroceryList.query.all():
+        if is_grocery_aggregate(grocery_list.grocery_list):
+            continue
+        try:
+            aggregate, missing = _build_grocery_aggregate(grocery_list.user_id, grocery_list.meal_plan or [])
+        except Exception as e:
+            print(f"Skipping grocery list {grocery_list.id}: {e}")
+            skipped += 1
+            continue
+        if missing:
+            # Keep the old text rather than silently dropping deleted recipes' ingredients
+            print(f"Skipping grocery list {grocery_list.id}: recipes no longer exist: {', '.join(missing)}")
+            skipped += 1
+            continue
+        if aggregate.render() != grocery_list.grocery_list:
+            # The recipes or the parser changed since the list was made; keep what the user saw
+            print(f"Skipping grocery list {grocery_list.id}: its recipes no longer produce the saved text")
+            skipped += 1
+            continue
+        grocery_list.grocery_list = aggregate.to_dict()
+        db.session.commit()
+        migrated += 1
+    print(f"Migrated {migrated} grocery lists, skipped {skipped}")
+
+
 if __name__ == '__main__':
     # Ensure user_data directory exists
     os.makedirs('user_data', exist_ok=True)
@@ -94,7 +94,7 @@ def register():
         user_folder_manager = FolderManager(
             folders_file=f"user_data/{user.id}/folders.json",
             recipes_dir=f"user_data/{user.id}/saved_recipes")
-        user_folder_manager.create_folder("Uncategorized")
+        user_folder_manager.ensure_default_folder()
 
         # Log the user in
         login_user(user)
@@ -274,7 +274,7 @@ def demo_login():
             user_folder_manager = FolderManager(
                 folders_file=f"user_data/{demo_user.id}/folders.json",
                 recipes_dir=f"user_data/{demo_user.id}/saved_recipes")
-            user_folder_manager.create_folder("Uncategorized")
+            user_folder_manager.ensure_default_folder()
 
         login_user(demo_user)
         flash('Welcome to MealMate Demo!', 'info')
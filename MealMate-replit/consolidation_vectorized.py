@@ -0,0 +1,192 @@
+"""
+NumPy consolidation path for very large meal plans.
+
+Produces exactly the same grocery list as meal_planner's pure-Python loop,
+but the per-line work is reduced to one dict lookup that encodes each
+(item, unit) pair as an integer. Everything that depends only on the pair
+(canonical ingredient, density and unit factors, output group) is worked out
+once per distinct pair, quantities are converted with array multiplies and
+summed per group with np.bincount, and strings are only built for the final
+lines.
+
+NumPy is optional and not among the locked dependencies, so this path is
+inactive in a default install: numpy_available is False when it isn't
+installed, and meal_planner.consolidate_ingredients then stays on the
+Python loop.
+"""
+
+import time
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import numpy as np
+    numpy_available = True
+except ImportError:
+    np = None
+    numpy_available = False
+
+from meal_planner import (TO_TASTE, ParsedIngredient, _DENSITY_CONVERSIONS, _format_grocery_line, _item_traits,
+                          _merge_targets, _normalize_item_name, canonical_ingredient_id,
+                          convert_to_canonical_unit, unit_registry)
+
+
+def _pair_plan(raw_item: str, raw_unit: Optional[str]) -> Tuple[str, str, Optional[str], float, float]:
+    """
+    For one distinct (item, unit) pair returns (item, canonical ID, final unit or None,
+    density factor, unit factor), mirroring the per-line steps of the Python loop.
+    """
+    item = _normalize_item_name(raw_item)
+    ingredient_id = canonical_ingredient_id(item)
+    unit = unit_registry.normalize(raw_unit) if raw_unit else None
+    if unit is None:
+        return item, ingredient_id, None, 1.0, 1.0
+
+    density_factor = 1.0
+    density_key = _item_traits(ingredient_id)[0]
+    if density_key is not None:
+        conversion = _DENSITY_CONVERSIONS[density_key].get(unit)
+        if conversion:
+            unit, density_factor = conversion
+
+    unit_factor, unit = convert_to_canonical_unit(1.0, unit)
+    return item, ingredient_id, unit, density_factor, unit_factor
+
+
+def consolidate_ingredients_vectorized(parsed_ingredients: List[ParsedIngredient]) -> List[str]:
+    """Same result as meal_planner.consolidate_ingredients, aggregated with NumPy."""
+    if not numpy_available:
+        raise RuntimeError("NumPy is not installed")
+
+    lines = [p_ing for p_ing in parsed_ingredients if p_ing and p_ing.item]
+    pair_codes: Dict[Tuple[str, Optional[str]], int] = {}
+    codes = [pair_codes.setdefault((p_ing.item, p_ing.unit), len(pair_codes)) for p_ing in lines]
+    quantities = [float('nan') if p_ing.quantity is None else p_ing.quantity for p_ing in lines]
+    lines_with_notes = [(line_index, p_ing.notes) for line_index, p_ing in enumerate(lines) if p_ing.notes]
+
+    if not codes:
+        return []
+
+    # --- Per distinct pair: conversion factors and output group ---
+    pair_count = len(pair_codes)
+    density_factors = np.ones(pair_count)
+    unit_factors = np.ones(pair_count)
+    has_unit = np.zeros(pair_count, dtype=bool)
+    is_to_taste = np.zeros(pair_count, dtype=bool)
+    group_of_pair = np.zeros(pair_count, dtype=np.int64)
+    group_keys: Dict[Tuple[str, Optional[str]], int] = {}
+    group_units: List[Optional[str]] = []
+    group_ingredient_ids: List[str] = []
+    pair_items: List[str] = []
+    pair_ingredient_ids: List[str] = []
+
+    for (raw_item, raw_unit), code in pair_codes.items():
+        item, ingredient_id, unit, density_factor, unit_factor = _pair_plan(raw_item, raw_unit)
+        pair_items.append(item)
+        pair_ingredient_ids.append(ingredient_id)
+        is_to_taste[code] = bool(raw_unit) and unit_registry.normalize(raw_unit) == TO_TASTE
+        density_factors[code] = density_factor
+        unit_factors[code] = unit_factor
+        has_unit[code] = unit is not None
+        group = group_keys.get((ingredient_id, unit))
+        if group is None:
+            group = group_keys[(ingredient_id, unit)] = len(group_units)
+            group_units.append(unit)
+            group_ingredient_ids.append(ingredient_id)
+        group_of_pair[code] = group
+
+    # --- Per line: convert and aggregate ---
+    line_codes = np.asarray(codes, dtype=np.int64)
+    line_quantities = np.asarray(quantities, dtype=np.float64)
+    quantified = ~np.isnan(line_quantities) & has_unit[line_codes]
+    converted = line_quantities * density_factors[line_codes] * unit_factors[line_codes]
+    line_groups = group_of_pair[line_codes]
+
+    group_count = len(group_units)
+    totals = np.bincount(line_groups[quantified], weights=converted[quantified], minlength=group_count)
+
+    # The displayed item is the first spelling seen for each group (or unquantified ID)
+    first_line = np.full(group_count, len(codes), dtype=np.int64)
+    np.minimum.at(first_line, line_groups[quantified], np.flatnonzero(quantified))
+    group_used = first_line < len(codes)
+
+    notes_by_group: Dict[int, set] = {}
+    if lines_with_notes:
+        note_lines = np.asarray([line_index for line_index, _ in lines_with_notes], dtype=np.int64)
+        for (_, notes), keep, group in zip(lines_with_notes, quantified[note_lines].tolist(),
+                                           line_groups[note_lines].tolist()):
+            if keep:
+                notes_by_group.setdefault(group, set()).add(notes)
+
+    # Unquantified 'to taste' mentions become a note on the ingredient's quantified line
+    used_groups = np.flatnonzero(group_used).tolist()
+    targets = _merge_targets((group_ingredient_ids[group], group_units[group]) for group in used_groups)
+    unquantified_codes = line_codes[~quantified]
+    to_taste_groups = {group_keys[targets[pair_ingredient_ids[code]]]
+                       for code in np.unique(unquantified_codes[is_to_taste[unquantified_codes]]).tolist()
+                       if pair_ingredient_ids[code] in targets}
+
+    def group_notes(group: int) -> List[str]:
+        notes = list(notes_by_group.get(group, ()))
+        if group in to_taste_groups and TO_TASTE not in notes:
+            notes.append(TO_TASTE)
+        return notes
+
+    # --- Format the final grocery list ---
+    first_lines = first_line.tolist()
+    grocery_list = [
+        _format_grocery_line(pair_items[codes[first_lines[group]]], group_units[group], total, group_notes(group))
+        for group, total in zip(used_groups, totals[group_used].tolist())
+    ]
+
+    # Unquantified items without a quantified line: one per canonical ID, in order of first appearance
+    unique_codes, first_seen = np.unique(unquantified_codes, return_index=True)
+    non_quantified_items: Dict[str, str] = {}
+    for code in unique_codes[np.argsort(first_seen)].tolist():
+        if pair_ingredient_ids[code] not in targets:
+            non_quantified_items.setdefault(pair_ingredient_ids[code], pair_items[code])
+    grocery_list.extend(non_quantified_items.values())
+
+    return sorted(grocery_list)
+
+
+if __name__ == "__main__":
+    import random
+    from meal_planner import _consolidate_ingredients_loop
+
+    rng = random.Random(0)
+    items = ['unsalted butter', 'Butter', 'all-purpose flour', 'all purpose flour', 'granulated sugar', 'brown sugar',
+             'extra virgin olive oil', 'kosher salt', 'black pepper', 'garlic', 'chicken breast', 'chicken breasts',
+             'eggs', 'egg', 'green onions', 'scallions', 'whole milk', 'cherry tomatoes', 'ground cumin', 'water']
+    units = ['cup', 'cups', 'tablespoon', 'tbsp', 'teaspoon', 'ounce', 'oz', 'pound', 'lbs', 'gram', 'kg',
+             'liter', 'fl oz', 'each', 'clove', 'pinch', 'bunch', 'to taste', None]
+
+    # Large plans repeat a bounded vocabulary: a few thousand distinct ingredient names
+    def random_plan(size: int, vocabulary: int = 2000) -> List[ParsedIngredient]:
+        return [ParsedIngredient(
+            quantity=rng.choice([None, 0.125, 0.25, 0.5, 1, 1.5, 2, 3, 250]),
+            unit=rng.choice(units),
+            item=rng.choice(items) if rng.random() < 0.7 else f"{rng.choice(items)} {rng.randint(1, vocabulary // len(items))}",
+            notes=rng.choice([None, None, None, 'chopped', 'at room temperature', 'for garnish']),
+        ) for _ in range(size)]
+
+    # Differential check against the Python loop
+    for trial in range(300):
+        plan = random_plan(rng.randint(0, 200))
+        expected, actual = _consolidate_ingredients_loop(plan), consolidate_ingredients_vectorized(plan)
+        assert expected == actual, (trial, expected, actual)
+    print("Differential check passed: 300 random plans identical")
+
+    def best_of(function, plan, repeats: int = 3) -> float:
+        timings = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            function(plan)
+            timings.append(time.perf_counter() - start)
+        return min(timings)
+
+    for size in (1000, 10000, 50000, 200000):
+        plan = random_plan(size)
+        loop = best_of(_consolidate_ingredients_loop, plan)
+        vectorized = best_of(consolidate_ingredients_vectorized, plan)
+        print(f"{size:>7} lines: loop {loop * 1000:8.1f} ms, vectorized {vectorized * 1000:8.1f} ms "
+              f"({loop / vectorized:.1f}x)")
@@ -1,5 +1,6 @@
 import os
 import json
+import tempfile
 from typing import Dict, List, Optional
 from pydantic import BaseModel, Field
 
@@ -10,23 +11,30 @@ class Folder(BaseModel):
     recipe_count: int = Field(default=0, description="Number of recipes in folder")
 
 class FolderManager:
+    """
+    A user's folders, stored in folders.json. Reading never writes: the file is
+    only written by operations that change it, and only if its contents differ.
+    Recipe counts aren't stored here: FileRecipeRepository fills them in from
+    the recipe manifest, so concurrent saves can't leave them out of date.
+    """
+
     def __init__(self, folders_file="folders.json", recipes_dir="saved_recipes"):
         self.folders_file = folders_file
         self.recipes_dir = recipes_dir
+        self._saved_data = None  # folders.json contents as last read or written
         self.folders = self._load_folders()
     
+    def _default_folder(self) -> Folder:
+        return Folder(
+            id="uncategorized",
+            name="Uncategorized",
+            created_at=self._get_timestamp()
+        )
+    
     def _load_folders(self) -> Dict[str, Folder]:
-        """Load folders from JSON file"""
+        """Load folders from JSON file; without one, only the Uncategorized folder exists"""
         if not os.path.exists(self.folders_file):
-            # Create default "Uncategorized" folder
-            default_folder = Folder(
-                id="uncategorized",
-                name="Uncategorized",
-                created_at=self._get_timestamp()
-            )
-            folders = {"uncategorized": default_folder}
-            self._save_folders(folders)
-            return folders
+            return {"uncategorized": self._default_folder()}
         
         try:
             with open(self.folders_file, 'r', encoding='utf-8') as f:
@@ -34,23 +42,35 @@ class FolderManager:
                 folders = {}
                 for folder_id, folder_data in data.items():
                     folders[folder_id] = Folder.model_validate(folder_data)
+                self._saved_data = data
                 return folders
         except Exception as e:
             print(f"Error loading folders: {e}")
             return {}
     
-    def _save_folders(self, folders: Optional[Dict[str, Folder]] = None):
-        """Save folders to JSON file"""
-        target_folders = folders if folders is not None else self.folders
-        
+    def _save_folders(self) -> bool:
+        """Save folders to JSON file if they changed. Returns True if the file was written."""
         data = {}
-        for folder_id, folder in target_folders.items():
-            data[folder_id] = folder.model_dump()
+        for folder_id, folder in self.folders.items():
+            data[folder_id] = folder.model_dump(exclude={'recipe_count'})
+        if data == self._saved_data:
+            return False
         
-        # Ensure directory exists
-        os.makedirs(os.path.dirname(self.folders_file), exist_ok=True)
-        with open(self.folders_file, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=4)
+        # Write a temporary file and rename it over folders.json, so readers
+        # (including other workers) never see a partly written file
+        directory = os.path.dirname(self.folders_file) or '.'
+        os.makedirs(directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.folders-', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, indent=4)
+            os.replace(temp_path, self.folders_file)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        self._saved_data = data
+        return True
     
     def _get_timestamp(self) -> str:
         """Get current timestamp"""
@@ -100,7 +120,6 @@ class FolderManager:
         
         # Move recipes to uncategorized folder
         folder_path = os.path.join(self.recipes_dir, folder_id)
-        
         if os.path.exists(folder_path):
             # Move all JSON files to uncategorized
             for filename in os.listdir(folder_path):
@@ -121,8 +140,9 @@ class FolderManager:
         
         # Remove from folders dict
         del self.folders[folder_id]
+        if "uncategorized" not in self.folders:
+            self.folders["uncategorized"] = self._default_folder()
         self._save_folders()
-        self._update_recipe_counts()
         
         return True
     
@@ -135,39 +155,24 @@ class FolderManager:
         self._save_folders()
         return True
     
+    def ensure_default_folder(self):
+        """Make sure the Uncategorized folder exists, in folders.json and on disk"""
+        if "uncategorized" not in self.folders:
+            self.folders["uncategorized"] = self._default_folder()
+        self._save_folders()
+        os.makedirs(os.path.join(self.recipes_dir, "uncategorized"), exist_ok=True)
+    
     def get_all_folders(self) -> List[Folder]:
-        """Get all folders with updated recipe counts"""
+        """Get all folders; the Uncategorized folder is always listed"""
         # Ensure uncategorized folder always exists
         if "uncategorized" not in self.folders:
-            self.folders["uncategorized"] = Folder(
-                id="uncategorized",
-                name="Uncategorized",
-                created_at=self._get_timestamp()
-            )
-            self._save_folders()
-            
-            # Create physical directory
-            uncategorized_path = os.path.join(self.recipes_dir, "uncategorized")
-            os.makedirs(uncategorized_path, exist_ok=True)
-        
-        self._update_recipe_counts()
+            self.folders["uncategorized"] = self._default_folder()
         return list(self.folders.values())
     
     def get_folder(self, folder_id: str) -> Optional[Folder]:
         """Get a specific folder"""
         return self.folders.get(folder_id)
     
-    def _update_recipe_counts(self):
-        """Update recipe counts for all folders"""
-        for folder_id, folder in self.folders.items():
-            folder_path = os.path.join(self.recipes_dir, folder_id)
-            if os.path.exists(folder_path):
-                recipe_files = [f for f in os.listdir(folder_path) if f.endswith('.json')]
-                folder.recipe_count = len(recipe_files)
-            else:
-                folder.recipe_count = 0
-        self._save_folders()
-    
     def move_recipe(self, recipe_filename: str, source_folder: str, target_folder: str) -> bool:
         """Move a recipe from one folder to another"""
         source_path = os.path.join(self.recipes_dir, source_folder, recipe_filename)
@@ -182,9 +187,6 @@ class FolderManager:
         # Move the file
         os.rename(source_path, target_path)
         
-        # Update recipe counts
-        self._update_recipe_counts()
-        
         return True
 
 # Global folder manager instance
@@ -0,0 +1,230 @@
+"""
+Structured, incrementally maintained grocery list for a meal plan.
+
+A GroceryAggregate keeps, per consolidated line, the running total and the
+recipes contributing to it, plus each recipe's own contributions. Adding or
+removing a recipe applies only that recipe's delta and reports which lines
+changed, instead of re-consolidating the whole plan. Lines are keyed the
+same way as consolidate_ingredients (canonical ingredient + canonical unit)
+and rendered with the same formatting.
+
+Each line holds its quantity, canonical unit, item spelling, notes and
+source recipes, so lists can be merged and rescaled without re-parsing any
+text; display strings are only produced at the API edge (render). The
+aggregate is stored in GroceryList.grocery_list as a versioned dict. Rows
+saved before it existed hold a plain list of strings; they are converted
+with `flask migrate-grocery-lists` and can't be edited incrementally before.
+"""
+
+import copy
+from typing import Any, Dict, List, Optional, Tuple
+
+from meal_planner import (TO_TASTE, ParsedIngredient, _format_grocery_line, _is_to_taste, _merge_targets,
+                          convert_for_consolidation)
+
+AGGREGATE_FORMAT = "grocery-aggregate"
+AGGREGATE_FORMAT_VERSION = 1
+
+UNQUANTIFIED = ""  # unit part of the key for lines listed without a quantity
+
+
+def _line_key(ingredient_id: str, unit: Optional[str]) -> str:
+    return f"{ingredient_id}|{unit or UNQUANTIFIED}"
+
+
+def _ingredient_id(key: str) -> str:
+    return key.rpartition('|')[0]
+
+
+def _increment(counts: Dict[str, int], key: str, amount: int):
+    counts[key] = counts.get(key, 0) + amount
+    if counts[key] <= 0:
+        del counts[key]
+
+
+def is_grocery_aggregate(data: Any) -> bool:
+    return isinstance(data, dict) and data.get('format') == AGGREGATE_FORMAT
+
+
+class GroceryAggregate:
+    """Per-line running totals and per-recipe contributions for one grocery list."""
+
+    def __init__(self, data: Optional[Dict[str, Any]] = None):
+        # Work on a copy: the caller's dict is usually a loaded JSON column, and
+        # mutating it in place would hide the change from SQLAlchemy
+        data = copy.deepcopy(data) if data else {}
+        if data and data.get('version') != AGGREGATE_FORMAT_VERSION:
+            raise ValueError(f"Unsupported grocery aggregate version: {data.get('version')}")
+        # key -> {'unit', 'quantity', 'notes': {note: count}, 'items': {spelling: count}, 'recipes': {name: count}}
+        self.lines: Dict[str, Dict[str, Any]] = data.get('lines', {})
+        # One entry per recipe occurrence in the plan: {'name', 'contributions': [[key, quantity, item, notes]]}
+        self.recipes: List[Dict[str, Any]] = data.get('recipes', [])
+
+    @classmethod
+    def from_recipes(cls, recipes: List[Tuple[str, List[Optional[ParsedIngredient]]]]) -> "GroceryAggregate":
+        """Builds an aggregate from (recipe name, parsed ingredient lines) pairs."""
+        aggregate = cls()
+        for name, parsed_lines in recipes:
+            aggregate.add_recipe(name, parsed_lines)
+        return aggregate
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'format': AGGREGATE_FORMAT,
+            'version': AGGREGATE_FORMAT_VERSION,
+            'lines': self.lines,
+            'recipes': self.recipes,
+        }
+
+    @property
+    def meal_plan(self) -> List[str]:
+        return [recipe['name'] for recipe in self.recipes]
+
+    def _merge_targets(self) -> Dict[str, Tuple[str, str]]:
+        """Per ingredient, the quantified line its unquantified mentions fold into (see meal_planner)."""
+        return _merge_targets((_ingredient_id(key), line['unit']) for key, line in self.lines.items()
+                              if line['unit'] is not None)
+
+    def _line_notes(self, key: str, targets: Dict[str, Tuple[str, str]]) -> List[str]:
+        line = self.lines[key]
+        notes = list(line['notes'])
+        ingredient_id = _ingredient_id(key)
+        if targets.get(ingredient_id) == (ingredient_id, line['unit']):
+            unquantified = self.lines.get(_line_key(ingredient_id, None))
+            if unquantified is not None and TO_TASTE in unquantified['notes'] and TO_TASTE not in notes:
+                notes.append(TO_TASTE)
+        return notes
+
+    def render_line(self, key: str, targets: Optional[Dict[str, Tuple[str, str]]] = None) -> Optional[str]:
+        """
+        Formats one line the way consolidate_ingredients does, or None if the line is
+        gone or, being unquantified, is shown on the ingredient's quantified line.
+        """
+        line = self.lines.get(key)
+        if line is None:
+            return None
+        if targets is None:
+            targets = self._merge_targets()
+        item = next(iter(line['items']))
+        if line['unit'] is None:
+            return item if _ingredient_id(key) not in targets else None
+        return _format_grocery_line(item, line['unit'], line['quantity'], self._line_notes(key, targets))
+
+    def _render_lines(self, ingredient_ids=None) -> Dict[str, str]:
+        """Rendered text of the shown lines, optionally only those of some ingredients."""
+        targets = self._merge_targets()
+        rendered = {}
+        for key in self.lines:
+            if ingredient_ids is None or _ingredient_id(key) in ingredient_ids:
+                text = self.render_line(key, targets)
+                if text is not None:
+                    rendered[key] = text
+        return rendered
+
+    def render(self) -> List[str]:
+        """The full grocery list as strings, sorted like consolidate_ingredients output."""
+        return sorted(self._render_lines().values())
+
+    def structured_lines(self) -> List[Dict[str, Any]]:
+        """
+        The list as dicts with item, quantity, unit, notes and source recipes, in the
+        same order as render(). quantity and unit are None for unquantified lines.
+        """
+        targets = self._merge_targets()
+        lines = []
+        for key, text in self._render_lines().items():
+            line = self.lines[key]
+            lines.append({
+                'key': key,
+                'item': next(iter(line['items'])),
+                'quantity': line['quantity'] if line['unit'] is not None else None,
+                'unit': line['unit'],
+                'notes': self._line_notes(key, targets) if line['unit'] is not None else [],
+                'recipes': list(line['recipes']),
+                'text': text,
+            })
+        return sorted(lines, key=lambda line: line['text'])
+
+    def scale(self, factor: float) -> List[Dict[str, Optional[str]]]:
+        """Multiplies every quantity (e.g. to cook for more people). Returns the changed lines."""
+        if factor <= 0:
+            raise ValueError("Scale factor must be positive")
+        before = self._render_lines()
+        for line in self.lines.values():
+            line['quantity'] *= factor
+        for recipe in self.recipes:
+            for contribution in recipe['contributions']:
+                if contribution[1] is not None:
+                    contribution[1] *= factor
+        after = self._render_lines()
+        return [{'key': key, 'previous': previous, 'line': after.get(key)}
+                for key, previous in before.items() if after.get(key) != previous]
+
+    def merge(self, other: "GroceryAggregate") -> List[Dict[str, Optional[str]]]:
+        """Adds another plan's recipes to this one. Returns the changed lines."""
+        changes: Dict[str, Dict[str, Optional[str]]] = {}
+        for recipe in copy.deepcopy(other.recipes):
+            self.recipes.append(recipe)
+            for change in self._apply(recipe['name'], recipe['contributions'], sign=1):
+                changes.setdefault(change['key'], {'key': change['key'], 'previous': change['previous']})['line'] = change['line']
+        return [change for change in changes.values() if change['line'] != change['previous']]
+
+    def add_recipe(self, name: str, parsed_lines: List[Optional[ParsedIngredient]]) -> List[Dict[str, Optional[str]]]:
+        """Adds one occurrence of a recipe to the plan. Returns the changed lines."""
+        contributions = []
+        for p_ing in parsed_lines:
+            if not p_ing or not p_ing.item:
+                continue
+            item, ingredient_id, unit, quantity = convert_for_consolidation(p_ing)
+            if quantity is not None:
+                notes = p_ing.notes
+            else:
+                # Unquantified lines only keep 'to taste', to show on a quantified line of the item
+                notes = TO_TASTE if _is_to_taste(p_ing) else None
+            contributions.append([_line_key(ingredient_id, unit), quantity, item, notes])
+
+        self.recipes.append({'name': name, 'contributions': contributions})
+        return self._apply(name, contributions, sign=1)
+
+    def remove_recipe(self, name: str) -> Optional[List[Dict[str, Optional[str]]]]:
+        """
+        Removes the most recently added occurrence of a recipe. Returns the changed
+        lines, or None if the recipe is not in the plan.
+        """
+        for index in range(len(self.recipes) - 1, -1, -1):
+            if self.recipes[index]['name'] == name:
+                recipe = self.recipes.pop(index)
+                return self._apply(name, recipe['contributions'], sign=-1)
+        return None
+
+    def _apply(self, name: str, contributions: List[List[Any]], sign: int) -> List[Dict[str, Optional[str]]]:
+        """
+        Adds (sign=1) or subtracts (sign=-1) contributions; returns before/after for the
+        lines of touched ingredients, since an unquantified line can fold into another.
+        """
+        touched = {_ingredient_id(key) for key, _, _, _ in contributions}
+        before = self._render_lines(touched)
+
+        for key, quantity, item, notes in contributions:
+            line = self.lines.get(key)
+            if line is None:
+                if sign < 0:
+                    continue
+                _, _, unit = key.rpartition('|')
+                line = self.lines[key] = {'unit': unit or None, 'quantity': 0.0, 'notes': {}, 'items': {}, 'recipes': {}}
+            _increment(line['recipes'], name, sign)
+            _increment(line['items'], item, sign)
+            if notes:
+                _increment(line['notes'], notes, sign)
+            if quantity is not None:
+                line['quantity'] += sign * quantity
+            if not line['recipes']:
+                # Drop emptied lines outright so float residue never shows up as a line
+                del self.lines[key]
+
+        after = self._render_lines(touched)
+        changes = []
+        for key in dict.fromkeys([*before, *after]):
+            if after.get(key) != before.get(key):
+                changes.append({'key': key, 'previous': before.get(key), 'line': after.get(key)})
+        return changes
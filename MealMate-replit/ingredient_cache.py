@@ -0,0 +1,209 @@
+"""
+Persistent cache of parsed ingredient lines for MealMate.
+
+Parsed results are stored in a small SQLite database so they are shared by
+every user and every gunicorn worker on the node, and survive restarts.
+Entries are keyed by the normalized ingredient text plus a parser version
+string (model name + prompt revision), so changing the prompt or model
+naturally stops old entries from being served.
+"""
+
+import os
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from typing import Any, Dict, Iterable, Optional
+
+DEFAULT_CACHE_PATH = os.environ.get("INGREDIENT_CACHE_PATH", "user_data/ingredient_cache.sqlite3")
+DEFAULT_MAX_ENTRIES = int(os.environ.get("INGREDIENT_CACHE_MAX_ENTRIES", "50000"))
+
+# Only refresh an entry's last-used timestamp this often, so that cache hits
+# don't turn every read into a write.
+TOUCH_INTERVAL_SECONDS = 3600
+
+# When the cache grows past max_entries, trim it down to this fraction.
+EVICTION_TARGET_RATIO = 0.9
+
+# Check the table size after this many inserts rather than after every one.
+EVICTION_CHECK_EVERY = 100
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_ingredient_text(text: str) -> str:
+    """Normalizes a raw ingredient line for use as a cache key."""
+    return _WHITESPACE_RE.sub(" ", text.strip().lower())
+
+
+class IngredientParseCache:
+    """Size-bounded, SQLite-backed LRU cache of parsed ingredient lines."""
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, version: str = "", max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.path = path
+        self.version = version
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._inserts_since_check = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _connection(self) -> sqlite3.Connection:
+        """Returns this thread's connection, creating the database on first use."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS parsed_ingredients (
+                       key TEXT PRIMARY KEY,
+                       version TEXT NOT NULL,
+                       text TEXT NOT NULL,
+                       data TEXT NOT NULL,
+                       created_at REAL NOT NULL,
+                       last_used REAL NOT NULL
+                   )"""
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_parsed_ingredients_last_used ON parsed_ingredients (last_used)")
+            conn.commit()
+            self._local.conn = conn
+        return conn
+
+    def _key(self, normalized_text: str) -> str:
+        return hashlib.sha256(f"{self.version}\n{normalized_text}".encode("utf-8")).hexdigest()
+
+    def get(self, ingredient_text: str) -> Optional[Dict[str, Any]]:
+        """Returns the cached parse for a line, or None on a miss."""
+        return self.get_many([ingredient_text]).get(ingredient_text)
+
+    def get_many(self, ingredient_texts: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """Looks up several lines in one query. Returns {text: data} for hits only."""
+        keys_by_text = {text: self._key(normalize_ingredient_text(text)) for text in ingredient_texts}
+        if not keys_by_text:
+            return {}
+
+        rows: Dict[str, tuple] = {}
+        try:
+            conn = self._connection()
+            unique_keys = list(set(keys_by_text.values()))
+            # Stay well under SQLite's bound-parameter limit
+            for start in range(0, len(unique_keys), 500):
+                chunk = unique_keys[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                for key, data, last_used in conn.execute(
+                    f"SELECT key, data, last_used FROM parsed_ingredients WHERE key IN ({placeholders})", chunk
+                ):
+                    rows[key] = (data, last_used)
+
+            now = time.time()
+            stale = [(now, key) for key, (_, last_used) in rows.items() if now - last_used > TOUCH_INTERVAL_SECONDS]
+            if stale:
+                conn.executemany("UPDATE parsed_ingredients SET last_used = ? WHERE key = ?", stale)
+                conn.commit()
+        except sqlite3.Error as e:
+            print(f"Ingredient cache lookup failed: {e}")
+            rows = {}
+
+        results = {}
+        for text, key in keys_by_text.items():
+            if key in rows:
+                try:
+                    results[text] = json.loads(rows[key][0])
+                except json.JSONDecodeError:
+                    continue
+
+        with self._lock:
+            self.hits += len(results)
+            self.misses += len(keys_by_text) - len(results)
+        return results
+
+    def set(self, ingredient_text: str, data: Dict[str, Any]):
+        """Stores the parse for a single line."""
+        self.set_many({ingredient_text: data})
+
+    def set_many(self, entries: Dict[str, Dict[str, Any]]):
+        """Stores several parsed lines in one transaction."""
+        if not entries:
+            return
+
+        now = time.time()
+        rows = []
+        for text, data in entries.items():
+            normalized = normalize_ingredient_text(text)
+            rows.append((self._key(normalized), self.version, normalized, json.dumps(data), now, now))
+
+        try:
+            conn = self._connection()
+            conn.executemany(
+                "INSERT OR REPLACE INTO parsed_ingredients (key, version, text, data, created_at, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            conn.commit()
+        except sqlite3.Error as e:
+            print(f"Ingredient cache write failed: {e}")
+            return
+
+        with self._lock:
+            self._inserts_since_check += len(rows)
+            check_size = self._inserts_since_check >= EVICTION_CHECK_EVERY
+            if check_size:
+                self._inserts_since_check = 0
+        if check_size:
+            self.evict()
+
+    def evict(self) -> int:
+        """Drops least-recently-used entries once the cache is over its size bound."""
+        try:
+            conn = self._connection()
+            (count,) = conn.execute("SELECT COUNT(*) FROM parsed_ingredients").fetchone()
+            if count <= self.max_entries:
+                return 0
+
+            to_remove = count - int(self.max_entries * EVICTION_TARGET_RATIO)
+            conn.execute(
+                "DELETE FROM parsed_ingredients WHERE key IN "
+                "(SELECT key FROM parsed_ingredients ORDER BY last_used ASC LIMIT ?)",
+                (to_remove,),
+            )
+            conn.commit()
+        except sqlite3.Error as e:
+            print(f"Ingredient cache eviction failed: {e}")
+            return 0
+
+        with self._lock:
+            self.evictions += to_remove
+        return to_remove
+
+    def clear(self):
+        """Removes every cached entry, for all parser versions."""
+        conn = self._connection()
+        conn.execute("DELETE FROM parsed_ingredients")
+        conn.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        """Returns hit/miss counters for this process plus the shared entry count."""
+        try:
+            (entries,) = self._connection().execute("SELECT COUNT(*) FROM parsed_ingredients").fetchone()
+        except sqlite3.Error:
+            entries = None
+
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'version': self.version,
+                'entries': entries,
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
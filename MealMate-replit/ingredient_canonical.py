@@ -0,0 +1,104 @@
+"""
+Canonical ingredient names for MealMate.
+
+Maps the many ways an ingredient is written ("eggs", "Green Onions",
+"all purpose flour") to one canonical ID ("egg", "scallion",
+"all purpose flour") so grocery-list consolidation, search and caches can
+treat them as the same thing. IDs come from:
+
+- spacing/hyphen/punctuation normalization,
+- singularizing the last word ("cherry tomatoes" -> "cherry tomato"),
+- a synonym table compiled at import into a surface-form -> ID dict.
+
+Lookups are memoized, so repeated items cost one dict lookup.
+"""
+
+import re
+from functools import lru_cache
+from typing import Dict
+
+# canonical name: other ways of writing it (plurals are handled automatically)
+INGREDIENT_SYNONYMS = {
+    'scallion': ['green onion', 'spring onion'],
+    'all-purpose flour': ['all purpose flour', 'ap flour', 'plain flour'],
+    'powdered sugar': ["confectioners' sugar", 'confectioners sugar', 'icing sugar'],
+    'granulated sugar': ['white sugar', 'caster sugar'],
+    'cilantro': ['fresh coriander', 'coriander leaf', 'fresh cilantro'],
+    'chickpea': ['garbanzo bean', 'garbanzo'],
+    'bell pepper': ['sweet pepper', 'capsicum'],
+    'zucchini': ['courgette'],
+    'eggplant': ['aubergine'],
+    'arugula': ['rocket'],
+    'heavy cream': ['heavy whipping cream', 'double cream', 'whipping cream'],
+    'baking soda': ['bicarbonate of soda', 'bicarb soda'],
+    'cornstarch': ['corn starch', 'cornflour'],
+    'shrimp': ['prawn'],
+    'ground beef': ['minced beef', 'beef mince'],
+    'extra-virgin olive oil': ['extra virgin olive oil', 'evoo'],
+    'soy sauce': ['soya sauce'],
+    'egg': ['whole egg'],
+}
+
+# Words whose trailing 's' is not a plural
+NON_PLURAL_WORDS = {
+    'asparagus', 'bass', 'citrus', 'couscous', 'hummus', 'molasses', 'swiss', 'grits',
+    'brussels', 'watercress', 'octopus', 'hibiscus', 'cress', 'lemongrass', 'greens',
+}
+
+IRREGULAR_PLURALS = {
+    'leaves': 'leaf', 'halves': 'half', 'loaves': 'loaf', 'knives': 'knife',
+    'cookies': 'cookie', 'brownies': 'brownie', 'pies': 'pie',
+}
+
+_PUNCTUATION_RE = re.compile(r"[-_/'’.,]+")
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_ingredient_name(text: str) -> str:
+    """Lowercases and turns hyphens, apostrophes and runs of spaces into single spaces."""
+    return _WHITESPACE_RE.sub(" ", _PUNCTUATION_RE.sub(" ", text.lower())).strip()
+
+
+def singularize(word: str) -> str:
+    """Best-effort singular of an English ingredient word."""
+    if word in IRREGULAR_PLURALS:
+        return IRREGULAR_PLURALS[word]
+    if word in NON_PLURAL_WORDS or len(word) <= 3:
+        return word
+    if word.endswith('ies'):
+        return word[:-3] + 'y'
+    if word.endswith(('ches', 'shes', 'sses', 'xes', 'oes')):
+        return word[:-2]
+    if word.endswith('s') and not word.endswith(('ss', 'us', 'is')):
+        return word[:-1]
+    return word
+
+
+def _stem(normalized: str) -> str:
+    """Singularizes the last word of an already normalized name."""
+    head, _, last = normalized.rpartition(' ')
+    last = singularize(last)
+    return f"{head} {last}" if head else last
+
+
+def _compile_synonyms() -> Dict[str, str]:
+    index: Dict[str, str] = {}
+    for canonical, surface_forms in INGREDIENT_SYNONYMS.items():
+        canonical_id = _stem(normalize_ingredient_name(canonical))
+        for form in [canonical, *surface_forms]:
+            index[_stem(normalize_ingredient_name(form))] = canonical_id
+    return index
+
+
+# Stemmed, normalized surface form -> canonical ID
+SYNONYM_INDEX = _compile_synonyms()
+
+
+@lru_cache(maxsize=65536)
+def canonical_ingredient_id(item: str) -> str:
+    """
+    Returns the canonical ID for an ingredient name, e.g. 'Green Onions' -> 'scallion',
+    'all-purpose flour' -> 'all purpose flour', 'eggs' -> 'egg'.
+    """
+    stemmed = _stem(normalize_ingredient_name(item))
+    return SYNONYM_INDEX.get(stemmed, stemmed)
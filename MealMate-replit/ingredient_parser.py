@@ -0,0 +1,278 @@
+"""
+Local, rule-based ingredient line parser for MealMate.
+
+Handles the common shapes of ingredient lines ("1 1/2 cups chopped walnuts",
+"½ lb unsalted butter, softened", "2-3 cloves garlic") without a network call.
+Every parse comes with a confidence score; callers send only low-confidence
+lines on to Gemini.
+
+Run this file directly for an accuracy and speed benchmark against the
+examples used in the Gemini parsing prompt.
+"""
+
+import os
+import re
+import time
+from dataclasses import dataclass
+from typing import List, Optional
+
+from meal_planner import ParsedIngredient, UNIT_ALIASES, UNIT_TYPES_MAP
+
+# Bump whenever the parsing rules change in a way that alters results
+LOCAL_PARSER_VERSION = 2
+
+# Lines scoring below this are handed to Gemini instead
+LOCAL_PARSE_CONFIDENCE_THRESHOLD = float(os.environ.get("LOCAL_PARSE_CONFIDENCE_THRESHOLD", "0.75"))
+
+UNICODE_FRACTIONS = {
+    '½': '1/2', '⅓': '1/3', '⅔': '2/3', '¼': '1/4', '¾': '3/4',
+    '⅕': '1/5', '⅖': '2/5', '⅗': '3/5', '⅘': '4/5', '⅙': '1/6', '⅚': '5/6',
+    '⅛': '1/8', '⅜': '3/8', '⅝': '5/8', '⅞': '7/8',
+}
+
+# Single-letter abbreviations are case sensitive ("1 T" vs "1 t"); everything else is not
+_CASE_SENSITIVE_UNITS = {'T': 'tablespoon', 't': 'teaspoon'}
+
+# Standard (singular) unit name for every spelling we accept: meal_planner's units
+# and aliases, which consolidation normalizes with too, plus the case-sensitive ones
+UNIT_SPELLINGS = {unit: UNIT_ALIASES.get(unit, unit) for unit in UNIT_TYPES_MAP if unit != 'to taste'}
+UNIT_SPELLINGS.update(UNIT_ALIASES)
+UNIT_SPELLINGS.update(_CASE_SENSITIVE_UNITS)
+
+# Prep and size words dropped from item names, as in the Gemini prompt's examples
+PREP_WORDS = {
+    'chopped', 'diced', 'minced', 'peeled', 'sliced', 'crushed', 'cubed', 'halved', 'quartered',
+    'trimmed', 'rinsed', 'drained', 'packed', 'softened', 'melted', 'sifted', 'beaten', 'divided',
+    'finely', 'coarsely', 'roughly', 'thinly', 'freshly', 'lightly', 'kosher',
+    'large', 'extra-large', 'medium', 'small',
+}
+
+# Measures we don't have a standard unit for yet; a count followed by one of
+# these ("1 bunch cilantro") is left to Gemini rather than guessed at
+UNLISTED_MEASURES = {
+    'bunch', 'bunches', 'handful', 'handfuls', 'stick', 'sticks', 'piece', 'pieces',
+    'bag', 'bags', 'box', 'boxes', 'bottle', 'bottles', 'container', 'containers',
+    'pint', 'pints', 'quart', 'quarts', 'gallon', 'gallons', 'envelope', 'envelopes',
+}
+
+# Whole-phrase rewrites applied to the cleaned item name
+ITEM_REWRITES = {
+    'half-and-half': 'half and half',
+    'freshly ground black pepper': 'black pepper',
+}
+
+# Count units that can also follow the item ("3 garlic cloves")
+TRAILING_COUNT_UNITS = {spelling: unit for spelling, unit in UNIT_SPELLINGS.items()
+                        if UNIT_TYPES_MAP.get(unit) == 'count' and unit != 'each'}
+
+_NUMBER = r"\d+\s+\d+/\d+|\d+/\d+|\d+(?:\.\d+)?"
+_QUANTITY_RE = re.compile(
+    rf"^(?P<qty>{_NUMBER})(?:\s*(?:-|–|to)\s*(?P<qty_high>{_NUMBER}))?\s*"
+)
+_UNIT_RE = re.compile(
+    r"^(?P<unit>" + "|".join(
+        re.escape(alias) for alias in sorted(UNIT_SPELLINGS, key=len, reverse=True)
+    ) + r")\.?(?=\s|$)(?:\s+of\b)?\s*",
+    re.IGNORECASE,
+)
+# "to taste" on a line without a quantity is its unit ("Salt and pepper, to taste")
+_TO_TASTE_RE = re.compile(r"[\s,]*\bto taste\b[\s,]*", re.IGNORECASE)
+_PAREN_RE = re.compile(r"\(([^)]*)\)")
+_WHITESPACE_RE = re.compile(r"\s+")
+_DIGIT_RE = re.compile(r"\d")
+
+
+@dataclass
+class LocalParseResult:
+    ingredient: ParsedIngredient
+    confidence: float
+
+
+def _replace_unicode_fractions(text: str) -> str:
+    """Turns '1½' / '1 ½' / '½' into '1 1/2' / '1 1/2' / '1/2'."""
+    for symbol, fraction in UNICODE_FRACTIONS.items():
+        if symbol in text:
+            text = re.sub(rf"(\d)\s*{symbol}", rf"\1 {fraction}", text)
+            text = text.replace(symbol, fraction)
+    return text
+
+
+def _to_number(text: str) -> float:
+    """Converts '1 1/2', '3/4' or '2.5' to a float."""
+    total = 0.0
+    for part in text.split():
+        if '/' in part:
+            numerator, denominator = part.split('/')
+            total += float(numerator) / float(denominator)
+        else:
+            total += float(part)
+    return total
+
+
+def _clean_item(text: str) -> str:
+    """Lowercases an item name and drops prep words from it."""
+    lowered = text.lower().strip()
+    for phrase, replacement in ITEM_REWRITES.items():
+        lowered = lowered.replace(phrase, replacement)
+
+    kept = [word for word in lowered.split() if word.strip(',;') not in PREP_WORDS]
+    item = " ".join(kept).strip(" ,;-")
+    if item.startswith("of "):
+        item = item[3:]
+    return item
+
+
+def _clean_notes(text: str) -> Optional[str]:
+    """Returns None for notes that are only prep words (e.g. 'minced')."""
+    notes = text.strip(" ,;")
+    if not notes:
+        return None
+    if all(word.strip(',;').lower() in PREP_WORDS | {'and', 'or'} for word in notes.split()):
+        return None
+    return notes
+
+
+def parse_ingredient_line_locally(ingredient_text: str) -> LocalParseResult:
+    """
+    Parses an ingredient line with local rules.
+    Always returns a result; confidence (0.0 - 1.0) says how much to trust it.
+    """
+    text = _WHITESPACE_RE.sub(" ", _replace_unicode_fractions(ingredient_text)).strip()
+    confidence = 1.0
+    notes_parts: List[str] = []
+
+    # Parenthetical asides ("(14.5 ounce)", "(optional)") become notes
+    for aside in _PAREN_RE.findall(text):
+        notes_parts.append(aside.strip())
+        confidence -= 0.3
+    text = _PAREN_RE.sub(" ", text)
+    text = _WHITESPACE_RE.sub(" ", text).strip()
+
+    quantity: Optional[float] = None
+    unit: Optional[str] = None
+
+    quantity_match = _QUANTITY_RE.match(text)
+    if quantity_match:
+        quantity_text = quantity_match.group('qty_high') or quantity_match.group('qty')
+        try:
+            quantity = _to_number(quantity_text)
+        except (ValueError, ZeroDivisionError):
+            quantity = None
+            confidence -= 0.5
+        text = text[quantity_match.end():]
+
+        unit_match = _UNIT_RE.match(text)
+        if unit_match:
+            raw_unit = unit_match.group('unit')
+            unit = _CASE_SENSITIVE_UNITS.get(raw_unit) or UNIT_SPELLINGS[raw_unit.lower()]
+            text = text[unit_match.end():]
+        else:
+            # A bare count ("12 eggs", "1 red onion")
+            unit = 'each'
+            first_word = text.split(' ', 1)[0].lower()
+            if first_word in UNLISTED_MEASURES:
+                confidence -= 0.4
+    elif _DIGIT_RE.search(text):
+        # Digits somewhere other than the front ("Salt, 1 pinch") - not a shape we know
+        confidence -= 0.4
+    elif _TO_TASTE_RE.search(text):
+        unit = 'to taste'
+        text = _TO_TASTE_RE.sub(" ", text).strip()
+
+    item_text, _, notes_text = text.partition(',')
+    item = _clean_item(item_text)
+    if unit == 'each' and ' ' in item and item.rsplit(' ', 1)[1] in TRAILING_COUNT_UNITS:
+        item, trailing_unit = item.rsplit(' ', 1)
+        unit = TRAILING_COUNT_UNITS[trailing_unit]
+    notes = _clean_notes(notes_text)
+    if notes:
+        notes_parts.append(notes)
+
+    if not item:
+        confidence = 0.0
+    if ' or ' in f" {item} ":
+        confidence -= 0.3  # alternatives ("butter or margarine")
+    if _DIGIT_RE.search(item):
+        confidence -= 0.3  # leftover numbers usually mean a second quantity
+    if len(item.split()) > 5:
+        confidence -= 0.2
+    if quantity is None and len(item.split()) > 4:
+        confidence -= 0.2
+
+    ingredient = ParsedIngredient(
+        quantity=quantity,
+        unit=unit,
+        item=item or ingredient_text.strip(),
+        notes=", ".join(notes_parts) if notes_parts else None,
+    )
+    return LocalParseResult(ingredient=ingredient, confidence=max(0.0, min(1.0, confidence)))
+
+
+# --- Benchmark ---
+# The examples from the Gemini parsing prompt, plus a few other common shapes
+BENCHMARK_EXAMPLES = [
+    ("1 1/2 cups chopped walnuts", ParsedIngredient(quantity=1.5, unit="cup", item="walnuts", notes=None)),
+    ("12 extra-large eggs", ParsedIngredient(quantity=12.0, unit="each", item="eggs", notes=None)),
+    ("1/2 pound unsalted butter, at room temperature",
+     ParsedIngredient(quantity=0.5, unit="pound", item="unsalted butter", notes="at room temperature")),
+    ("Kosher salt and freshly ground black pepper",
+     ParsedIngredient(quantity=None, unit=None, item="salt and black pepper", notes=None)),
+    ("1 red onion, 1 1/2-inch-diced", ParsedIngredient(quantity=1.0, unit="each", item="red onion", notes="1 1/2-inch-diced")),
+    ("1 cup half-and-half", ParsedIngredient(quantity=1.0, unit="cup", item="half and half", notes=None)),
+    ("2 cloves garlic, minced", ParsedIngredient(quantity=2.0, unit="clove", item="garlic", notes=None)),
+    ("½ lb ground beef", ParsedIngredient(quantity=0.5, unit="pound", item="ground beef", notes=None)),
+    ("2-3 tbsp. olive oil", ParsedIngredient(quantity=3.0, unit="tablespoon", item="olive oil", notes=None)),
+    ("1¼ cups all-purpose flour", ParsedIngredient(quantity=1.25, unit="cup", item="all-purpose flour", notes=None)),
+    # Harder shapes, with the answer Gemini is asked for; the parser should either
+    # get these right or score them below the threshold so Gemini gets them
+    ("Salt to taste", ParsedIngredient(quantity=None, unit="to taste", item="salt", notes=None)),
+    ("Salt and pepper, to taste", ParsedIngredient(quantity=None, unit="to taste", item="salt and pepper", notes=None)),
+    ("3 garlic cloves, minced", ParsedIngredient(quantity=3.0, unit="clove", item="garlic", notes=None)),
+    ("3 T sugar", ParsedIngredient(quantity=3.0, unit="tablespoon", item="sugar", notes=None)),
+    ("1 t vanilla extract", ParsedIngredient(quantity=1.0, unit="teaspoon", item="vanilla extract", notes=None)),
+    ("2 to 3 pounds chicken thighs", ParsedIngredient(quantity=3.0, unit="pound", item="chicken thighs", notes=None)),
+    ("Fresh parsley, for garnish", ParsedIngredient(quantity=None, unit=None, item="fresh parsley", notes="for garnish")),
+    ("1 (14.5 ounce) can diced tomatoes", ParsedIngredient(quantity=1.0, unit="can", item="tomatoes", notes="14.5 ounce")),
+    ("2 tablespoons butter or margarine",
+     ParsedIngredient(quantity=2.0, unit="tablespoon", item="butter or margarine", notes=None)),
+    ("1 bunch cilantro", ParsedIngredient(quantity=1.0, unit="bunch", item="cilantro", notes=None)),
+    ("1 16-ounce package spaghetti", ParsedIngredient(quantity=1.0, unit="package", item="spaghetti", notes="16-ounce")),
+    ("Juice of 1 lemon", ParsedIngredient(quantity=1.0, unit="each", item="lemon juice", notes=None)),
+]
+
+
+def run_benchmark(iterations: int = 2000):
+    """Prints field-level accuracy and per-line latency on BENCHMARK_EXAMPLES."""
+    correct_lines = 0
+    confident_lines = 0
+    confident_wrong = 0
+    for text, expected in BENCHMARK_EXAMPLES:
+        result = parse_ingredient_line_locally(text)
+        parsed = result.ingredient
+        matches = (
+            parsed.quantity == expected.quantity and parsed.unit == expected.unit
+            and parsed.item == expected.item and parsed.notes == expected.notes
+        )
+        correct_lines += matches
+        confident = result.confidence >= LOCAL_PARSE_CONFIDENCE_THRESHOLD
+        confident_lines += confident
+        confident_wrong += confident and not matches
+        status = "ok  " if matches else ("MISS" if confident else "LLM ")
+        print(f"{status} conf={result.confidence:.2f} {text!r} -> "
+              f"{parsed.quantity} | {parsed.unit} | {parsed.item} | {parsed.notes}")
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        for text, _ in BENCHMARK_EXAMPLES:
+            parse_ingredient_line_locally(text)
+    elapsed = time.perf_counter() - start
+    lines = iterations * len(BENCHMARK_EXAMPLES)
+
+    print(f"\nAccuracy: {correct_lines}/{len(BENCHMARK_EXAMPLES)} lines fully correct")
+    print(f"Confident (>= {LOCAL_PARSE_CONFIDENCE_THRESHOLD}): {confident_lines}/{len(BENCHMARK_EXAMPLES)} lines, "
+          f"{confident_wrong} of them wrong (LLM: handed to Gemini)")
+    print(f"Speed: {elapsed / lines * 1e6:.1f} µs per line ({lines} lines in {elapsed:.3f}s)")
+
+
+if __name__ == "__main__":
+    run_benchmark()
@@ -0,0 +1,123 @@
+"""
+Aho-Corasick keyword matcher.
+
+Finds which of a fixed set of keywords occur as substrings of a text in one
+pass over the text, however many keywords there are. consolidate_ingredients
+uses it for the omit-quantity keyword list and the density-conversion table,
+which used to be scanned with `keyword in item` once per keyword per item.
+"""
+
+import time
+from collections import deque
+from typing import Dict, Iterable, List, Optional
+
+
+class KeywordMatcher:
+    """Matches a fixed list of keywords against texts; earlier keywords take priority."""
+
+    def __init__(self, keywords: Iterable[str]):
+        self.keywords: List[str] = list(dict.fromkeys(keywords))
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        # Keyword indices ending at each state, including those reached via fail links
+        self._output: List[List[int]] = [[]]
+
+        for index, keyword in enumerate(self.keywords):
+            state = 0
+            for char in keyword:
+                next_state = self._goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto[state][char] = next_state
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append([])
+                state = next_state
+            self._output[state].append(index)
+
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[next_state] = self._goto[fallback].get(char, 0)
+                self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+
+    def _step(self, state: int, char: str) -> int:
+        while state and char not in self._goto[state]:
+            state = self._fail[state]
+        return self._goto[state].get(char, 0)
+
+    def contains_any(self, text: str) -> bool:
+        """True if any keyword occurs in text."""
+        state = 0
+        for char in text:
+            state = self._step(state, char)
+            if self._output[state]:
+                return True
+        return False
+
+    def find_all(self, text: str) -> List[str]:
+        """Returns every keyword occurring in text, in keyword order."""
+        found = set()
+        state = 0
+        for char in text:
+            state = self._step(state, char)
+            found.update(self._output[state])
+        return [self.keywords[index] for index in sorted(found)]
+
+    def first_match(self, text: str) -> Optional[str]:
+        """Returns the earliest-listed keyword occurring in text, or None."""
+        best = None
+        state = 0
+        for char in text:
+            state = self._step(state, char)
+            for index in self._output[state]:
+                if best is None or index < best:
+                    best = index
+        return None if best is None else self.keywords[best]
+
+
+if __name__ == "__main__":
+    import random
+    from meal_planner import (ParsedIngredient, consolidate_ingredients,
+                              ITEMS_TO_OMIT_QUANTITY_FOR_SMALL_AMOUNTS, INGREDIENT_DENSITY_CONVERSIONS)
+
+    rng = random.Random(0)
+    items = ['unsalted butter', 'all-purpose flour', 'granulated sugar', 'light brown sugar', 'extra virgin olive oil',
+             'kosher salt', 'black pepper', 'garlic', 'chicken breast', 'yellow onion', 'whole milk', 'large eggs',
+             'cherry tomatoes', 'baby spinach', 'ground cumin', 'fresh parsley', 'lemon zest', 'cheddar cheese',
+             'basmati rice', 'canned chickpeas', 'coconut milk', 'smoked paprika', 'vanilla extract', 'water']
+    units = ['cup', 'tablespoon', 'teaspoon', 'ounce', 'pound', 'gram', 'each', 'clove', None]
+
+    # Matcher results must agree with the plain substring scans
+    omit_matcher = KeywordMatcher(ITEMS_TO_OMIT_QUANTITY_FOR_SMALL_AMOUNTS)
+    density_matcher = KeywordMatcher(INGREDIENT_DENSITY_CONVERSIONS)
+    for item in items:
+        assert omit_matcher.contains_any(item) == any(k in item for k in ITEMS_TO_OMIT_QUANTITY_FOR_SMALL_AMOUNTS), item
+        assert density_matcher.first_match(item) == next((k for k in INGREDIENT_DENSITY_CONVERSIONS if k in item), None), item
+
+    iterations = 20000
+    start = time.perf_counter()
+    for _ in range(iterations):
+        for item in items:
+            any(keyword in item for keyword in ITEMS_TO_OMIT_QUANTITY_FOR_SMALL_AMOUNTS)
+    scan = (time.perf_counter() - start) / (iterations * len(items))
+    start = time.perf_counter()
+    for _ in range(iterations):
+        for item in items:
+            omit_matcher.contains_any(item)
+    matched = (time.perf_counter() - start) / (iterations * len(items))
+    print(f"omit-quantity check: substring scan {scan * 1e6:.2f} us, matcher {matched * 1e6:.2f} us per item")
+
+    for size in (1000, 5000, 20000):
+        parsed = [ParsedIngredient(quantity=rng.choice([None, 0.25, 1, 2, 3.5]), unit=rng.choice(units),
+                                   item=f"{rng.choice(items)}{'' if rng.random() < 0.8 else ' ' + str(rng.randint(1, size // 10))}")
+                  for _ in range(size)]
+        start = time.perf_counter()
+        grocery_list = consolidate_ingredients(parsed)
+        elapsed = time.perf_counter() - start
+        print(f"consolidate_ingredients: {size} ingredients -> {len(grocery_list)} lines in {elapsed * 1000:.1f} ms")
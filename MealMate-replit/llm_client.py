@@ -0,0 +1,420 @@
+"""
+Shared Gemini client for MealMate.
+
+Every Gemini call in the app goes through LLMClient.generate_text, which adds
+what the bare SDK calls lacked:
+
+- a token-bucket rate limiter and a cap on concurrent calls,
+- a per-call timeout,
+- exponential backoff with jitter on retryable errors (quota, 5xx, timeouts),
+- a circuit breaker that fails fast while the API is degraded,
+- per-task latency, error and token metrics.
+
+Limits apply per process; with several gunicorn workers the effective
+limits are multiplied by the worker count.
+
+The model calls themselves are made by a backend chosen with LLM_BACKEND:
+"gemini" (default) talks to the real API, "stub" uses the offline,
+deterministic StubBackend from llm_stub.py for load tests and profiling.
+"""
+
+import os
+import time
+import random
+import threading
+from abc import ABC, abstractmethod
+from collections import defaultdict, deque
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+LLM_BACKEND = os.environ.get("LLM_BACKEND", "gemini").lower()
+LLM_RATE_PER_SECOND = float(os.environ.get("LLM_RATE_PER_SECOND", "5"))
+LLM_BURST = int(os.environ.get("LLM_BURST", "10"))
+LLM_MAX_CONCURRENCY = int(os.environ.get("LLM_MAX_CONCURRENCY", "8"))
+LLM_TIMEOUT_SECONDS = float(os.environ.get("LLM_TIMEOUT_SECONDS", "30"))
+LLM_MAX_RETRIES = int(os.environ.get("LLM_MAX_RETRIES", "3"))
+LLM_BACKOFF_BASE_SECONDS = float(os.environ.get("LLM_BACKOFF_BASE_SECONDS", "0.5"))
+LLM_BACKOFF_MAX_SECONDS = float(os.environ.get("LLM_BACKOFF_MAX_SECONDS", "8"))
+LLM_CIRCUIT_FAILURE_THRESHOLD = int(os.environ.get("LLM_CIRCUIT_FAILURE_THRESHOLD", "5"))
+LLM_CIRCUIT_RESET_SECONDS = float(os.environ.get("LLM_CIRCUIT_RESET_SECONDS", "30"))
+
+# How long a call may wait for a rate-limit token or a concurrency slot
+LLM_QUEUE_TIMEOUT_SECONDS = float(os.environ.get("LLM_QUEUE_TIMEOUT_SECONDS", "30"))
+
+
+class LLMError(Exception):
+    """Base class for errors raised by the LLM client itself."""
+
+
+class LLMConfigurationError(LLMError):
+    """The client is missing configuration, such as the API key."""
+
+
+class CircuitOpenError(LLMError):
+    """The circuit breaker is open, so the call was not attempted."""
+
+
+class LLMBusyError(LLMError):
+    """No rate-limit token or concurrency slot became free in time."""
+
+
+def _retryable_exception_types() -> tuple:
+    try:
+        from google.api_core import exceptions as google_exceptions
+    except ImportError:
+        return (TimeoutError, ConnectionError)
+    return (
+        google_exceptions.ResourceExhausted,
+        google_exceptions.TooManyRequests,
+        google_exceptions.ServiceUnavailable,
+        google_exceptions.InternalServerError,
+        google_exceptions.DeadlineExceeded,
+        google_exceptions.GatewayTimeout,
+        TimeoutError,
+        ConnectionError,
+    )
+
+
+RETRYABLE_EXCEPTIONS = _retryable_exception_types()
+
+
+@dataclass
+class LLMResponse:
+    text: str
+    prompt_tokens: int = 0
+    output_tokens: int = 0
+
+
+class LLMBackend(ABC):
+    """
+    Makes a single model call. task is the caller's label for the call (e.g.
+    "ingredient_parse"); real backends ignore it, the stub uses it to decide
+    what shape of answer to produce.
+    """
+
+    name = "base"
+
+    @abstractmethod
+    def generate(self, prompt: str, model_name: str, task: str,
+                 generation_config: Optional[Dict[str, Any]], timeout: float) -> LLMResponse:
+        ...
+
+
+class GeminiBackend(LLMBackend):
+    """Calls the Gemini API through google.generativeai."""
+
+    name = "gemini"
+
+    def __init__(self):
+        self._models: Dict[str, Any] = {}
+        self._configured = False
+        self._lock = threading.Lock()
+
+    def _model(self, model_name: str):
+        """Returns a cached GenerativeModel, configuring the SDK on first use."""
+        with self._lock:
+            if not self._configured:
+                api_key = os.environ.get("GEMINI_API_KEY")
+                if not api_key:
+                    raise LLMConfigurationError(
+                        "GEMINI_API_KEY not found in environment variables or .env file.")
+                import google.generativeai as genai
+                genai.configure(api_key=api_key)
+                self._configured = True
+            if model_name not in self._models:
+                import google.generativeai as genai
+                self._models[model_name] = genai.GenerativeModel(model_name)
+            return self._models[model_name]
+
+    def generate(self, prompt: str, model_name: str, task: str,
+                 generation_config: Optional[Dict[str, Any]], timeout: float) -> LLMResponse:
+        response = self._model(model_name).generate_content(
+            prompt,
+            generation_config=generation_config,
+            request_options={'timeout': timeout},
+        )
+        usage = getattr(response, 'usage_metadata', None)
+        return LLMResponse(
+            text=response.text,
+            prompt_tokens=getattr(usage, 'prompt_token_count', 0) or 0,
+            output_tokens=getattr(usage, 'candidates_token_count', 0) or 0,
+        )
+
+
+def create_backend(name: str = LLM_BACKEND) -> LLMBackend:
+    """Builds the backend named by LLM_BACKEND."""
+    if name == "gemini":
+        return GeminiBackend()
+    if name == "stub":
+        from llm_stub import StubBackend
+        return StubBackend()
+    raise LLMConfigurationError(f"Unknown LLM_BACKEND '{name}' (expected 'gemini' or 'stub')")
+
+
+class TokenBucket:
+    """Thread-safe token bucket; a rate of 0 or less disables limiting."""
+
+    def __init__(self, rate_per_second: float, capacity: int):
+        self.rate = rate_per_second
+        self.capacity = max(1, capacity)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, timeout: Optional[float] = None) -> bool:
+        """Takes one token, waiting up to timeout seconds. Returns False on timeout."""
+        if self.rate <= 0:
+            return True
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                wait_seconds = (1 - self._tokens) / self.rate
+
+            if deadline is not None and now + wait_seconds > deadline:
+                return False
+            time.sleep(wait_seconds)
+
+
+class CircuitBreaker:
+    """
+    Opens after failure_threshold consecutive failures and rejects calls for
+    reset_seconds. After that a single trial call is let through (half-open);
+    its outcome closes the circuit again or re-opens it.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int, reset_seconds: float):
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_seconds = reset_seconds
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        """Raises CircuitOpenError if the call should not be attempted."""
+        with self._lock:
+            if self.state == self.OPEN:
+                if time.monotonic() - self._opened_at < self.reset_seconds:
+                    raise CircuitOpenError("Gemini API circuit is open; failing fast")
+                self.state = self.HALF_OPEN
+                self._trial_in_flight = False
+            if self.state == self.HALF_OPEN:
+                if self._trial_in_flight:
+                    raise CircuitOpenError("Gemini API circuit is half-open; trial call in progress")
+                self._trial_in_flight = True
+
+    def cancel_trial(self):
+        """Ends a call that neither succeeded nor failed, so a half-open circuit admits the next trial."""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self._failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+
+
+class LLMMetrics:
+    """Per-task call counters, latency samples and token usage."""
+
+    LATENCY_SAMPLES = 1000
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[str, float]] = defaultdict(lambda: defaultdict(float))
+        self._latencies: Dict[str, deque] = defaultdict(lambda: deque(maxlen=self.LATENCY_SAMPLES))
+
+    def record(self, task: str, outcome: str, latency: float = 0.0, retries: int = 0,
+               prompt_tokens: int = 0, output_tokens: int = 0):
+        with self._lock:
+            counters = self._counters[task]
+            counters['calls'] += 1
+            counters[outcome] += 1
+            counters['retries'] += retries
+            counters['prompt_tokens'] += prompt_tokens
+            counters['output_tokens'] += output_tokens
+            if latency:
+                counters['latency_total'] += latency
+                self._latencies[task].append(latency)
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """Returns counters plus p50/p95/max latency (over recent calls) per task."""
+        with self._lock:
+            result = {}
+            for task, counters in self._counters.items():
+                samples = sorted(self._latencies[task])
+                stats: Dict[str, Any] = {name: int(value) if name != 'latency_total' else round(value, 3)
+                                         for name, value in counters.items()}
+                if samples:
+                    stats['latency_p50'] = round(samples[len(samples) // 2], 3)
+                    stats['latency_p95'] = round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 3)
+                    stats['latency_max'] = round(samples[-1], 3)
+                result[task] = stats
+            return result
+
+
+class LLMClient:
+    """Rate-limited, retrying, circuit-broken access to Gemini models."""
+
+    def __init__(self,
+                 backend: Optional[LLMBackend] = None,
+                 rate_per_second: float = LLM_RATE_PER_SECOND,
+                 burst: int = LLM_BURST,
+                 max_concurrency: int = LLM_MAX_CONCURRENCY,
+                 timeout_seconds: float = LLM_TIMEOUT_SECONDS,
+                 max_retries: int = LLM_MAX_RETRIES,
+                 circuit_failure_threshold: int = LLM_CIRCUIT_FAILURE_THRESHOLD,
+                 circuit_reset_seconds: float = LLM_CIRCUIT_RESET_SECONDS):
+        self.backend = backend or create_backend()
+        self.timeout_seconds = timeout_seconds
+        self.max_retries = max(0, max_retries)
+        self.rate_limiter = TokenBucket(rate_per_second, burst)
+        self.circuit_breaker = CircuitBreaker(circuit_failure_threshold, circuit_reset_seconds)
+        self.metrics = LLMMetrics()
+        self._slots = threading.BoundedSemaphore(max(1, max_concurrency))
+
+    def _backoff_delay(self, attempt: int) -> float:
+        """Full-jitter exponential backoff for the given retry attempt (1-based)."""
+        ceiling = min(LLM_BACKOFF_MAX_SECONDS, LLM_BACKOFF_BASE_SECONDS * (2 ** (attempt - 1)))
+        return random.uniform(0, ceiling)
+
+    def generate_text(self, prompt: str, model_name: str, task: str = "default",
+                      generation_config: Optional[Dict[str, Any]] = None,
+                      timeout: Optional[float] = None) -> str:
+        """
+        Sends a prompt to a Gemini model and returns the response text.
+        task labels the call in metrics. Raises CircuitOpenError or LLMBusyError
+        without calling the API, or the SDK's exception once retries run out.
+        """
+        timeout = timeout or self.timeout_seconds
+        retries = 0
+
+        while True:
+            # Queue first: once before_call admits a half-open trial, every
+            # exit below must settle it
+            if not self.rate_limiter.acquire(timeout=LLM_QUEUE_TIMEOUT_SECONDS):
+                self.metrics.record(task, 'rejected', retries=retries)
+                raise LLMBusyError("Timed out waiting for the Gemini rate limiter")
+            if not self._slots.acquire(timeout=LLM_QUEUE_TIMEOUT_SECONDS):
+                self.metrics.record(task, 'rejected', retries=retries)
+                raise LLMBusyError("Timed out waiting for a free Gemini call slot")
+            try:
+                self.circuit_breaker.before_call()
+            except CircuitOpenError:
+                self._slots.release()
+                raise
+
+            start = time.perf_counter()
+            try:
+                response = self.backend.generate(prompt, model_name, task, generation_config, timeout)
+            except RETRYABLE_EXCEPTIONS as e:
+                latency = time.perf_counter() - start
+                self.circuit_breaker.record_failure()
+                if retries >= self.max_retries:
+                    self.metrics.record(task, 'failed', latency, retries)
+                    raise
+                retries += 1
+                delay = self._backoff_delay(retries)
+                print(f"Gemini call for {task} failed ({type(e).__name__}); retry {retries} in {delay:.1f}s")
+            except BaseException:
+                # Not worth retrying (bad request, blocked content, ...) and
+                # not a sign the API is down, so the circuit is left alone
+                self.circuit_breaker.cancel_trial()
+                self.metrics.record(task, 'failed', time.perf_counter() - start, retries)
+                raise
+            else:
+                self.circuit_breaker.record_success()
+                self.metrics.record(
+                    task, 'succeeded', time.perf_counter() - start, retries,
+                    prompt_tokens=response.prompt_tokens,
+                    output_tokens=response.output_tokens,
+                )
+                return response.text
+            finally:
+                self._slots.release()
+
+            time.sleep(delay)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'backend': self.backend.name,
+            'circuit_state': self.circuit_breaker.state,
+            'tasks': self.metrics.snapshot(),
+        }
+
+
+llm_client = LLMClient()
+
+
+if __name__ == "__main__":
+    class ScriptedBackend(LLMBackend):
+        """Answers "ok" unless told to raise."""
+
+        name = "scripted"
+
+        def __init__(self):
+            self.error: Optional[BaseException] = None
+
+        def generate(self, prompt, model_name, task, generation_config, timeout):
+            if self.error is not None:
+                raise self.error
+            return LLMResponse("ok", 1, 1)
+
+    LLM_QUEUE_TIMEOUT_SECONDS = 0.01
+    backend = ScriptedBackend()
+    client = LLMClient(backend, rate_per_second=0, max_concurrency=1, max_retries=0,
+                       circuit_failure_threshold=1, circuit_reset_seconds=0)
+
+    def half_open():
+        client.circuit_breaker.record_failure()
+        assert client.circuit_breaker.state == CircuitBreaker.OPEN
+
+    # A half-open trial that never reaches the API (no free slot) leaves the next call admitted
+    half_open()
+    client._slots.acquire()
+    try:
+        client.generate_text("prompt", "model")
+        raise AssertionError("expected LLMBusyError")
+    except LLMBusyError:
+        pass
+    client._slots.release()
+    assert client.generate_text("prompt", "model") == "ok"
+    assert client.circuit_breaker.state == CircuitBreaker.CLOSED
+
+    # So does a trial ending in an error that says nothing about the API's health
+    half_open()
+    backend.error = ValueError("bad request")
+    try:
+        client.generate_text("prompt", "model")
+        raise AssertionError("expected ValueError")
+    except ValueError:
+        pass
+    backend.error = None
+    assert client.generate_text("prompt", "model") == "ok"
+    assert client.circuit_breaker.state == CircuitBreaker.CLOSED
+    print("circuit breaker: half-open trials settle on every exit")
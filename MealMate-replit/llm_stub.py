@@ -0,0 +1,191 @@
+"""
+Offline stand-in for the Gemini API, selected with LLM_BACKEND=stub.
+
+StubBackend answers the app's prompts with rule-derived or canned JSON of the
+same shape Gemini returns, after a simulated delay, and fails a configurable
+share of calls with the same exceptions the real API raises. Every random
+draw is seeded from LLM_STUB_SEED and the prompt, so a load test or profile
+run behaves the same way each time regardless of thread scheduling.
+
+Settings (environment):
+    LLM_STUB_LATENCY_MS           median latency per call (default 800)
+    LLM_STUB_LATENCY_SIGMA        log-normal spread; 0 gives a fixed latency (default 0.5)
+    LLM_STUB_LATENCY_PER_LINE_MS  extra latency per line in batch parse prompts (default 20)
+    LLM_STUB_ERROR_RATE           share of calls failing with ServiceUnavailable (default 0)
+    LLM_STUB_SEED                 seed for latency and error draws (default 0)
+"""
+
+import os
+import re
+import json
+import time
+import random
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from llm_client import LLMBackend, LLMResponse
+
+LLM_STUB_LATENCY_MS = float(os.environ.get("LLM_STUB_LATENCY_MS", "800"))
+LLM_STUB_LATENCY_SIGMA = float(os.environ.get("LLM_STUB_LATENCY_SIGMA", "0.5"))
+LLM_STUB_LATENCY_PER_LINE_MS = float(os.environ.get("LLM_STUB_LATENCY_PER_LINE_MS", "20"))
+LLM_STUB_ERROR_RATE = float(os.environ.get("LLM_STUB_ERROR_RATE", "0"))
+LLM_STUB_SEED = int(os.environ.get("LLM_STUB_SEED", "0"))
+
+# Prompts whose attempt count is remembered; the least recently seen are forgotten first
+STUB_ATTEMPT_HISTORY = 10000
+
+_SINGLE_LINE_RE = re.compile(r'^\s*Raw ingredient text: "(.*)"\s*$', re.MULTILINE)
+_BATCH_LINE_RE = re.compile(r'^\s*(\d+): (".*")\s*$', re.MULTILINE)
+_SEARCH_REQUEST_RE = re.compile(r'Based on the user request: "(.*)"')
+_QUANTITY_START_RE = re.compile(r"^(\d|[¼½¾⅓⅔⅛⅜⅝⅞]|a pinch|pinch)", re.IGNORECASE)
+
+CANNED_RECIPES = [
+    {
+        "name": "Simple {title} Skillet",
+        "ingredients": ["1 pound chicken breast, diced", "2 tablespoons olive oil", "1 onion, chopped",
+                        "3 cloves garlic, minced", "1 cup chicken broth", "salt and pepper to taste"],
+        "instructions": ["Heat oil in a large skillet", "Brown the chicken on all sides",
+                         "Add onion and garlic and cook until soft", "Pour in broth and simmer 10 minutes",
+                         "Season and serve"],
+        "serving_size": "4 servings",
+    },
+    {
+        "name": "Baked {title}",
+        "ingredients": ["2 cups all-purpose flour", "1 teaspoon baking powder", "1/2 cup unsalted butter, softened",
+                        "3/4 cup granulated sugar", "2 large eggs", "1 teaspoon vanilla extract"],
+        "instructions": ["Preheat oven to 350°F", "Whisk flour and baking powder",
+                         "Cream butter and sugar, then beat in eggs and vanilla",
+                         "Fold in the dry ingredients", "Bake 25 minutes"],
+        "serving_size": "8 servings",
+    },
+    {
+        "name": "{title} Salad",
+        "ingredients": ["4 cups mixed greens", "1 cup cherry tomatoes, halved", "1 cucumber, sliced",
+                        "1/4 cup feta cheese, crumbled", "3 tablespoons olive oil", "1 tablespoon lemon juice"],
+        "instructions": ["Combine greens, tomatoes and cucumber", "Whisk oil and lemon juice",
+                         "Toss with dressing and top with feta"],
+        "serving_size": "2 servings",
+    },
+    {
+        "name": "Slow Cooker {title}",
+        "ingredients": ["2 pounds beef chuck, cubed", "4 carrots, sliced", "3 potatoes, diced",
+                        "2 cups beef broth", "1 tablespoon tomato paste", "1 teaspoon dried thyme"],
+        "instructions": ["Place everything in the slow cooker", "Cook on low for 8 hours",
+                         "Adjust seasoning before serving"],
+        "serving_size": "6 servings",
+    },
+]
+
+
+def _estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+def _parsed_ingredient_json(text: str) -> Dict[str, Any]:
+    from ingredient_parser import parse_ingredient_line_locally
+    return parse_ingredient_line_locally(text).ingredient.model_dump()
+
+
+class StubBackend(LLMBackend):
+    """Deterministic, offline backend that mimics Gemini's answers and failures."""
+
+    name = "stub"
+
+    def __init__(self,
+                 latency_ms: float = LLM_STUB_LATENCY_MS,
+                 latency_sigma: float = LLM_STUB_LATENCY_SIGMA,
+                 latency_per_line_ms: float = LLM_STUB_LATENCY_PER_LINE_MS,
+                 error_rate: float = LLM_STUB_ERROR_RATE,
+                 seed: int = LLM_STUB_SEED):
+        self.latency_ms = latency_ms
+        self.latency_sigma = latency_sigma
+        self.latency_per_line_ms = latency_per_line_ms
+        self.error_rate = error_rate
+        self.seed = seed
+        # Attempts per prompt, so that a retried prompt gets fresh draws
+        self._attempts: "OrderedDict[str, int]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _rng(self, prompt: str) -> random.Random:
+        digest = hashlib.sha1(prompt.encode("utf-8")).hexdigest()
+        with self._lock:
+            attempt = self._attempts.get(digest, 0)
+            self._attempts[digest] = attempt + 1
+            self._attempts.move_to_end(digest)
+            if len(self._attempts) > STUB_ATTEMPT_HISTORY:
+                self._attempts.popitem(last=False)
+        return random.Random(f"{self.seed}:{digest}:{attempt}")
+
+    def _latency_seconds(self, rng: random.Random, line_count: int) -> float:
+        median = self.latency_ms + self.latency_per_line_ms * line_count
+        if self.latency_sigma > 0:
+            median *= rng.lognormvariate(0, self.latency_sigma)
+        return median / 1000
+
+    def generate(self, prompt: str, model_name: str, task: str,
+                 generation_config: Optional[Dict[str, Any]], timeout: float) -> LLMResponse:
+        from google.api_core import exceptions as google_exceptions
+
+        rng = self._rng(prompt)
+        batch_lines = _BATCH_LINE_RE.findall(prompt) if task == "ingredient_parse_batch" else []
+        latency = self._latency_seconds(rng, len(batch_lines))
+        fails = rng.random() < self.error_rate
+
+        if latency > timeout:
+            time.sleep(timeout)
+            raise google_exceptions.DeadlineExceeded(f"Stub {task} call exceeded {timeout}s")
+        time.sleep(latency)
+        if fails:
+            raise google_exceptions.ServiceUnavailable(f"Stub {task} call failed (simulated)")
+
+        if task == "ingredient_parse":
+            text = self._parse_single(prompt)
+        elif task == "ingredient_parse_batch":
+            text = json.dumps([dict(_parsed_ingredient_json(json.loads(line)), index=int(index))
+                               for index, line in batch_lines])
+        elif task == "recipe_extract":
+            text = self._extract_recipe(prompt)
+        elif task == "recipe_generate":
+            text = self._generate_recipes(prompt)
+        else:
+            text = "{}"
+
+        return LLMResponse(text=text, prompt_tokens=_estimate_tokens(prompt), output_tokens=_estimate_tokens(text))
+
+    def _parse_single(self, prompt: str) -> str:
+        match = _SINGLE_LINE_RE.search(prompt)
+        if not match:
+            return "{}"
+        return json.dumps(_parsed_ingredient_json(match.group(1)))
+
+    def _extract_recipe(self, prompt: str) -> str:
+        """Builds a recipe from the page text: quantity-led lines are ingredients, sentences are steps."""
+        _, _, page_text = prompt.partition("Text to parse:")
+        lines = [line.strip() for line in page_text.splitlines() if line.strip()]
+
+        ingredients: List[str] = []
+        instructions: List[str] = []
+        for line in lines[1:]:
+            if _QUANTITY_START_RE.match(line) and len(line) < 80:
+                ingredients.append(line)
+            elif len(line.split()) >= 5:
+                instructions.append(line)
+
+        if not ingredients:
+            canned = CANNED_RECIPES[0]
+            ingredients, instructions = canned["ingredients"], canned["instructions"]
+
+        return json.dumps({
+            "name": lines[0] if lines else "Stub Recipe",
+            "serving_size": "4 servings",
+            "ingredients": ingredients,
+            "instructions": instructions,
+        })
+
+    def _generate_recipes(self, prompt: str) -> str:
+        match = _SEARCH_REQUEST_RE.search(prompt)
+        title = (match.group(1) if match else "House").strip().title() or "House"
+        recipes = [dict(recipe, name=recipe["name"].format(title=title)) for recipe in CANNED_RECIPES]
+        return json.dumps(recipes)
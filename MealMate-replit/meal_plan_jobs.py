@@ -0,0 +1,138 @@
+"""
+Background job queue for meal-plan generation.
+
+Grocery-list generation can take a while when ingredients need Gemini, so
+the API can hand it to a small worker pool and return a job ID straight
+away. Clients then poll the job for progress (ingredients parsed / total)
+and the finished result.
+
+Job state lives in a small SQLite database, like the ingredient parse
+cache, so a poll can be answered by any gunicorn worker on the node, not
+just the one running the job.
+"""
+
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Optional
+
+MEAL_PLAN_JOB_WORKERS = max(1, int(os.environ.get("MEAL_PLAN_JOB_WORKERS", "2")))
+MEAL_PLAN_JOB_DB_PATH = os.environ.get("MEAL_PLAN_JOB_DB_PATH", "user_data/meal_plan_jobs.sqlite3")
+
+# Jobs are forgotten this long after their last update; clients are expected to
+# have polled by then, and an unfinished job this quiet lost its worker
+MEAL_PLAN_JOB_TTL_SECONDS = int(os.environ.get("MEAL_PLAN_JOB_TTL_SECONDS", "3600"))
+
+_COLUMNS = "id, user_id, total, status, parsed, result, error, created_at, updated_at"
+
+
+@dataclass
+class MealPlanJob:
+    id: str
+    user_id: str
+    total: int
+    status: str = "queued"  # queued -> running -> completed | failed
+    parsed: int = 0
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    updated_at: float = field(default_factory=time.time)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'job_id': self.id,
+            'status': self.status,
+            'progress': {'parsed': self.parsed, 'total': self.total},
+            'result': self.result,
+            'error': self.error,
+        }
+
+
+class MealPlanJobQueue:
+    """Runs meal-plan jobs on a bounded thread pool and tracks their state in SQLite."""
+
+    def __init__(self, max_workers: int = MEAL_PLAN_JOB_WORKERS, ttl_seconds: int = MEAL_PLAN_JOB_TTL_SECONDS,
+                 path: str = MEAL_PLAN_JOB_DB_PATH):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="meal-plan-job")
+        self._local = threading.local()
+        self.ttl_seconds = ttl_seconds
+        self.path = path
+
+    def _connection(self) -> sqlite3.Connection:
+        """Returns this thread's connection, creating the database on first use."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS meal_plan_jobs (
+                       id TEXT PRIMARY KEY,
+                       user_id TEXT NOT NULL,
+                       total INTEGER NOT NULL,
+                       status TEXT NOT NULL,
+                       parsed INTEGER NOT NULL,
+                       result TEXT,
+                       error TEXT,
+                       created_at REAL NOT NULL,
+                       updated_at REAL NOT NULL
+                   )"""
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_meal_plan_jobs_updated_at ON meal_plan_jobs (updated_at)")
+            conn.commit()
+            self._local.conn = conn
+        return conn
+
+    def submit(self, user_id: str, total: int,
+               work: Callable[[Callable[[int], None]], Dict[str, Any]]) -> MealPlanJob:
+        """
+        Queues work for a user. work is called with a progress callback taking the
+        number of newly parsed ingredients, and returns the job's result payload.
+        """
+        job = MealPlanJob(id=uuid.uuid4().hex, user_id=user_id, total=total)
+        conn = self._connection()
+        with conn:
+            conn.execute("DELETE FROM meal_plan_jobs WHERE updated_at < ?", (time.time() - self.ttl_seconds,))
+            conn.execute(f"INSERT INTO meal_plan_jobs ({_COLUMNS}) VALUES (?, ?, ?, ?, ?, NULL, NULL, ?, ?)",
+                         (job.id, job.user_id, job.total, job.status, job.parsed, job.created_at, job.updated_at))
+        self._executor.submit(self._run, job.id, work)
+        return job
+
+    def get(self, job_id: str, user_id: str) -> Optional[MealPlanJob]:
+        """Returns a job if it exists and belongs to the user."""
+        row = self._connection().execute(f"SELECT {_COLUMNS} FROM meal_plan_jobs WHERE id = ? AND user_id = ?",
+                                         (job_id, user_id)).fetchone()
+        if row is None:
+            return None
+        job = MealPlanJob(*row)
+        job.result = json.loads(job.result) if job.result is not None else None
+        return job
+
+    def _run(self, job_id: str, work: Callable[[Callable[[int], None]], Dict[str, Any]]):
+        def report_progress(parsed_count: int):
+            self._update(job_id, "parsed = MIN(total, parsed + ?)", parsed_count)
+
+        self._update(job_id, "status = 'running'")
+        try:
+            result = work(report_progress)
+            self._update(job_id, "status = 'completed', parsed = total, result = ?", json.dumps(result))
+        except Exception as e:
+            print(f"Meal plan job {job_id} failed: {e}")
+            self._update(job_id, "status = 'failed', error = ?", str(e))
+
+    def _update(self, job_id: str, assignments: str, *values):
+        conn = self._connection()
+        with conn:
+            conn.execute(f"UPDATE meal_plan_jobs SET {assignments}, updated_at = ? WHERE id = ?",
+                         (*values, time.time(), job_id))
+
+
+meal_plan_jobs = MealPlanJobQueue()
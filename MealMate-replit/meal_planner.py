@@ -1,12 +1,19 @@
 import os
 import json
 from collections import defaultdict
+from functools import lru_cache
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from datetime import datetime, timedelta
-from typing import List, Dict, Optional, Any
+from typing import List, Dict, Optional, Any, Callable, Iterable, Iterator, Tuple
 from pydantic import BaseModel, Field
-import google.generativeai as genai
-from dotenv import load_dotenv
 import re # Import regex for cleaning up JSON response
+from ingredient_cache import IngredientParseCache
+from recipe_cache import recipe_cache
+from unit_registry import UnitRegistry
+from keyword_matcher import KeywordMatcher
+from ingredient_canonical import canonical_ingredient_id
+from llm_client import llm_client
 
 # --- Pydantic Models for Data Transfer and Parsing ---
 class Recipe(BaseModel):
@@ -14,6 +21,8 @@ class Recipe(BaseModel):
     serving_size: Optional[str] = Field(None, description="The serving size of the recipe, e.g., '4 servings' or '6 people'.")
     ingredients: List[str] = Field(description="A list of ingredients for the recipe.")
     instructions: List[str] = Field(description="A list of step-by-step instructions for the recipe.")
+    structured_ingredients: Optional[List[Optional[Dict[str, Any]]]] = Field(None, description="Parsed form of each ingredient line (see ParsedIngredient), aligned with ingredients. Filled in after saving.")
+    structured_ingredients_version: Optional[str] = Field(None, description="Parser version that produced structured_ingredients.")
 
 class ParsedIngredient(BaseModel):
     quantity: Optional[float] = Field(None, description="The numeric quantity. Convert fractions (e.g., '1/2') to decimals (0.5). If no quantity, use None.")
@@ -22,17 +31,39 @@ class ParsedIngredient(BaseModel):
     notes: Optional[str] = Field(None, description="Any additional descriptive text that can't be removed (e.g., 'at room temperature', 'for garnish').")
 
 
-# --- Configure Gemini API ---
-load_dotenv()
+# --- Gemini settings (calls go through llm_client) ---
+PARSING_MODEL_NAME = 'gemini-1.5-pro'
+# Bump whenever the parsing prompt changes so cached parses from the old prompt stop being served
+PARSING_PROMPT_VERSION = 1
 
-try:
-    genai.configure(api_key=os.environ["GEMINI_API_KEY"])
-except KeyError:
-    print("Error: GEMINI_API_KEY not found in environment variables or .env file.")
-    print("Please make sure you have a .env file in the same directory with GEMINI_API_KEY='your_api_key'")
-    exit()
+# Shared, persistent cache of parsed ingredient lines (see ingredient_cache.py)
+ingredient_cache = IngredientParseCache(version=f"{PARSING_MODEL_NAME}:prompt-v{PARSING_PROMPT_VERSION}")
 
-parsing_model = genai.GenerativeModel('gemini-1.5-pro')
+# Upper bound on ingredient lines sent to Gemini in one batch prompt; larger
+# batches produce long responses that are more likely to be truncated or misaligned.
+MAX_INGREDIENT_BATCH_SIZE = 50
+INGREDIENT_BATCH_SIZE = max(1, min(int(os.environ.get("INGREDIENT_BATCH_SIZE", "25")), MAX_INGREDIENT_BATCH_SIZE))
+
+# Concurrency and overall time budget when parsing the ingredients of a whole meal plan
+INGREDIENT_PARSE_CONCURRENCY = max(1, int(os.environ.get("INGREDIENT_PARSE_CONCURRENCY", "4")))
+INGREDIENT_PARSE_DEADLINE_SECONDS = float(os.environ.get("INGREDIENT_PARSE_DEADLINE_SECONDS", "45"))
+
+# Parsing rules and examples shared by the single-line and batch prompts
+PARSING_GUIDELINES = """\
+    - Convert all fractions (e.g., '1/2', '1 1/4') to decimals (e.g., 0.5, 1.25).
+    - If no explicit quantity is specified, output null for quantity.
+    - Standardize units: Use common singular forms (e.g., 'cup', 'pound', 'ounce', 'tablespoon', 'teaspoon', 'each', 'gram', 'ml'). If no clear unit, output null for unit.
+    - Standardize item name: **Preserve key descriptors that change ingredient meaning** (e.g., 'unsalted', 'salted', 'brown', 'white', 'grated', 'shredded'). Only remove general prep words like 'chopped', 'diced', 'minced', 'peeled'.
+    - Capture any remaining notes (e.g., "at room temperature", "for garnish") in the 'notes' field. If none, use null.
+
+    Examples:
+    "1 1/2 cups chopped walnuts" → quantity: 1.5, unit: "cup", item: "walnuts", notes: null  
+    "12 extra-large eggs" → quantity: 12.0, unit: "each", item: "eggs", notes: null  
+    "1/2 pound unsalted butter, at room temperature" → quantity: 0.5, unit: "pound", item: "unsalted butter", notes: "at room temperature"  
+    "Kosher salt and freshly ground black pepper" → quantity: null, unit: null, item: "salt and black pepper", notes: null  
+    "1 red onion, 1 1/2-inch-diced" → quantity: 1.0, unit: "each", item: "red onion", notes: "1 1/2-inch-diced"  
+    "1 cup half-and-half" → quantity: 1.0, unit: "cup", item: "half and half", notes: null
+"""
 
 
 def load_recipes_from_directory(directory="saved_recipes") -> Dict[str, Recipe]:
@@ -46,14 +77,21 @@ def load_recipes_from_directory(directory="saved_recipes") -> Dict[str, Recipe]:
         if filename.endswith(".json"):
             filepath = os.path.join(directory, filename)
             try:
-                with open(filepath, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    recipe = Recipe.model_validate(data)
-                    recipes[recipe.name] = recipe
+                recipe = recipe_cache.load(filepath, Recipe)
+                recipes[recipe.name] = recipe
             except Exception as e:
                 print(f"Error loading recipe from {filename}: {e}")
     return recipes
 
+def _strip_code_fence(text: str) -> str:
+    """Removes a surrounding ```json ... ``` fence from a Gemini response, if present."""
+    json_str = text.strip()
+    if json_str.startswith('```json') and json_str.endswith('```'):
+        json_str = json_str[len('```json'):-len('```')].strip()
+    elif json_str.startswith('```') and json_str.endswith('```'):
+        json_str = json_str[len('```'):-len('```')].strip()
+    return json_str
+
 def parse_ingredient_line_with_gemini(ingredient_text: str) -> Optional[ParsedIngredient]:
     """
     Uses Gemini API to parse a single ingredient string into structured data.
@@ -63,51 +101,219 @@ def parse_ingredient_line_with_gemini(ingredient_text: str) -> Optional[ParsedIn
     prompt = f"""
     Parse the following raw ingredient text into its quantity, standardized unit, standardized item name, and any remaining notes.
 
-    - Convert all fractions (e.g., '1/2', '1 1/4') to decimals (e.g., 0.5, 1.25).
-    - If no explicit quantity is specified, output null for quantity.
-    - Standardize units: Use common singular forms (e.g., 'cup', 'pound', 'ounce', 'tablespoon', 'teaspoon', 'each', 'gram', 'ml'). If no clear unit, output null for unit.
-    - Standardize item name: **Preserve key descriptors that change ingredient meaning** (e.g., 'unsalted', 'salted', 'brown', 'white', 'grated', 'shredded'). Only remove general prep words like 'chopped', 'diced', 'minced', 'peeled'.
-    - Capture any remaining notes (e.g., "at room temperature", "for garnish") in the 'notes' field. If none, use null.
-
-    Examples:
-    "1 1/2 cups chopped walnuts" → quantity: 1.5, unit: "cup", item: "walnuts", notes: null  
-    "12 extra-large eggs" → quantity: 12.0, unit: "each", item: "eggs", notes: null  
-    "1/2 pound unsalted butter, at room temperature" → quantity: 0.5, unit: "pound", item: "unsalted butter", notes: "at room temperature"  
-    "Kosher salt and freshly ground black pepper" → quantity: null, unit: null, item: "salt and black pepper", notes: null  
-    "1 red onion, 1 1/2-inch-diced" → quantity: 1.0, unit: "each", item: "red onion", notes: "1 1/2-inch-diced"  
-    "1 cup half-and-half" → quantity: 1.0, unit: "cup", item: "half and half", notes: null
-
+{PARSING_GUIDELINES}
     Raw ingredient text: "{ingredient_text}"
 
     Output the result as a JSON object with keys: "quantity", "unit", "item", "notes". No markdown or formatting outside the JSON.
     """
 
     try:
-        response = parsing_model.generate_content(
+        response_text = llm_client.generate_text(
             prompt,
-            generation_config=genai.types.GenerationConfig(
-                response_mime_type="text/plain"
-            )
+            model_name=PARSING_MODEL_NAME,
+            task="ingredient_parse",
+            generation_config={"response_mime_type": "text/plain"},
         )
         
-        json_str = response.text.strip()
-        
-        if json_str.startswith('```json') and json_str.endswith('```'):
-            json_str = json_str[len('```json'):-len('```')].strip()
-        elif json_str.startswith('```') and json_str.endswith('```'):
-            json_str = json_str[len('```'):-len('```')].strip()
+        json_str = _strip_code_fence(response_text)
 
         parsed_data = json.loads(json_str)
         parsed_ingredient = ParsedIngredient.model_validate(parsed_data)
         return parsed_ingredient
     except json.JSONDecodeError as e:
         print(f"Error decoding JSON from Gemini response for '{ingredient_text}': {e}")
-        # print(f"Gemini raw response (failed JSON): {response.text}") # Uncomment for debugging
+        # print(f"Gemini raw response (failed JSON): {response_text}") # Uncomment for debugging
         return None
     except Exception as e:
         print(f"Error parsing ingredient '{ingredient_text}' with Gemini (general error): {e}")
         return None
 
+def parse_ingredient_line(ingredient_text: str) -> Optional[ParsedIngredient]:
+    """
+    Parses a single ingredient string. Lines the local rule-based parser handles
+    confidently never leave the process; otherwise the result is served from the
+    ingredient cache when the same line has already been parsed with the current
+    model and prompt. Only successful Gemini parses are cached, so failures are
+    retried next time.
+    """
+    from ingredient_parser import parse_ingredient_line_locally, LOCAL_PARSE_CONFIDENCE_THRESHOLD
+
+    local_result = parse_ingredient_line_locally(ingredient_text)
+    if local_result.confidence >= LOCAL_PARSE_CONFIDENCE_THRESHOLD:
+        return local_result.ingredient
+
+    cached = ingredient_cache.get(ingredient_text)
+    if cached is not None:
+        try:
+            return ParsedIngredient.model_validate(cached)
+        except Exception as e:
+            print(f"Ignoring invalid cached parse for '{ingredient_text}': {e}")
+
+    parsed_ingredient = parse_ingredient_line_with_gemini(ingredient_text)
+    if parsed_ingredient:
+        ingredient_cache.set(ingredient_text, parsed_ingredient.model_dump())
+    return parsed_ingredient
+
+def parse_ingredient_lines_with_gemini(ingredient_texts: List[str]) -> List[Optional[ParsedIngredient]]:
+    """
+    Uses a single Gemini call to parse a batch of ingredient strings.
+    Returns a list aligned by index with ingredient_texts; entries Gemini left
+    out or returned in an invalid shape are None. Raises ValueError if the
+    batch is larger than MAX_INGREDIENT_BATCH_SIZE, and lets API or JSON
+    errors propagate so the caller can decide how to fall back.
+    """
+    if not ingredient_texts:
+        return []
+    if len(ingredient_texts) > MAX_INGREDIENT_BATCH_SIZE:
+        raise ValueError(f"Batch of {len(ingredient_texts)} lines exceeds the limit of {MAX_INGREDIENT_BATCH_SIZE}")
+
+    numbered_lines = "\n".join(
+        f"    {index}: {json.dumps(text, ensure_ascii=False)}" for index, text in enumerate(ingredient_texts)
+    )
+    prompt = f"""
+    Parse each of the following numbered raw ingredient texts into its quantity, standardized unit, standardized item name, and any remaining notes.
+
+{PARSING_GUIDELINES}
+    Raw ingredient texts:
+{numbered_lines}
+
+    Output the result as a JSON array with exactly one object per ingredient text, in the same order.
+    Each object must have the keys: "index" (the number shown before the text), "quantity", "unit", "item", "notes". No markdown or formatting outside the JSON.
+    """
+
+    response_text = llm_client.generate_text(
+        prompt,
+        model_name=PARSING_MODEL_NAME,
+        task="ingredient_parse_batch",
+        generation_config={"response_mime_type": "text/plain"},
+    )
+    parsed_data = json.loads(_strip_code_fence(response_text))
+    if not isinstance(parsed_data, list):
+        raise ValueError("Gemini batch response is not a JSON array")
+
+    results: List[Optional[ParsedIngredient]] = [None] * len(ingredient_texts)
+    for position, entry in enumerate(parsed_data):
+        if not isinstance(entry, dict):
+            continue
+        index = entry.get('index', position)
+        if not isinstance(index, int) or not 0 <= index < len(ingredient_texts) or results[index] is not None:
+            continue
+        try:
+            results[index] = ParsedIngredient.model_validate(entry)
+        except Exception as e:
+            print(f"Error validating batch entry for '{ingredient_texts[index]}': {e}")
+    return results
+
+def parse_ingredient_lines(ingredient_texts: List[str], batch_size: int = INGREDIENT_BATCH_SIZE,
+                           use_gemini: bool = True) -> List[Optional[ParsedIngredient]]:
+    """
+    Parses many ingredient strings, returning a list aligned with ingredient_texts.
+    Lines the local parser handles confidently are resolved in-process; of the
+    rest, cached lines are served from the ingredient cache and the remaining
+    unique lines are sent to Gemini in batches of at most batch_size. If a whole
+    batch fails, its lines are parsed one at a time; if only some entries of a
+    batch are unusable, just those lines are retried individually. Without
+    use_gemini, lines that would need Gemini come back as None.
+    """
+    from ingredient_parser import parse_ingredient_line_locally, LOCAL_PARSE_CONFIDENCE_THRESHOLD
+
+    batch_size = max(1, min(batch_size, MAX_INGREDIENT_BATCH_SIZE))
+    parsed_by_text: Dict[str, ParsedIngredient] = {}
+
+    for text in dict.fromkeys(ingredient_texts):
+        local_result = parse_ingredient_line_locally(text)
+        if local_result.confidence >= LOCAL_PARSE_CONFIDENCE_THRESHOLD:
+            parsed_by_text[text] = local_result.ingredient
+
+    uncertain = [text for text in dict.fromkeys(ingredient_texts) if text not in parsed_by_text]
+    for text, data in ingredient_cache.get_many(uncertain).items():
+        try:
+            parsed_by_text[text] = ParsedIngredient.model_validate(data)
+        except Exception as e:
+            print(f"Ignoring invalid cached parse for '{text}': {e}")
+
+    pending = [text for text in dict.fromkeys(ingredient_texts) if text not in parsed_by_text] if use_gemini else []
+    newly_parsed: Dict[str, Dict[str, Any]] = {}
+
+    for start in range(0, len(pending), batch_size):
+        batch = pending[start:start + batch_size]
+        try:
+            batch_results = parse_ingredient_lines_with_gemini(batch)
+        except Exception as e:
+            print(f"Batch parse of {len(batch)} ingredients failed, parsing individually: {e}")
+            batch_results = [None] * len(batch)
+
+        for text, parsed in zip(batch, batch_results):
+            if parsed is None:
+                parsed = parse_ingredient_line_with_gemini(text)
+            if parsed:
+                parsed_by_text[text] = parsed
+                newly_parsed[text] = parsed.model_dump()
+
+    ingredient_cache.set_many(newly_parsed)
+    return [parsed_by_text.get(text) for text in ingredient_texts]
+
+def iter_parsed_recipes_ingredients(recipes: List[Recipe],
+                                    max_workers: int = INGREDIENT_PARSE_CONCURRENCY,
+                                    deadline_seconds: Optional[float] = INGREDIENT_PARSE_DEADLINE_SECONDS
+                                    ) -> Iterator[Tuple[int, List[Optional[ParsedIngredient]]]]:
+    """
+    Parses the ingredients of several recipes concurrently, one worker task per recipe,
+    yielding (recipe_index, parsed_lines) as each recipe finishes. Recipes that are
+    not finished when the deadline expires are not yielded. Closing the generator
+    early (e.g. when a streaming client disconnects) cancels the recipes that have
+    not started yet; Gemini calls already in flight finish in the background and
+    still fill the cache.
+    """
+    if not recipes:
+        return
+
+    deadline = time.monotonic() + deadline_seconds if deadline_seconds is not None else None
+    executor = ThreadPoolExecutor(max_workers=min(max(1, max_workers), len(recipes)),
+                                  thread_name_prefix="ingredient-parse")
+    try:
+        futures = {executor.submit(parse_ingredient_lines, recipe.ingredients): index
+                   for index, recipe in enumerate(recipes)}
+        pending = set(futures)
+        while pending:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                break
+
+            for future in done:
+                index = futures[future]
+                try:
+                    parsed_lines = future.result()
+                except Exception as e:
+                    print(f"Error parsing ingredients for '{recipes[index].name}': {e}")
+                    parsed_lines = [None] * len(recipes[index].ingredients)
+                yield index, parsed_lines
+
+        if pending:
+            print(f"Ingredient parsing deadline of {deadline_seconds}s reached; "
+                  f"{len(pending)} of {len(recipes)} recipes left unparsed")
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+def parse_recipes_ingredients(recipes: List[Recipe],
+                              max_workers: int = INGREDIENT_PARSE_CONCURRENCY,
+                              deadline_seconds: Optional[float] = INGREDIENT_PARSE_DEADLINE_SECONDS,
+                              on_progress: Optional[Callable[[int], None]] = None) -> List[List[Optional[ParsedIngredient]]]:
+    """
+    Parses the ingredients of several recipes concurrently (see iter_parsed_recipes_ingredients).
+    Returns one list per recipe, in the original recipe and ingredient order, so
+    consolidation stays deterministic. Recipes not finished by the deadline come
+    back as lists of None. If given, on_progress is called with the number of
+    ingredient lines each time a recipe finishes.
+    """
+    results: List[List[Optional[ParsedIngredient]]] = [[None] * len(recipe.ingredients) for recipe in recipes]
+    for index, parsed_lines in iter_parsed_recipes_ingredients(recipes, max_workers, deadline_seconds):
+        results[index] = parsed_lines
+        if on_progress:
+            on_progress(len(parsed_lines))
+    return results
+
 # --- Unit Conversion and Normalization Data ---
 # Define canonical units for different ingredient types
 CANONICAL_UNITS = {
@@ -128,6 +334,9 @@ UNIT_CONVERSION_FACTORS = {
     'ml': {'cup': 1/236.588}, # 1 cup = 236.588 ml
     'pound': {'ounce': 16}, # For display preference later
     'cup': {'tablespoon': 16}, # For display preference later
+    'kg': {'gram': 1000},
+    'liter': {'ml': 1000},
+    'fl oz': {'ml': 29.5735},
 }
 
 # Mapping specific units to their 'type' for canonical conversion
@@ -140,183 +349,236 @@ UNIT_TYPES_MAP = {
     'slice': 'other', 'package': 'other', 'can': 'other', 'jar': 'other', 'dash': 'other', 'pinch': 'other', 'to taste': 'other',
 }
 
+# Unit of an unquantified 'Salt to taste' line; shown as a note when the same
+# ingredient also has a quantified line
+TO_TASTE = 'to taste'
+
+# Abbreviations, plurals and other spellings, mapped to the unit in UNIT_TYPES_MAP they
+# stand for. The one alias table: the local parser reads units with it too.
+UNIT_ALIASES = {
+    'lb': 'pound', 'lbs': 'pound', 'pounds': 'pound',
+    'oz': 'ounce', 'ounces': 'ounce',
+    'g': 'gram', 'grams': 'gram', 'kilogram': 'kg', 'kilograms': 'kg', 'kgs': 'kg',
+    'cups': 'cup', 'c': 'cup',
+    'milliliter': 'ml', 'milliliters': 'ml', 'millilitre': 'ml', 'millilitres': 'ml',
+    'l': 'liter', 'liters': 'liter', 'litre': 'liter', 'litres': 'liter',
+    'fluid ounce': 'fl oz', 'fluid ounces': 'fl oz', 'fl. oz': 'fl oz',
+    'tbsp': 'tablespoon', 'tbsps': 'tablespoon', 'tbs': 'tablespoon', 'tablespoons': 'tablespoon',
+    'tsp': 'teaspoon', 'tsps': 'teaspoon', 'teaspoons': 'teaspoon',
+    'ea': 'each',
+    'cloves': 'clove', 'stalks': 'stalk', 'sprigs': 'sprig', 'heads': 'head',
+    'slices': 'slice', 'packages': 'package', 'pkg': 'package', 'cans': 'can', 'jars': 'jar',
+    'dashes': 'dash', 'pinches': 'pinch',
+}
+
+# Every conversion between the units above, precomputed (see unit_registry.py)
+unit_registry = UnitRegistry.from_tables(CANONICAL_UNITS, UNIT_TYPES_MAP, UNIT_CONVERSION_FACTORS, UNIT_ALIASES)
+
 
 def convert_to_canonical_unit(quantity: float, unit: str) -> tuple[float, str]:
     """
     Converts a quantity and unit to its canonical unit and value.
-    Returns (converted_quantity, canonical_unit_name).
+    Returns (converted_quantity, canonical_unit_name). Aliases are normalized
+    ('lbs' -> 'pound'); units with no conversion path come back unconverted.
     """
-    normalized_unit = unit.strip().lower()
+    return unit_registry.to_canonical(quantity, unit)
+
+
+# Ingredients whose quantity is omitted from the grocery list when it is small (matched as substrings)
+ITEMS_TO_OMIT_QUANTITY_FOR_SMALL_AMOUNTS = {
+    'garlic', 'salt', 'pepper', 'baking soda', 'baking powder', 'vanilla extract',
+    'cinnamon', 'nutmeg', 'oregano', 'thyme', 'rosemary', 'paprika', 'cumin',
+    'chili powder', 'cayenne pepper', 'ginger', 'allspice', 'cloves', 'bay leaf',
+    'dill', 'parsley', 'cilantro', 'scallion', 'chives', 'lemon zest', 'lime zest',
+    'kosher salt', 'sea salt', 'black pepper', 'pure vanilla extract',
+    'sugar', # Review if you want to always omit small sugar quantities
+    'olive oil',
+    'vegetable oil', 'canola oil', 'water', 'vinegar'
+}
 
-    # Find the type of unit (weight, volume, count, spoon)
-    unit_type = UNIT_TYPES_MAP.get(normalized_unit)
-    if not unit_type:
-        return quantity, normalized_unit # Return as is if type unknown
+# Define density-based conversions for specific ingredients
+# Add more ingredients and their conversion factors here!
+# Format: 'base_ingredient_name': {'unit_to_convert_FROM': {'preferred_unit_TO': conversion_factor}}
+INGREDIENT_DENSITY_CONVERSIONS = {
+    'butter': {
+        'tablespoon': {'ounce': 0.5}, # 1 tbsp butter is approx 0.5 oz
+        'cup': {'ounce': 8}          # 1 cup butter is approx 8 oz
+    },
+    'all-purpose flour': {
+        'cup': {'ounce': 4.25},      # 1 cup all-purpose flour is approx 4.25 oz (standard, unsifted)
+        'tablespoon': {'ounce': 4.25 / 16} # 1 tbsp flour is 1/16th of a cup
+    },
+    'granulated sugar': {
+        'cup': {'ounce': 7.05},      # 1 cup granulated sugar is approx 7.05 oz
+        'tablespoon': {'ounce': 7.05 / 16}
+    },
+    'brown sugar': {
+        'cup': {'ounce': 7.5},       # 1 cup packed brown sugar is approx 7.5 oz
+        'tablespoon': {'ounce': 7.5 / 16}
+    },
+    'powdered sugar': {
+        'cup': {'ounce': 4},         # 1 cup powdered sugar is approx 4 oz (sifted)
+        'tablespoon': {'ounce': 4 / 16}
+    },
+    'olive oil': {
+        'cup': {'ounce': 7.6},       # 1 cup olive oil is approx 7.6 oz
+        'tablespoon': {'ounce': 0.475} # 1 tbsp olive oil is approx 0.475 oz
+    },
+    # Add more here as you encounter them!
+    # Example for something like 'chicken broth' if you ever get it by weight
+    # 'chicken broth': {
+    #     'cup': {'ounce': 8.35} # 1 cup water/broth is approx 8.35 oz
+    # }
+}
 
-    canonical_unit_name = CANONICAL_UNITS.get(unit_type)
-    if not canonical_unit_name:
-        return quantity, normalized_unit # No canonical unit for this type
+# Plans with at least this many ingredient lines are consolidated with NumPy
+VECTORIZED_CONSOLIDATION_THRESHOLD = int(os.environ.get("VECTORIZED_CONSOLIDATION_THRESHOLD", "10000"))
+
+# Both tables are matched against canonical ingredient IDs (see ingredient_canonical.py),
+# so 'all purpose flour', 'green onions' or 'whole cloves' hit their entries too
+_omit_quantity_matcher = KeywordMatcher(canonical_ingredient_id(keyword) for keyword in ITEMS_TO_OMIT_QUANTITY_FOR_SMALL_AMOUNTS)
+_density_matcher = KeywordMatcher(canonical_ingredient_id(base_item) for base_item in INGREDIENT_DENSITY_CONVERSIONS)
+
+# The conversion actually applied per (base ingredient, unit): the first target listed
+_DENSITY_CONVERSIONS = {
+    canonical_ingredient_id(base_item): {unit: next(iter(targets.items())) for unit, targets in conversions.items() if targets}
+    for base_item, conversions in INGREDIENT_DENSITY_CONVERSIONS.items()
+}
+
+
+@lru_cache(maxsize=65536)
+def _item_traits(ingredient_id: str) -> Tuple[Optional[str], bool]:
+    """Returns (density-table key matching the ingredient or None, whether small quantities are omitted)."""
+    if ingredient_id in _DENSITY_CONVERSIONS:
+        density_key = ingredient_id
+    else:
+        density_key = _density_matcher.first_match(ingredient_id)
+    return density_key, _omit_quantity_matcher.contains_any(ingredient_id)
+
+
+def _normalize_item_name(item: str) -> str:
+    return item.strip().lower().replace("  ", " ")
+
+
+def _format_quantity(quantity: float) -> str:
+    if quantity == int(quantity):
+        return str(int(quantity))
+    return f"{quantity:.3g}" # Use 3 significant digits
 
-    # If already canonical, return as is
-    if normalized_unit == canonical_unit_name:
-        return quantity, canonical_unit_name
-    
-    # Attempt conversion
-    # Path 1: Direct conversion from normalized_unit to canonical_unit_name
-    if normalized_unit in UNIT_CONVERSION_FACTORS and canonical_unit_name in UNIT_CONVERSION_FACTORS[normalized_unit]:
-        return quantity * UNIT_CONVERSION_FACTORS[normalized_unit][canonical_unit_name], canonical_unit_name
-    
-    # Path 2: Conversion from canonical_unit_name to normalized_unit (then inverse)
-    if canonical_unit_name in UNIT_CONVERSION_FACTORS and normalized_unit in UNIT_CONVERSION_FACTORS[canonical_unit_name]:
-        # This means we have a conversion factor from canonical to normalized.
-        # So to go from normalized to canonical, we divide by that factor.
-        return quantity / UNIT_CONVERSION_FACTORS[canonical_unit_name][normalized_unit], canonical_unit_name
 
-    return quantity, normalized_unit # Fallback if no conversion path found
+def _format_grocery_line(item: str, unit: str, quantity: float, notes) -> str:
+    """Renders one consolidated grocery-list line, e.g. '2 cup flour (sifted)'."""
+    if _item_traits(canonical_ingredient_id(item))[1] and quantity <= 1.0:
+        # Omit quantity for small amounts of spices, seasonings, etc.
+        formatted_item = item
+    else:
+        formatted_item = f"{_format_quantity(quantity)} {unit} {item}"
+    if notes:
+        formatted_item += f" ({', '.join(notes)})"
+    return formatted_item
 
 
 def consolidate_ingredients(parsed_ingredients: List[ParsedIngredient]) -> List[str]:
-    """Aggregates parsed ingredients by item and its canonical unit."""
-    from collections import defaultdict
-    aggregated: Dict[tuple[str, Optional[str]], Dict[str, Any]] = defaultdict(lambda: {'quantity': 0.0, 'notes': set()})
-    non_quantified_items: List[str] = []
-
-    # Define a set of ingredients for which quantities should generally be omitted if small
-    ITEMS_TO_OMIT_QUANTITY_FOR_SMALL_AMOUNTS = {
-        'garlic', 'salt', 'pepper', 'baking soda', 'baking powder', 'vanilla extract',
-        'cinnamon', 'nutmeg', 'oregano', 'thyme', 'rosemary', 'paprika', 'cumin',
-        'chili powder', 'cayenne pepper', 'ginger', 'allspice', 'cloves', 'bay leaf',
-        'dill', 'parsley', 'cilantro', 'scallion', 'chives', 'lemon zest', 'lime zest',
-        'kosher salt', 'sea salt', 'black pepper', 'pure vanilla extract',
-        'sugar', # Review if you want to always omit small sugar quantities
-        'olive oil',
-        'vegetable oil', 'canola oil', 'water', 'vinegar'
-    }
-
-    # Define density-based conversions for specific ingredients
-    # Add more ingredients and their conversion factors here!
-    # Format: 'base_ingredient_name': {'unit_to_convert_FROM': {'preferred_unit_TO': conversion_factor}}
-    INGREDIENT_DENSITY_CONVERSIONS = {
-        'butter': {
-            'tablespoon': {'ounce': 0.5}, # 1 tbsp butter is approx 0.5 oz
-            'cup': {'ounce': 8}          # 1 cup butter is approx 8 oz
-        },
-        'all-purpose flour': {
-            'cup': {'ounce': 4.25},      # 1 cup all-purpose flour is approx 4.25 oz (standard, unsifted)
-            'tablespoon': {'ounce': 4.25 / 16} # 1 tbsp flour is 1/16th of a cup
-        },
-        'granulated sugar': {
-            'cup': {'ounce': 7.05},      # 1 cup granulated sugar is approx 7.05 oz
-            'tablespoon': {'ounce': 7.05 / 16}
-        },
-        'brown sugar': {
-            'cup': {'ounce': 7.5},       # 1 cup packed brown sugar is approx 7.5 oz
-            'tablespoon': {'ounce': 7.5 / 16}
-        },
-        'powdered sugar': {
-            'cup': {'ounce': 4},         # 1 cup powdered sugar is approx 4 oz (sifted)
-            'tablespoon': {'ounce': 4 / 16}
-        },
-        'olive oil': {
-            'cup': {'ounce': 7.6},       # 1 cup olive oil is approx 7.6 oz
-            'tablespoon': {'ounce': 0.475} # 1 tbsp olive oil is approx 0.475 oz
-        },
-        # Add more here as you encounter them!
-        # Example for something like 'chicken broth' if you ever get it by weight
-        # 'chicken broth': {
-        #     'cup': {'ounce': 8.35} # 1 cup water/broth is approx 8.35 oz
-        # }
-    }
+    """
+    Aggregates parsed ingredients by canonical ingredient (see ingredient_canonical.py)
+    and canonical unit, so 'eggs' and 'egg' or 'green onions' and 'scallions' share a
+    line. Each line uses the first spelling of the ingredient that appeared. An
+    ingredient with a quantified line isn't listed again without a quantity; a
+    'to taste' mention becomes a note on that line.
+    Large plans are aggregated with NumPy when it is installed (same output).
+    """
+    if len(parsed_ingredients) >= VECTORIZED_CONSOLIDATION_THRESHOLD:
+        from consolidation_vectorized import consolidate_ingredients_vectorized, numpy_available
+        if numpy_available:
+            return consolidate_ingredients_vectorized(parsed_ingredients)
+    return _consolidate_ingredients_loop(parsed_ingredients)
 
 
-    for p_ing in parsed_ingredients:
-        if not p_ing or not p_ing.item:
-            continue
+def convert_for_consolidation(p_ing: ParsedIngredient) -> Tuple[str, str, Optional[str], Optional[float]]:
+    """
+    Applies consolidation's per-line steps to one parsed ingredient. Returns
+    (item, canonical ID, canonical unit, converted quantity); unit and quantity
+    are None for lines that are listed without a quantity.
+    """
+    item = _normalize_item_name(p_ing.item)
+    ingredient_id = canonical_ingredient_id(item)
+    quantity = p_ing.quantity
+    unit = unit_registry.normalize(p_ing.unit) if p_ing.unit else None
 
-        item = p_ing.item.strip().lower().replace("  ", " ")
-        quantity = p_ing.quantity
-        unit = p_ing.unit.strip().lower() if p_ing.unit else None
+    # --- Density-based conversion for specific ingredients ---
+    # 'unsalted butter' and 'salted butter' both use the 'butter' entry, etc.
+    if unit and quantity is not None:
+        density_key = _item_traits(ingredient_id)[0]
+        if density_key is not None:
+            conversion = _DENSITY_CONVERSIONS[density_key].get(unit)
+            if conversion:
+                target_unit, factor = conversion
+                quantity = quantity * factor
+                unit = target_unit
 
-        # --- IMPORTANT: Standardize item name for conversion lookup ---
-        # This part is crucial. You need to strip common descriptors so that
-        # 'unsalted butter', 'salted butter' both map to 'butter' for conversion,
-        # 'all-purpose flour' maps to 'all-purpose flour', etc.
-        # It's best to have a robust way to get the 'base' ingredient name here.
-        # For now, let's refine the `base_item_for_conversion` to handle more cases.
+    # --- Apply canonical unit conversion ---
+    if quantity is not None and unit:
+        quantity, unit = convert_to_canonical_unit(quantity, unit)
 
-        base_item_for_conversion = item # Start with the parsed item name
+    if quantity is None or unit is None:
+        return item, ingredient_id, None, None
+    return item, ingredient_id, unit, quantity
+
+
+def _is_to_taste(p_ing: ParsedIngredient) -> bool:
+    """Whether a line is an unquantified 'to taste' one, like 'Salt to taste'."""
+    return p_ing.quantity is None and bool(p_ing.unit) and unit_registry.normalize(p_ing.unit) == TO_TASTE
+
+
+def _merge_targets(quantified_keys: Iterable[Tuple[str, str]]) -> Dict[str, Tuple[str, str]]:
+    """
+    For each ingredient with quantified (canonical ID, unit) lines, the line its
+    unquantified mentions are folded into: the one whose unit sorts first.
+    """
+    targets: Dict[str, Tuple[str, str]] = {}
+    for key in quantified_keys:
+        target = targets.get(key[0])
+        if target is None or key[1] < target[1]:
+            targets[key[0]] = key
+    return targets
 
-        # A more generic way to get the 'base' item for conversion lookup
-        if item in INGREDIENT_DENSITY_CONVERSIONS:
-            base_item_for_conversion = item
-        else:
-            # Try stripping common descriptors
-            for base_key in INGREDIENT_DENSITY_CONVERSIONS:
-                if base_key in item:
-                    base_item_for_conversion = base_key
-                    break
-
-        # --- Density-based conversion for specific ingredients ---
-        if base_item_for_conversion in INGREDIENT_DENSITY_CONVERSIONS and unit and quantity is not None:
-            conversions = INGREDIENT_DENSITY_CONVERSIONS[base_item_for_conversion]
-            if unit in conversions:
-                # Convert using density
-                for target_unit, factor in conversions[unit].items():
-                    quantity = quantity * factor
-                    unit = target_unit
-                    break # Use the first available conversion
-
-        # --- Apply canonical unit conversion ---
-        if quantity is not None and unit:
-            quantity, unit = convert_to_canonical_unit(quantity, unit)
+
+def _consolidate_ingredients_loop(parsed_ingredients: List[ParsedIngredient]) -> List[str]:
+    """Pure-Python consolidation; the reference for consolidation_vectorized."""
+    aggregated: Dict[tuple[str, Optional[str]], Dict[str, Any]] = defaultdict(lambda: {'item': None, 'quantity': 0.0, 'notes': set()})
+    non_quantified_items: Dict[str, str] = {} # canonical ID -> item, in first-seen order
+    to_taste = set() # canonical IDs with a 'to taste' line
+
+    for p_ing in parsed_ingredients:
+        if not p_ing or not p_ing.item:
+            continue
+
+        item, ingredient_id, unit, quantity = convert_for_consolidation(p_ing)
 
         # --- Aggregate ingredients ---
-        if quantity is None or unit is None:
-            # Handle non-quantified items
-            if item not in [ni.lower() for ni in non_quantified_items]:
-                non_quantified_items.append(item)
+        if quantity is None:
+            non_quantified_items.setdefault(ingredient_id, item)
+            if _is_to_taste(p_ing):
+                to_taste.add(ingredient_id)
         else:
-            # Check if we should omit the quantity for small amounts
-            omit_small_quantity = any(keyword in item for keyword in ITEMS_TO_OMIT_QUANTITY_FOR_SMALL_AMOUNTS)
-            
-            key = (item, unit)
-            aggregated[key]['quantity'] += quantity
+            entry = aggregated[(ingredient_id, unit)]
+            if entry['item'] is None:
+                entry['item'] = item
+            entry['quantity'] += quantity
             if p_ing.notes:
-                aggregated[key]['notes'].add(p_ing.notes)
+                entry['notes'].add(p_ing.notes)
 
     # --- Format the final grocery list ---
+    # An ingredient that also has a quantified line isn't listed again without a
+    # quantity: '1 tsp salt' and 'Salt to taste' make one line, '... salt (to taste)'
+    targets = _merge_targets(aggregated)
     grocery_list = []
-
-    # Add quantified items
-    for (item, unit), data in aggregated.items():
-        quantity = data['quantity']
-        notes = data['notes']
-        
-        # Check if we should omit the quantity
-        omit_small_quantity = any(keyword in item for keyword in ITEMS_TO_OMIT_QUANTITY_FOR_SMALL_AMOUNTS)
-        
-        # Format quantity
-        if omit_small_quantity and quantity <= 1.0:
-            # Omit quantity for small amounts of spices, seasonings, etc.
-            formatted_item = item
-        else:
-            # Include quantity
-            if quantity == int(quantity):
-                quantity_str = str(int(quantity))
-            else:
-                quantity_str = f"{quantity:.3g}" # Use 3 significant digits
-            formatted_item = f"{quantity_str} {unit} {item}"
-        
-        # Add notes if any
-        if notes:
-            notes_str = ", ".join(notes)
-            formatted_item += f" ({notes_str})"
-        
-        grocery_list.append(formatted_item)
-
-    # Add non-quantified items
-    for item in non_quantified_items:
-        grocery_list.append(item)
+    for key, data in aggregated.items():
+        notes = list(data['notes'])
+        if key[0] in to_taste and targets[key[0]] == key and TO_TASTE not in notes:
+            notes.append(TO_TASTE)
+        grocery_list.append(_format_grocery_line(data['item'], key[1], data['quantity'], notes))
+    grocery_list.extend(item for ingredient_id, item in non_quantified_items.items() if ingredient_id not in targets)
 
     return sorted(grocery_list)
 
@@ -367,10 +629,9 @@ def generate_grocery_list(recipes: List[Recipe]):
     """Generates a consolidated and aggregated grocery list."""
     all_ingredients = []
     
-    for recipe in recipes:
-        print(f"Processing ingredients from '{recipe.name}'...")
-        for ingredient in recipe.ingredients:
-            parsed = parse_ingredient_line_with_gemini(ingredient)
+    print(f"Processing ingredients from {len(recipes)} recipes...")
+    for recipe, parsed_lines in zip(recipes, parse_recipes_ingredients(recipes)):
+        for ingredient, parsed in zip(recipe.ingredients, parsed_lines):
             if parsed:
                 all_ingredients.append(parsed)
             else:
@@ -6,7 +6,7 @@ from datetime import datetime
 import uuid
 from flask_dance.consumer.storage.sqla import OAuthConsumerMixin
 from flask_login import UserMixin
-from sqlalchemy import UniqueConstraint
+from sqlalchemy import Index, UniqueConstraint
 from werkzeug.security import generate_password_hash, check_password_hash
 
 from database import db
@@ -98,4 +98,67 @@ class GroceryList(db.Model):
     updated_at = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now)
     
     # Relationship to user
-    user = db.relationship(User, backref=db.backref('grocery_lists', lazy=True))
\ No newline at end of file
+    user = db.relationship(User, backref=db.backref('grocery_lists', lazy=True))
+
+
+# Recipe storage in the database (see recipe_repository.py; used when RECIPE_STORAGE=database)
+class RecipeFolder(db.Model):
+    __tablename__ = 'recipe_folders'
+
+    id = db.Column(db.String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    user_id = db.Column(db.String, db.ForeignKey(User.id), nullable=False, index=True)
+    folder_id = db.Column(db.String, nullable=False)  # Per-user slug used in URLs, e.g. 'uncategorized'
+    name = db.Column(db.String, nullable=False)
+
+    created_at = db.Column(db.DateTime, default=datetime.now)
+
+    __table_args__ = (UniqueConstraint('user_id', 'folder_id', name='uq_recipe_folder_user_folder'),)
+
+
+class SavedRecipe(db.Model):
+    __tablename__ = 'saved_recipes'
+
+    # The recipe ID (Recipe.id), shared with the file layout so imported recipes keep their IDs
+    id = db.Column(db.String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    user_id = db.Column(db.String, db.ForeignKey(User.id), nullable=False)
+    folder_id = db.Column(db.String, nullable=False)
+    name = db.Column(db.String, nullable=False)
+    serving_size = db.Column(db.String, nullable=True)
+
+    ingredients = db.Column(db.JSON, nullable=False)
+    instructions = db.Column(db.JSON, nullable=False)
+    structured_ingredients = db.Column(db.JSON, nullable=True)
+    structured_ingredients_version = db.Column(db.String, nullable=True)
+
+    # Stored so listings don't have to load the JSON columns
+    ingredients_count = db.Column(db.Integer, nullable=False, default=0)
+    instructions_count = db.Column(db.Integer, nullable=False, default=0)
+    # Sum of the recipe's search term frequencies (its BM25 length)
+    term_count = db.Column(db.Integer, nullable=False, default=0)
+    # Canonical IDs of its ingredients, for "what can I cook" search (see pantry_index.py)
+    ingredient_ids = db.Column(db.JSON, nullable=True)
+
+    created_at = db.Column(db.DateTime, default=datetime.now)
+    updated_at = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now)
+
+    user = db.relationship(User, backref=db.backref('saved_recipes', lazy=True))
+
+    __table_args__ = (
+        Index('ix_saved_recipes_user_folder', 'user_id', 'folder_id'),
+        Index('ix_saved_recipes_user_name', 'user_id', 'name'),
+    )
+
+
+class RecipeSearchTerm(db.Model):
+    """One search posting: how often a term occurs in a saved recipe (see recipe_search_index.py)."""
+    __tablename__ = 'recipe_search_terms'
+
+    recipe_id = db.Column(db.String, db.ForeignKey(SavedRecipe.id, ondelete='CASCADE'), primary_key=True)
+    term = db.Column(db.String, primary_key=True)
+    user_id = db.Column(db.String, db.ForeignKey(User.id), nullable=False)
+    tf = db.Column(db.Integer, nullable=False)
+    length = db.Column(db.Integer, nullable=False)  # The recipe's term_count, so queries read only postings
+
+    __table_args__ = (
+        Index('ix_recipe_search_terms_user_term', 'user_id', 'term'),
+    )
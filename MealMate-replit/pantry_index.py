@@ -0,0 +1,256 @@
+"""
+"What can I cook" ranking of saved recipes against on-hand ingredients.
+
+Each saved recipe is reduced to the set of canonical ingredient IDs of its
+ingredient lines ('2 cups diced onions' -> 'onion'), taken from its stored
+parses where they are current and from the local parser otherwise. The
+storage backends keep these sets next to the recipes: a column of the
+recipe manifest for files, SavedRecipe.ingredient_ids in the database.
+
+For ranking, a user's sets become bitsets over the ingredients that occur in
+their recipes, one row of 64-bit words per recipe. The pantry is one more
+bitset, so what every recipe has on hand is a single AND and popcount over
+the whole matrix; coverage (the fraction of a recipe's ingredients on hand)
+and the number of missing ingredients follow from each row's total.
+Recipes are ranked by coverage, then fewest missing, then recipe ID. A
+pantry item also covers the more specific ingredients it ends with, so
+'flour' covers 'all purpose flour' and 'butter' covers 'unsalted butter'.
+
+The bitsets are built once per user and kept until the stored sets change
+(see PantryIndexCache). NumPy is optional and not among the locked
+dependencies, so a default install uses the fallback: the bitsets are
+Python ints and the same ranking runs in a loop.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import lru_cache
+from itertools import chain
+from typing import Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+
+try:
+    import numpy as np
+    numpy_available = True
+except ImportError:
+    np = None
+    numpy_available = False
+
+from ingredient_canonical import canonical_ingredient_id
+from ingredient_parser import parse_ingredient_line_locally
+
+# Users whose bitsets are kept in memory at once
+PANTRY_INDEX_CACHE_USERS = int(os.environ.get("PANTRY_INDEX_CACHE_USERS", "64"))
+
+
+@lru_cache(maxsize=65536)
+def ingredient_id(text: str) -> Optional[str]:
+    """Canonical ingredient ID of an ingredient line or bare name, e.g. '3 large eggs' -> 'egg'."""
+    item = parse_ingredient_line_locally(text).ingredient.item
+    return canonical_ingredient_id(item) or None
+
+
+def recipe_ingredient_ids(recipe) -> List[str]:
+    """Sorted canonical IDs of a recipe's ingredients, from its stored parses where current."""
+    from recipe_enrichment import get_stored_structured_ingredients
+    stored = get_stored_structured_ingredients(recipe) or [None] * len(recipe.ingredients)
+    ids = set()
+    for line, parsed in zip(recipe.ingredients, stored):
+        found = canonical_ingredient_id(parsed.item) if parsed and parsed.item else ingredient_id(line)
+        if found:
+            ids.add(found)
+    return sorted(ids)
+
+
+@dataclass
+class PantryMatch:
+    recipe_id: str
+    coverage: float  # Fraction of the recipe's ingredients on hand
+    missing_count: int
+    missing: List[str]  # Canonical IDs of the ingredients not on hand
+
+
+def _popcount_rows(words):
+    """Set bits per row of a 2-D uint64 array."""
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(words).sum(axis=1, dtype=np.int64)
+    # NumPy before 2.0: count per byte with a lookup table
+    table = np.array([bin(value).count('1') for value in range(256)], dtype=np.uint8)
+    return table[words.view(np.uint8)].reshape(len(words), -1).sum(axis=1, dtype=np.int64)
+
+
+class PantryIndex:
+    """Ingredient bitsets of one user's recipes, for ranking them against a pantry."""
+
+    def __init__(self, recipe_sets: Iterable[Tuple[str, Iterable[str]]]):
+        self.vocabulary: Dict[str, int] = {}
+        self.recipe_ids: List[str] = []
+        self.ingredient_counts: List[int] = []  # Bit -> recipes using that ingredient
+        rows: List[List[int]] = []
+        # In ID order, so row order breaks ties by recipe ID
+        for recipe_id, ingredient_ids in sorted(recipe_sets, key=lambda item: item[0]):
+            bits = sorted({self.vocabulary.setdefault(found, len(self.vocabulary)) for found in ingredient_ids})
+            self.ingredient_counts.extend([0] * (len(self.vocabulary) - len(self.ingredient_counts)))
+            for bit in bits:
+                self.ingredient_counts[bit] += 1
+            if bits:
+                self.recipe_ids.append(recipe_id)
+                rows.append(bits)
+        self.ingredient_ids = list(self.vocabulary)  # Bit -> canonical ID
+        # Trailing words of each ingredient -> bits they cover ('flour' -> 'all purpose flour', ...)
+        self.covered_by: Dict[str, List[int]] = {}
+        for bit, found in enumerate(self.ingredient_ids):
+            words = found.split()
+            for start in range(len(words)):
+                self.covered_by.setdefault(' '.join(words[start:]), []).append(bit)
+        self.word_count = max(1, (len(self.vocabulary) + 63) // 64)
+
+        if numpy_available:
+            self.bitsets = np.zeros((len(rows), self.word_count), dtype=np.uint64)
+            positions = np.fromiter(chain.from_iterable(rows), dtype=np.int64)
+            row_numbers = np.repeat(np.arange(len(rows)), [len(bits) for bits in rows])
+            # Each (row, bit) occurs once, so adding the bit values is the same as OR-ing them
+            np.add.at(self.bitsets, (row_numbers, positions >> 6),
+                      np.left_shift(np.uint64(1), (positions & 63).astype(np.uint64)))
+            self.sizes = np.array([len(bits) for bits in rows], dtype=np.int64)
+        else:
+            self.bitsets = [sum(1 << bit for bit in bits) for bits in rows]
+            self.sizes = [len(bits) for bits in rows]
+
+    def __len__(self) -> int:
+        return len(self.recipe_ids)
+
+    def rank(self, pantry: Iterable[str], limit: int, min_coverage: float = 0.0) -> List[PantryMatch]:
+        """
+        The best matches for a pantry of canonical ingredient IDs: highest coverage
+        first, then fewest missing. Only recipes using at least one pantry ingredient
+        and with at least min_coverage are returned.
+        """
+        bits = {bit for found in pantry for bit in self.covered_by.get(found, ())}
+        if not bits or limit <= 0:
+            return []
+        if not numpy_available:
+            return self._rank_python(sum(1 << bit for bit in bits), limit, min_coverage)
+
+        mask = np.zeros(self.word_count, dtype=np.uint64)
+        for bit in bits:
+            mask[bit >> 6] |= np.uint64(1 << (bit & 63))
+        have = _popcount_rows(self.bitsets & mask)
+        coverage = have / self.sizes
+        candidates = np.flatnonzero((have > 0) & (coverage >= min_coverage))
+        if len(candidates) > limit:
+            # Only rows at or above the limit-th best coverage can make the page
+            cut = len(candidates) - limit
+            threshold = np.partition(coverage[candidates], cut)[cut]
+            candidates = candidates[coverage[candidates] >= threshold]
+        missing = self.sizes - have
+        order = candidates[np.lexsort((candidates, missing[candidates], -coverage[candidates]))][:limit]
+        return [PantryMatch(self.recipe_ids[row], float(coverage[row]), int(missing[row]),
+                            self._ids(int(word) for word in self.bitsets[row] & ~mask))
+                for row in order.tolist()]
+
+    def _rank_python(self, mask: int, limit: int, min_coverage: float) -> List[PantryMatch]:
+        scored = []
+        for row, (bitset, size) in enumerate(zip(self.bitsets, self.sizes)):
+            have = (bitset & mask).bit_count()
+            if have and have / size >= min_coverage:
+                scored.append((-have / size, size - have, row))
+        scored.sort()
+        return [PantryMatch(self.recipe_ids[row], -negative_coverage, missing_count,
+                            self._ids([self.bitsets[row] & ~mask]))
+                for negative_coverage, missing_count, row in scored[:limit]]
+
+    def _ids(self, words: Iterable[int]) -> List[str]:
+        """Canonical IDs of the set bits in a row of 64-bit words (or one Python int)."""
+        found = []
+        for word_index, word in enumerate(words):
+            while word:
+                low = word & -word
+                found.append(self.ingredient_ids[word_index * 64 + low.bit_length() - 1])
+                word ^= low
+        return sorted(found)
+
+
+class PantryIndexCache:
+    """
+    Thread-safe LRU of built PantryIndexes, one per recipe store. A store's entry is
+    rebuilt when the version it reports (anything that changes whenever its
+    recipes do) differs from the one it was built at.
+    """
+
+    def __init__(self, max_entries: int = PANTRY_INDEX_CACHE_USERS):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Hashable, Tuple[Hashable, PantryIndex]]" = OrderedDict()
+
+    def get(self, key: Hashable, version: Hashable,
+            load: Callable[[], Iterable[Tuple[str, Iterable[str]]]]) -> PantryIndex:
+        """The index for key at version, built from load() ((recipe_id, ingredient IDs) pairs) if not cached."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(key)
+                return entry[1]
+
+        index = PantryIndex(load())
+        with self._lock:
+            self._entries[key] = (version, index)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return index
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+pantry_indexes = PantryIndexCache()
+
+
+if __name__ == "__main__":
+    import sys
+    import time
+    import random
+
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    # Zipf-like ingredient popularity over a realistic vocabulary size
+    vocabulary = [f"ingredient {index}" for index in range(800)]
+    weights = [1 / (position + 1) for position in range(len(vocabulary))]
+    rng = random.Random(0)
+    recipe_sets = [(f"recipe-{index:05d}", set(rng.choices(vocabulary, weights, k=rng.randint(5, 15))))
+                   for index in range(count)]
+    pantry = set(rng.choices(vocabulary, weights, k=25))
+
+    start = time.perf_counter()
+    index = PantryIndex(recipe_sets)
+    print(f"build: {count} recipes, {len(index.vocabulary)} ingredients in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    def set_scan():
+        # Per-recipe set intersections, as a loop over the stored sets would do
+        scored = []
+        for recipe_id, ingredients in recipe_sets:
+            have = len(ingredients & pantry)
+            if have:
+                scored.append((-have / len(ingredients), len(ingredients) - have, recipe_id))
+        return [recipe_id for _, _, recipe_id in sorted(scored)[:20]]
+
+    for label, function in (("set intersections", set_scan),
+                            ("bitsets", lambda: [match.recipe_id for match in index.rank(pantry, 20)])):
+        function()
+        start = time.perf_counter()
+        for _ in range(20):
+            result = function()
+        print(f"{label}: top 20 of {count} in {(time.perf_counter() - start) / 20 * 1000:.2f} ms")
+        if label == "set intersections":
+            expected = result
+    assert result == expected
+
+    # The pure-Python bitsets rank the same way
+    numpy_matches = index.rank(pantry, 20)
+    numpy_available = False
+    python_matches = PantryIndex(recipe_sets).rank(pantry, 20)
+    assert python_matches == numpy_matches
+    for match in python_matches:
+        assert set(match.missing) == dict(recipe_sets)[match.recipe_id] - pantry
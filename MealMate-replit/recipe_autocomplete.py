@@ -0,0 +1,425 @@
+"""
+Typeahead suggestions for saved recipe names and ingredients.
+
+Suggestions are asked for on every keystroke, so they come from an in-memory
+index per user instead of the recipes: the words of every recipe name and
+canonical ingredient name (the pantry bitsets' vocabulary, see
+pantry_index.py) in a sorted list, searched by bisection for the word being
+typed, and trigram postings over the same words for typos.
+
+Every word typed must match a word of the suggestion: earlier words in full,
+the last one as a prefix. Only when that finds fewer suggestions than asked
+for do words within a small edit distance match as well (one typo, two from
+TWO_TYPOS_LENGTH letters; words shorter than FUZZY_MIN_LENGTH must be right).
+Full matches outrank prefixes, which outrank typos with fewer edits first,
+and a suggestion starting with the first word typed comes first; ties go to
+the suggestion with fewer words left unmatched. Only the entries containing
+a word of the most selective word typed are scored, with NumPy when it is
+installed; it is not among the locked dependencies, so by default a Python
+loop scores them.
+
+An index is rebuilt when its repository's index_version changes.
+recipe_name_candidates and resolve_recipe_name use the same index to find
+recipes by a name that doesn't match exactly (case, punctuation, a typo).
+"""
+
+import os
+import re
+import heapq
+import threading
+from bisect import bisect_left
+from collections import Counter, OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Hashable, List, Optional, Tuple
+
+try:
+    import numpy as np
+    numpy_available = True
+except ImportError:
+    np = None
+    numpy_available = False
+
+# Most suggestions returned for one query
+MAX_SUGGESTIONS = 20
+
+# Users whose indexes are kept in memory at once
+AUTOCOMPLETE_CACHE_USERS = int(os.environ.get("AUTOCOMPLETE_CACHE_USERS", "64"))
+
+FUZZY_MIN_LENGTH = 4
+TWO_TYPOS_LENGTH = 8
+
+# Per word typed: a full match, a prefix; a typo scores _PREFIX minus its edits.
+# _LEADING is added when the first word typed matches the suggestion's first word.
+_EXACT, _PREFIX, _LEADING = 4, 3, 2
+
+_WORD_RE = re.compile(r"[^\W_]+")
+
+
+def _words(text: str) -> Tuple[str, ...]:
+    return tuple(_WORD_RE.findall(text.lower()))
+
+
+def _trigrams(word: str, whole: bool) -> List[str]:
+    """Trigrams of a word padded with '<' (and '>' if whole, rather than a prefix)."""
+    padded = f"<{word}>" if whole else f"<{word}"
+    return [padded[start:start + 3] for start in range(len(padded) - 2)]
+
+
+def _edit_distance(a: str, b: str, limit: int) -> int:
+    """Edit distance counting adjacent swaps as one edit; any value above limit is returned as limit + 1."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous_previous, previous = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = a[i - 1] != b[j - 1]
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous_previous[j - 2] + 1)
+        if min(current) > limit:
+            return limit + 1
+        previous_previous, previous = previous, current
+    return min(previous[-1], limit + 1)
+
+
+@dataclass
+class Suggestion:
+    kind: str  # 'recipe' or 'ingredient'
+    text: str
+    recipe_id: Optional[str] = None
+    folder_id: Optional[str] = None
+
+
+class AutocompleteIndex:
+    """Word index over one user's recipe names and ingredient names."""
+
+    def __init__(self, recipes: List[Tuple[str, str, str]], ingredients: List[Tuple[str, int]]):
+        """recipes holds (recipe_id, folder_id, name); ingredients holds (canonical ID, recipes using it)."""
+        entries = [(Suggestion('recipe', name, recipe_id, folder_id), 0) for recipe_id, folder_id, name in recipes]
+        entries += [(Suggestion('ingredient', name), count) for name, count in ingredients]
+        # Fixed tie-break order: recipes, then ingredients by how many recipes use them, then shortest
+        entries.sort(key=lambda entry: (entry[0].kind != 'recipe', -entry[1], len(entry[0].text), entry[0].text.lower()))
+        self.suggestions = [suggestion for suggestion, _ in entries if _words(suggestion.text)]
+        self._entry_words = [_words(suggestion.text) for suggestion in self.suggestions]
+
+        self._vocabulary = sorted({word for words in self._entry_words for word in words})
+        self._word_ids = {word: word_id for word_id, word in enumerate(self._vocabulary)}
+        self._trigram_words: Dict[str, List[str]] = {}
+        for word in self._vocabulary:
+            if len(word) >= FUZZY_MIN_LENGTH - 1:
+                for trigram in set(_trigrams(word, whole=True)):
+                    self._trigram_words.setdefault(trigram, []).append(word)
+
+        if numpy_available:
+            # Word IDs of each entry, padded with len(vocabulary): a slot that never matches
+            width = max((len(words) for words in self._entry_words), default=1)
+            self._word_matrix = np.full((len(self._entry_words), width), len(self._vocabulary), dtype=np.int32)
+            for entry, words in enumerate(self._entry_words):
+                self._word_matrix[entry, :len(words)] = [self._word_ids[word] for word in words]
+            self._is_recipe = np.array([suggestion.kind == 'recipe' for suggestion in self.suggestions], dtype=bool)
+            # Word ID -> sorted entries containing it
+            entry_numbers = np.repeat(np.arange(len(self._entry_words), dtype=np.int32), width)
+            flat = self._word_matrix.ravel()
+            order = np.argsort(flat, kind='stable')
+            bounds = np.searchsorted(flat[order], np.arange(len(self._vocabulary) + 1))
+            self._postings = [np.unique(entry_numbers[order[bounds[word_id]:bounds[word_id + 1]]])
+                              for word_id in range(len(self._vocabulary))]
+
+    def __len__(self) -> int:
+        return len(self.suggestions)
+
+    def _matching_words(self, token: str, prefix: bool, fuzzy: bool) -> Dict[str, int]:
+        """Words a typed token matches, with the quality of each match."""
+        matches: Dict[str, int] = {}
+        if fuzzy and len(token) >= FUZZY_MIN_LENGTH:
+            limit = 2 if len(token) >= TWO_TYPOS_LENGTH else 1
+            grams = _trigrams(token, whole=not prefix)
+            # Words within `limit` edits share all but at most 3 * limit of the token's trigrams
+            needed = max(1, len(grams) - 3 * limit)
+            shared = Counter(word for gram in set(grams) for word in self._trigram_words.get(gram, ()))
+            for word, count in shared.items():
+                if count < needed:
+                    continue
+                if prefix:
+                    distance = min(_edit_distance(token, word[:length], limit)
+                                   for length in range(len(token) - limit, len(token) + limit + 1))
+                else:
+                    distance = _edit_distance(token, word, limit)
+                if distance <= limit:
+                    matches[word] = _PREFIX - distance
+        if prefix:
+            start = bisect_left(self._vocabulary, token)
+            for word in self._vocabulary[start:]:
+                if not word.startswith(token):
+                    break
+                matches[word] = _PREFIX
+        if token in self._word_ids:
+            matches[token] = _EXACT
+        return matches
+
+    def _rank(self, tokens: Tuple[str, ...], complete: bool, fuzzy: bool, limit: int,
+              kind: Optional[str]) -> List[int]:
+        """
+        The best entries matching every token, by total match quality (plus _LEADING if
+        the first word matches the first token), then fewest words matching no token,
+        then the fixed entry order.
+        """
+        matches = [self._matching_words(token, prefix=not complete and position == len(tokens) - 1, fuzzy=fuzzy)
+                   for position, token in enumerate(tokens)]
+        if not all(matches):
+            return []
+        if not numpy_available:
+            return self._rank_python(matches, limit, kind)
+
+        size = len(self._vocabulary) + 1
+        word_ids = [np.fromiter(map(self._word_ids.__getitem__, token_matches), dtype=np.int64,
+                                count=len(token_matches)) for token_matches in matches]
+        # Only entries containing a word of the most selective token can match every token
+        narrowest = min(word_ids, key=lambda ids: sum(len(self._postings[word_id]) for word_id in ids.tolist()))
+        candidates = np.unique(np.concatenate([self._postings[word_id] for word_id in narrowest.tolist()]))
+        if kind is not None:
+            candidates = candidates[self._is_recipe[candidates] == (kind == 'recipe')]
+        rows = self._word_matrix[candidates]
+
+        matched_any = np.zeros(size, dtype=bool)
+        score = np.zeros(len(candidates), dtype=np.int64)
+        eligible = np.ones(len(candidates), dtype=bool)
+        for position, (token_matches, ids) in enumerate(zip(matches, word_ids)):
+            qualities = np.zeros(size, dtype=np.int8)
+            qualities[ids] = np.fromiter(token_matches.values(), dtype=np.int8, count=len(token_matches))
+            matched_any[ids] = True
+            best = qualities[rows].max(axis=1)
+            eligible &= best > 0
+            score += best
+            if position == 0:
+                score += _LEADING * (qualities[rows[:, 0]] > 0)
+
+        if not eligible.any():
+            return []
+        candidates, rows, score = candidates[eligible], rows[eligible], score[eligible]
+        unmatched = (~matched_any[rows]).sum(axis=1) - (rows == size - 1).sum(axis=1)
+        # One sortable key: best score, then fewest unmatched words, then entry order
+        key = ((score.max() - score) * size + unmatched) * len(self.suggestions) + candidates
+        if len(key) > limit:
+            key = key[np.argpartition(key, limit - 1)[:limit]]
+        return (np.sort(key) % len(self.suggestions)).tolist()
+
+    def _rank_python(self, matches: List[Dict[str, int]], limit: int, kind: Optional[str]) -> List[int]:
+        matched_any = set().union(*matches)
+        ranked = []
+        for entry, entry_words in enumerate(self._entry_words):
+            if kind is not None and self.suggestions[entry].kind != kind:
+                continue
+            score = 0
+            for token_matches in matches:
+                best = max(token_matches.get(word, 0) for word in entry_words)
+                if not best:
+                    break
+                score += best
+            else:
+                if entry_words[0] in matches[0]:
+                    score += _LEADING
+                ranked.append((-score, sum(word not in matched_any for word in entry_words), entry))
+        return [entry for _, _, entry in heapq.nsmallest(limit, ranked)]
+
+    def suggest(self, query: str, limit: int = 8, complete: bool = False,
+                kind: Optional[str] = None) -> List[Suggestion]:
+        """
+        The best suggestions for what has been typed so far. complete treats the last
+        word as finished rather than a prefix; kind ('recipe' or 'ingredient') limits
+        the suggestions to one kind.
+        """
+        tokens = _words(query)
+        limit = max(1, min(limit, MAX_SUGGESTIONS))
+        if not tokens or not self.suggestions:
+            return []
+        ranked = self._rank(tokens, complete, False, limit, kind)
+        if len(ranked) < limit:
+            ranked = self._rank(tokens, complete, True, limit, kind)
+        return [self.suggestions[entry] for entry in ranked]
+
+
+class _IndexCache:
+    """Thread-safe LRU of built indexes, one per recipe store, rebuilt when the store's version changes."""
+
+    def __init__(self, max_entries: int = AUTOCOMPLETE_CACHE_USERS):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Hashable, Tuple[Hashable, AutocompleteIndex]]" = OrderedDict()
+
+    def get(self, repository) -> AutocompleteIndex:
+        key = (type(repository).__name__, repository.user_id)
+        version = repository.index_version()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(key)
+                return entry[1]
+
+        pantry = repository.pantry_index()
+        index = AutocompleteIndex(
+            [(summary.id, summary.folder_id, summary.name) for summary in repository.list_recipes()],
+            list(zip(pantry.ingredient_ids, pantry.ingredient_counts)))
+        with self._lock:
+            self._entries[key] = (version, index)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return index
+
+
+_indexes = _IndexCache()
+
+
+def autocomplete_index(repository) -> AutocompleteIndex:
+    """The autocomplete index of a repository's recipes, rebuilt only after recipes changed."""
+    return _indexes.get(repository)
+
+
+def suggest(repository, query: str, limit: int = 8) -> List[Suggestion]:
+    """Typeahead suggestions (recipe names and ingredients) for a partly typed query."""
+    return autocomplete_index(repository).suggest(query, limit)
+
+
+def recipe_name_candidates(repository, name: str) -> List[Suggestion]:
+    """
+    Saved recipes a name that doesn't match exactly may refer to, best first: every
+    word must match one of the recipe's, allowing a typo, and the word counts must agree.
+    """
+    tokens = _words(name)
+    return [suggestion for suggestion in
+            autocomplete_index(repository).suggest(name, MAX_SUGGESTIONS, complete=True, kind='recipe')
+            if len(_words(suggestion.text)) == len(tokens)]
+
+
+def recipe_name_variant(repository, name: str, folder_id: str) -> Optional[str]:
+    """
+    The ID of a recipe in folder_id whose name differs from name only in case and
+    punctuation, the way lookups by sanitized filename used to match. None if there is none.
+    """
+    tokens = _words(name)
+    for suggestion in recipe_name_candidates(repository, name):
+        if suggestion.folder_id == folder_id and _words(suggestion.text) == tokens:
+            return suggestion.recipe_id
+    return None
+
+
+def resolve_recipe_name(repository, name: str, folder_id: Optional[str] = None) -> Optional[str]:
+    """
+    The ID of the best of recipe_name_candidates; among candidates with the same
+    name, one in folder_id is preferred. None if there are no candidates.
+    """
+    suggestions = recipe_name_candidates(repository, name)
+    if not suggestions:
+        return None
+    best_text = _words(suggestions[0].text)
+    in_folder = [suggestion for suggestion in suggestions
+                 if suggestion.folder_id == folder_id and _words(suggestion.text) == best_text]
+    return (in_folder or suggestions)[0].recipe_id
+
+
+if __name__ == "__main__":
+    import sys
+    import time
+    import random
+
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    words = ('chicken garlic lemon pasta tomato basil rice bean curry salmon spinach mushroom potato beef pork '
+             'shrimp tofu coconut chickpea lentil quinoa noodle soup stew salad roast grilled baked creamy spicy '
+             'crispy honey ginger sesame teriyaki pesto parmesan mozzarella cheddar avocado mango apple banana '
+             'chocolate vanilla cinnamon pumpkin zucchini eggplant broccoli cauliflower cabbage carrot onion pepper '
+             'taco burrito enchilada pizza lasagna risotto paella biryani korma tikka masala ramen pho udon').split()
+    weights = [1 / (position + 1) ** 0.7 for position in range(len(words))]
+    rng = random.Random(0)
+    names = [" ".join(rng.choices(words, weights, k=rng.randint(2, 5))).title() for _ in range(count)]
+    recipes = [(f"recipe-{index}", f"folder_{index % 5}", name) for index, name in enumerate(names)]
+    ingredients = [(word, rng.randint(1, count // 10)) for word in words] + \
+                  [(f"{adjective} {word}", rng.randint(1, 50)) for adjective in ('fresh', 'dried', 'ground', 'smoked')
+                   for word in words[:30]]
+
+    start = time.perf_counter()
+    index = AutocompleteIndex(recipes, ingredients)
+    print(f"build: {len(index)} entries in {(time.perf_counter() - start) * 1000:.0f} ms")
+
+    def typo(word):
+        position = rng.randrange(1, len(word) - 1)
+        return word[:position] + word[position + 1] + word[position] + word[position + 2:]
+
+    # Every keystroke of sampled names, plus the same names with a swapped-letter typo
+    queries = []
+    for name in rng.sample(names, 200):
+        queries.extend(name.lower()[:end] for end in range(1, len(name) + 1))
+        queries.append(" ".join(typo(word) if len(word) >= FUZZY_MIN_LENGTH else word for word in name.lower().split()))
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        index.suggest(query, 8)
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    print(f"{len(queries)} queries at {count} recipes: p50 {latencies[len(latencies) // 2] * 1000:.3f} ms, "
+          f"p99 {latencies[int(len(latencies) * 0.99)] * 1000:.3f} ms, max {latencies[-1] * 1000:.3f} ms")
+
+    def scan(query):
+        # What the UI would otherwise do: a substring check over every name
+        return [name for name in names if query.lower() in name.lower()][:8]
+
+    start = time.perf_counter()
+    for query in queries[:500]:
+        scan(query)
+    print(f"substring scan: {(time.perf_counter() - start) / 500 * 1000:.3f} ms per query")
+
+    # Names resolve with a different case, punctuation or a typo
+    for recipe_id, folder_id, name in recipes[:200]:
+        for variant in (name.upper(), name.replace(" ", "  ") + "!",
+                        " ".join(typo(word) if len(word) >= TWO_TYPOS_LENGTH else word for word in name.split())):
+            resolved = index.suggest(variant, MAX_SUGGESTIONS, complete=True, kind='recipe')
+            assert any(suggestion.text == name for suggestion in resolved), (variant, name)
+    assert index.suggest("chick", 3)[0].text.lower().startswith("chick")
+    assert any(suggestion.text == "Chickpea" or "chickpea" in suggestion.text.lower()
+               for suggestion in index.suggest("chikcpea", 5))
+
+    # End to end, as the endpoint runs: the repository's version check, the cached
+    # index and the query, for a user with the same recipes saved as files
+    import io
+    import shutil
+    import tempfile
+    from contextlib import redirect_stdout
+    from recipe_extractor import Recipe, save_recipe_to_file
+    from recipe_repository import FileRecipeRepository
+
+    workdir = tempfile.mkdtemp(prefix="recipe-autocomplete-bench-")
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        repository = FileRecipeRepository('bench')
+        with redirect_stdout(io.StringIO()):
+            for _, folder_id, name in recipes:
+                save_recipe_to_file(Recipe(name=name, serving_size="4",
+                                           ingredients=[f"1 cup {word}" for word in name.lower().split()],
+                                           instructions=["Cook"]),
+                                    directory=repository.recipes_dir, folder_id=folder_id, enrich=False)
+        start = time.perf_counter()
+        suggest(repository, "c")
+        print(f"end to end: first query (index build) {(time.perf_counter() - start) * 1000:.0f} ms")
+        latencies = []
+        for query in queries:
+            start = time.perf_counter()
+            suggest(repository, query, 8)
+            latencies.append(time.perf_counter() - start)
+        latencies.sort()
+        print(f"end to end: p50 {latencies[len(latencies) // 2] * 1000:.3f} ms, "
+              f"p99 {latencies[int(len(latencies) * 0.99)] * 1000:.3f} ms, max {latencies[-1] * 1000:.3f} ms")
+        # A different case or a typo resolves to the saved recipe
+        recipe_id, folder_id, name = next(entry for entry in recipes if len(entry[2]) >= TWO_TYPOS_LENGTH)
+        resolved = resolve_recipe_name(repository, name.upper(), folder_id)
+        assert repository.get_recipe_by_id(resolved)[1].name == name
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir)
+
+    # The pure-Python ranking agrees
+    numpy_suggestions = [index.suggest(query, 8) for query in queries[::10]]
+    numpy_available = False
+    python_index = AutocompleteIndex(recipes, ingredients)
+    assert [python_index.suggest(query, 8) for query in queries[::10]] == numpy_suggestions
@@ -0,0 +1,170 @@
+"""
+In-process cache of validated recipe objects.
+
+The same recipe files are read and validated again and again: for details,
+for meal plans, when the manifest rescans a folder. RecipeCache keeps the
+validated objects keyed by (absolute path, model, mtime_ns, size), so a
+repeat read costs one stat() call, and any change to the file misses the
+cache and replaces the old entry.
+
+The cache is bounded by an estimate of the memory its objects use (file
+size times RECIPE_CACHE_SIZE_FACTOR) and evicts least-recently-used entries
+past RECIPE_CACHE_MAX_BYTES. Cached objects are shared between callers and
+must not be modified.
+"""
+
+import os
+import json
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Tuple, Type, TypeVar
+
+from pydantic import BaseModel
+
+RECIPE_CACHE_MAX_BYTES = int(os.environ.get("RECIPE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+# Bytes of memory a validated recipe takes per byte of its JSON file
+# (measured at about 3 with tracemalloc, see __main__; rounded up)
+RECIPE_CACHE_SIZE_FACTOR = float(os.environ.get("RECIPE_CACHE_SIZE_FACTOR", "4"))
+
+ModelT = TypeVar("ModelT", bound=BaseModel)
+
+
+class RecipeCache:
+    """Thread-safe LRU of validated pydantic objects loaded from JSON files, bounded by estimated memory."""
+
+    def __init__(self, max_bytes: int = RECIPE_CACHE_MAX_BYTES, size_factor: float = RECIPE_CACHE_SIZE_FACTOR):
+        self.max_bytes = max_bytes
+        self.size_factor = size_factor
+        self._lock = threading.Lock()
+        # (path, model, mtime_ns, size) -> (object, estimated bytes)
+        self._entries: "OrderedDict[Tuple, Tuple[BaseModel, int]]" = OrderedDict()
+        # (path, model) -> key of the version currently cached
+        self._current: Dict[Tuple[str, type], Tuple] = {}
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def load(self, filepath: str, model: Type[ModelT]) -> ModelT:
+        """
+        Returns the file's contents validated as model, from the cache if the file is
+        unchanged. Raises like open/json.load/model_validate would on a bad file.
+        """
+        path = os.path.abspath(filepath)
+        stat = os.stat(path)
+        key = (path, model, stat.st_mtime_ns, stat.st_size)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+
+        with open(path, 'r', encoding='utf-8') as f:
+            value = model.model_validate(json.load(f))
+
+        cost = int(stat.st_size * self.size_factor)
+        with self._lock:
+            self._discard((path, model))
+            if cost <= self.max_bytes:
+                self._entries[key] = (value, cost)
+                self._current[(path, model)] = key
+                self._bytes += cost
+                while self._bytes > self.max_bytes:
+                    old_key, (_, old_cost) = self._entries.popitem(last=False)
+                    self._current.pop(old_key[:2], None)
+                    self._bytes -= old_cost
+                    self.evictions += 1
+        return value
+
+    def _discard(self, path_and_model: Tuple[str, type]):
+        """Drops the cached version of one file; the lock must be held."""
+        old_key = self._current.pop(path_and_model, None)
+        if old_key is not None:
+            _, old_cost = self._entries.pop(old_key)
+            self._bytes -= old_cost
+
+    def invalidate(self, filepath: str):
+        """Drops a file from the cache, for every model it was loaded as."""
+        path = os.path.abspath(filepath)
+        with self._lock:
+            for path_and_model in [key for key in self._current if key[0] == path]:
+                self._discard(path_and_model)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._current.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'estimated_bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else None,
+                'evictions': self.evictions,
+            }
+
+
+recipe_cache = RecipeCache()
+
+
+if __name__ == "__main__":
+    import time
+    import shutil
+    import tempfile
+    import tracemalloc
+    from recipe_extractor import Recipe
+
+    directory = tempfile.mkdtemp(prefix="recipe-cache-bench-")
+    try:
+        paths = []
+        for index in range(500):
+            recipe = Recipe(name=f"Recipe {index}", serving_size="4 servings",
+                            ingredients=[f"{i + 1} cups chopped ingredient number {i}" for i in range(12)],
+                            instructions=[f"Step {i + 1}: stir everything together and cook gently" for i in range(8)])
+            paths.append(os.path.join(directory, f"recipe_{index}.json"))
+            with open(paths[-1], 'w', encoding='utf-8') as f:
+                json.dump(recipe.model_dump(), f, ensure_ascii=False, indent=4)
+
+        cache = RecipeCache(max_bytes=1 << 40)
+        tracemalloc.start()
+        for path in paths:
+            cache.load(path, Recipe)
+        used, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        file_bytes = sum(os.path.getsize(path) for path in paths)
+        print(f"Measured memory per file byte: {used / file_bytes:.2f} (RECIPE_CACHE_SIZE_FACTOR={RECIPE_CACHE_SIZE_FACTOR})")
+
+        def read_uncached(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                return Recipe.model_validate(json.load(f))
+
+        for label, read in (("open+parse+validate", read_uncached), ("cache hit", lambda path: cache.load(path, Recipe))):
+            start = time.perf_counter()
+            for _ in range(5):
+                for path in paths:
+                    read(path)
+            print(f"{label}: {(time.perf_counter() - start) / (5 * len(paths)) * 1e6:.1f} us per recipe")
+
+        # Changing a file must miss; a small budget must evict
+        with open(paths[0], 'a', encoding='utf-8') as f:
+            f.write("\n")
+        misses = cache.misses
+        cache.load(paths[0], Recipe)
+        assert cache.misses == misses + 1
+        small = RecipeCache(max_bytes=int(file_bytes * RECIPE_CACHE_SIZE_FACTOR / 10))
+        for path in paths:
+            small.load(path, Recipe)
+        assert small.stats()['estimated_bytes'] <= small.max_bytes and small.evictions > 0
+        print(cache.stats())
+    finally:
+        shutil.rmtree(directory)
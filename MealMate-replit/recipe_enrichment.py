@@ -0,0 +1,180 @@
+"""
+Enrich-on-save stage for saved recipes.
+
+When a recipe is saved, its ingredient lines are parsed once in the
+background and stored in the recipe JSON next to the raw lines, tagged with
+the parser version that produced them. Meal planning then consolidates
+straight from the stored data and only re-parses recipes whose stored
+version is missing or out of date.
+"""
+
+import os
+import json
+import tempfile
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from meal_planner import (ParsedIngredient, PARSING_MODEL_NAME, PARSING_PROMPT_VERSION,
+                          parse_ingredient_lines, iter_parsed_recipes_ingredients)
+from ingredient_parser import LOCAL_PARSER_VERSION
+
+# Schema and parser version stored with structured ingredients. Any change to
+# the local rules, the Gemini model or its prompt makes stored parses stale.
+STRUCTURED_INGREDIENTS_SCHEMA_VERSION = 1
+STRUCTURED_INGREDIENTS_VERSION = (
+    f"schema-{STRUCTURED_INGREDIENTS_SCHEMA_VERSION}:local-{LOCAL_PARSER_VERSION}:"
+    f"{PARSING_MODEL_NAME}-prompt-{PARSING_PROMPT_VERSION}"
+)
+
+ENRICHMENT_WORKERS = max(1, int(os.environ.get("RECIPE_ENRICHMENT_WORKERS", "2")))
+
+_enrichment_executor = ThreadPoolExecutor(max_workers=ENRICHMENT_WORKERS, thread_name_prefix="recipe-enrichment")
+
+
+def get_stored_structured_ingredients(recipe) -> Optional[List[Optional[ParsedIngredient]]]:
+    """
+    Returns the recipe's stored parsed ingredients if they were produced by the
+    current parser version and still line up with its ingredient list, else None.
+    """
+    stored = getattr(recipe, 'structured_ingredients', None)
+    if (stored is None
+            or getattr(recipe, 'structured_ingredients_version', None) != STRUCTURED_INGREDIENTS_VERSION
+            or len(stored) != len(recipe.ingredients)):
+        return None
+
+    try:
+        return [ParsedIngredient.model_validate(entry) if entry else None for entry in stored]
+    except Exception as e:
+        print(f"Ignoring invalid structured ingredients for '{recipe.name}': {e}")
+        return None
+
+
+def iter_structured_ingredients(recipes: List[Any]) -> Iterator[Tuple[int, List[Optional[ParsedIngredient]]]]:
+    """
+    Yields (recipe_index, parsed_lines) for each recipe, aligned with recipe.ingredients,
+    as soon as each one is available. Recipes with complete, up-to-date stored parses
+    come first; stale or unenriched recipes are parsed concurrently and yielded as
+    they finish; last come recipes where only a few lines failed to parse at save
+    time and are retried. Closing the generator cancels outstanding parse work.
+    """
+    stored = [get_stored_structured_ingredients(recipe) for recipe in recipes]
+
+    stale = []
+    gaps = []
+    for index, parsed_lines in enumerate(stored):
+        if parsed_lines is None:
+            stale.append(index)
+        elif None in parsed_lines:
+            gaps.extend((index, line_index) for line_index, parsed in enumerate(parsed_lines) if parsed is None)
+        else:
+            yield index, parsed_lines
+
+    if stale:
+        parsing = iter_parsed_recipes_ingredients([recipes[index] for index in stale])
+        try:
+            for stale_position, parsed_lines in parsing:
+                yield stale[stale_position], parsed_lines
+        finally:
+            parsing.close()
+
+    if gaps:
+        texts = [recipes[recipe_index].ingredients[line_index] for recipe_index, line_index in gaps]
+        for (recipe_index, line_index), parsed in zip(gaps, parse_ingredient_lines(texts)):
+            stored[recipe_index][line_index] = parsed
+        for recipe_index in dict.fromkeys(recipe_index for recipe_index, _ in gaps):
+            yield recipe_index, stored[recipe_index]
+
+
+def load_structured_ingredients(recipes: List[Any],
+                                on_progress: Optional[Callable[[int], None]] = None) -> List[List[Optional[ParsedIngredient]]]:
+    """
+    Returns parsed ingredients for each recipe, in recipe order and aligned with
+    recipe.ingredients (see iter_structured_ingredients). Recipes that could not
+    be parsed before the deadline come back as lists of None. on_progress, if
+    given, receives counts of ingredient lines as they become available.
+    """
+    results: List[List[Optional[ParsedIngredient]]] = [[None] * len(recipe.ingredients) for recipe in recipes]
+    for index, parsed_lines in iter_structured_ingredients(recipes):
+        results[index] = parsed_lines
+        if on_progress:
+            on_progress(len(parsed_lines))
+    return results
+
+
+def lookup_structured_ingredients(recipes: List[Any]) -> List[List[Optional[ParsedIngredient]]]:
+    """
+    Like load_structured_ingredients, but never calls Gemini: lines come from the
+    stored parses where current, else from the local parser or the ingredient
+    cache, and are None otherwise.
+    """
+    results = []
+    for recipe in recipes:
+        stored = get_stored_structured_ingredients(recipe)
+        if stored is not None and None not in stored:
+            results.append(stored)
+            continue
+        looked_up = parse_ingredient_lines(recipe.ingredients, use_gemini=False)
+        results.append([parsed or found for parsed, found in zip(stored or looked_up, looked_up)])
+    return results
+
+
+def enrich_recipe_data(data: Dict[str, Any]) -> Dict[str, Any]:
+    """Adds structured_ingredients and their version to a recipe's JSON data."""
+    parsed_lines = parse_ingredient_lines(data.get('ingredients', []))
+    data['structured_ingredients'] = [parsed.model_dump() if parsed else None for parsed in parsed_lines]
+    data['structured_ingredients_version'] = STRUCTURED_INGREDIENTS_VERSION
+    return data
+
+
+def enrich_recipe_file(filepath: str) -> bool:
+    """
+    Parses a saved recipe's ingredients and writes them back into its JSON file.
+    Skips files that are already current, and gives up without writing if the
+    file was moved, deleted or had its ingredients edited while parsing ran.
+    Returns True if the file was updated.
+    """
+    try:
+        with open(filepath, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"Cannot enrich recipe file {filepath}: {e}")
+        return False
+
+    if (data.get('structured_ingredients_version') == STRUCTURED_INGREDIENTS_VERSION
+            and len(data.get('structured_ingredients') or []) == len(data.get('ingredients', []))):
+        return False
+
+    ingredients = list(data.get('ingredients', []))
+    enriched = enrich_recipe_data({'ingredients': ingredients})
+
+    # Write onto the file as it is now, so fields set meanwhile (such as the
+    # recipe ID the manifest assigns to older files) are kept
+    try:
+        with open(filepath, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return False
+    if data.get('ingredients') != ingredients:
+        return False
+    data['structured_ingredients'] = enriched['structured_ingredients']
+    data['structured_ingredients_version'] = enriched['structured_ingredients_version']
+
+    directory = os.path.dirname(filepath) or '.'
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.enrich-', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=4)
+        os.replace(temp_path, filepath)
+    except OSError as e:
+        print(f"Error writing enriched recipe {filepath}: {e}")
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        return False
+
+    print(f"Stored parsed ingredients for {filepath}")
+    return True
+
+
+def schedule_recipe_enrichment(filepath: str) -> Future:
+    """Queues a saved recipe file for background ingredient parsing."""
+    return _enrichment_executor.submit(enrich_recipe_file, filepath)
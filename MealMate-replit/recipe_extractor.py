@@ -3,43 +3,66 @@ import requests
 from bs4 import BeautifulSoup
 from recipe_scrapers import scrape_me
 from pydantic import BaseModel, Field
-from typing import List, Optional
-import google.generativeai as genai
-from dotenv import load_dotenv
+from typing import Any, Dict, List, Optional
 import json
+import uuid
+from llm_client import llm_client
 
 # --- Pydantic Models for Structured Output ---
 class Recipe(BaseModel):
+    id: Optional[str] = Field(None, description="Unique recipe ID, assigned when the recipe is first saved. Saved files are named after it.")
     name: str = Field(description="The name of the recipe.")
     serving_size: Optional[str] = Field(None, description="The serving size of the recipe, e.g., '4 servings' or '6 people'.")
     ingredients: List[str] = Field(description="A list of ingredients for the recipe.")
     instructions: List[str] = Field(description="A list of step-by-step instructions for the recipe.")
+    structured_ingredients: Optional[List[Optional[Dict[str, Any]]]] = Field(None, description="Parsed form of each ingredient line (see ParsedIngredient), aligned with ingredients. Filled in after saving.")
+    structured_ingredients_version: Optional[str] = Field(None, description="Parser version that produced structured_ingredients.")
 
-# --- Configure Gemini API ---
-load_dotenv()
+# --- Gemini settings (calls go through llm_client) ---
+EXTRACTION_MODEL_NAME = 'gemini-1.5-flash'
 
-try:
-    genai.configure(api_key=os.environ["GEMINI_API_KEY"])
-except KeyError:
-    print("Error: GEMINI_API_KEY not found in environment variables or .env file.")
-    print("Please make sure you have a .env file in the same directory with GEMINI_API_KEY='your_api_key'")
-    exit()
+def new_recipe_id() -> str:
+    return str(uuid.uuid4())
 
-model = genai.GenerativeModel('gemini-1.5-flash')
+def save_recipe_to_file(recipe: Recipe, directory="saved_recipes", folder_id="uncategorized", enrich=True):
+    """
+    Saves a Recipe object to a JSON file in the specified folder and returns its path.
+    A recipe without an ID gets a new one (set on the object) and is stored as
+    <id>.json, so recipes with the same name never overwrite each other. Saving
+    a recipe that already has an ID replaces the stored copy, wherever it is.
+    The directory's recipe manifest is updated to match (see recipe_manifest.py).
+    Unless enrich is False, the recipe's ingredients are then parsed in the
+    background and stored in the same file (see recipe_enrichment.py).
+    """
+    from recipe_manifest import get_recipe_manifest
+
+    manifest = get_recipe_manifest(directory)
+    existing = None
+    if recipe.id is None:
+        recipe.id = new_recipe_id()
+    else:
+        existing = manifest.get(recipe.id)
 
-def save_recipe_to_file(recipe: Recipe, directory="saved_recipes", folder_id="uncategorized"):
-    """Saves a Recipe object to a JSON file in the specified folder."""
     # Create user-specific directory structure
     user_dir = os.path.join(directory, folder_id)
     os.makedirs(user_dir, exist_ok=True)
-    
-    # Sanitize name for filename (replace spaces with underscores, remove special chars)
-    filename = "".join(c if c.isalnum() else "_" for c in recipe.name).lower()
-    filepath = os.path.join(user_dir, f"{filename}.json")
+
+    # Files saved before IDs existed keep their name-based filename
+    filename = existing.filename if existing and existing.folder_id == folder_id else f"{recipe.id}.json"
+    filepath = os.path.join(user_dir, filename)
 
     with open(filepath, 'w', encoding='utf-8') as f:
         json.dump(recipe.model_dump(), f, ensure_ascii=False, indent=4)
     print(f"Recipe '{recipe.name}' saved to {filepath}")
+    if existing and existing.folder_id != folder_id:
+        os.remove(manifest.filepath(existing))
+        manifest.record_deleted(existing.folder_id, existing.filename)
+    manifest.record_saved(folder_id, filename, recipe)
+
+    if enrich:
+        from recipe_enrichment import schedule_recipe_enrichment
+        schedule_recipe_enrichment(filepath)
+    return filepath
 
 def extract_recipe_from_url(url: str) -> Optional[Recipe]:
     """
@@ -94,11 +117,11 @@ def extract_recipe_from_url(url: str) -> Optional[Recipe]:
         {full_text[:8000]}
         """
         
-        response = model.generate_content(prompt)
+        raw_response = llm_client.generate_text(prompt, model_name=EXTRACTION_MODEL_NAME, task="recipe_extract")
         
         try:
             # Clean up the response text
-            response_text = response.text.strip()
+            response_text = raw_response.strip()
             if response_text.startswith('```json'):
                 response_text = response_text[7:].strip()
             if response_text.endswith('```'):
@@ -110,7 +133,7 @@ def extract_recipe_from_url(url: str) -> Optional[Recipe]:
             return parsed_recipe
         except Exception as e:
             print(f"Failed to parse Gemini API response as JSON: {e}")
-            print(f"Gemini raw response: {response.text}")
+            print(f"Gemini raw response: {raw_response}")
             return None
 
     except requests.exceptions.RequestException as e:
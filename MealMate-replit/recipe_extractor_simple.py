@@ -15,23 +15,9 @@ class Recipe(BaseModel):
     instructions: List[str] = Field(description="A list of step-by-step instructions for the recipe.")
 
 def save_recipe_to_file(recipe: Recipe, directory="saved_recipes", folder_id="uncategorized"):
-    """Saves a Recipe object to a JSON file in the specified folder."""
-    # Use the directory path as-is to prevent duplication
-    recipe_dir = os.path.join(directory, folder_id)
-    os.makedirs(recipe_dir, exist_ok=True)
-    
-    # Create a safe filename from the recipe name
-    safe_name = "".join(c for c in recipe.name if c.isalnum() or c in (' ', '-', '_')).rstrip()
-    safe_name = safe_name.replace(' ', '_')
-    filename = f"{safe_name}.json"
-    filepath = os.path.join(recipe_dir, filename)
-    
-    # Save recipe as JSON
-    with open(filepath, 'w', encoding='utf-8') as f:
-        json.dump(recipe.model_dump(), f, indent=2, ensure_ascii=False)
-    
-    print(f"Recipe saved to: {filepath}")
-    return filepath
+    """Saves a Recipe object to a JSON file in the specified folder, the same way recipe_extractor does."""
+    from recipe_extractor import Recipe as StoredRecipe, save_recipe_to_file as save_stored_recipe
+    return save_stored_recipe(StoredRecipe(**recipe.model_dump()), directory=directory, folder_id=folder_id)
 
 def extract_recipe_from_url(url: str) -> Optional[Recipe]:
     """
@@ -0,0 +1,471 @@
+"""
+Per-user index of saved recipes.
+
+Listing a user's recipes used to mean reading and validating every recipe
+file just to show its name and counts. The manifest keeps one row per
+recipe file (recipe ID, folder, filename, name, serving size, ingredient
+and instruction counts) in a small SQLite database inside the user's
+saved_recipes directory, so listings are a single query and finding a
+recipe by ID is a single lookup. It also holds the recipes' search postings
+(see recipe_search_index.py), kept in step with the rows by triggers, and
+each recipe's canonical ingredient IDs (see pantry_index.py).
+
+save_recipe_to_file and the delete/move routes update it as they change
+files. Anything that changes files behind its back (deleting a folder,
+background enrichment, files copied in by hand) is picked up on the next
+listing: each folder's directory mtime is compared with the one recorded at
+its last scan, and only folders that changed are rescanned, re-reading only
+files whose mtime or size changed. Scans never write recipe files: files
+saved before recipes had IDs, and copies of a file whose ID is already taken,
+are indexed under an ID derived from their path until `flask
+rebuild-recipe-manifests` stores it in the file (backfill_ids). rebuild()
+recreates the index from the files.
+"""
+
+import os
+import json
+import random
+import sqlite3
+import tempfile
+import threading
+import uuid
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from pantry_index import PantryIndex, pantry_indexes, recipe_ingredient_ids
+from recipe_search_index import SEARCH_INDEX_VERSION, bm25_scores, rank, recipe_term_frequencies, tokenize
+
+MANIFEST_FILENAME = "manifest.sqlite3"
+
+# Bump when the tables change; an index with another version is rebuilt from the files
+MANIFEST_SCHEMA_VERSION = 4
+
+# Stored as SQLite's user_version, so a search tokenizer change also triggers a rebuild
+_USER_VERSION = MANIFEST_SCHEMA_VERSION * 1000 + SEARCH_INDEX_VERSION
+
+
+_ENTRY_COLUMNS = "recipe_id, folder_id, filename, name, serving_size, ingredients_count, instructions_count"
+
+
+@dataclass
+class ManifestEntry:
+    recipe_id: str
+    folder_id: str
+    filename: str
+    name: str
+    serving_size: Optional[str]
+    ingredients_count: int
+    instructions_count: int
+
+    def to_dict(self) -> Dict:
+        return asdict(self)
+
+
+def _read_entry(folder_id: str, filename: str, filepath: str) -> Optional[Tuple[ManifestEntry, Any]]:
+    """
+    Reads a recipe file, returning its listed fields and the recipe, or None if it
+    isn't a valid recipe. recipe_id is None if the file has no ID yet.
+    """
+    from recipe_cache import recipe_cache
+    from recipe_extractor import Recipe
+    try:
+        recipe = recipe_cache.load(filepath, Recipe)
+    except Exception as e:
+        print(f"Error loading recipe from {filename}: {e}")
+        return None
+    return ManifestEntry(recipe.id, folder_id, filename, recipe.name, recipe.serving_size,
+                         len(recipe.ingredients), len(recipe.instructions)), recipe
+
+
+def _path_recipe_id(folder_id: str, filename: str) -> str:
+    """The ID a recipe file without a usable one of its own is indexed under; stable while the file stays put."""
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, f"{folder_id}/{filename}"))
+
+
+def _write_recipe_id(filepath: str, recipe_id: str) -> bool:
+    """Stores an ID in a recipe file, replacing the file atomically. Returns False if it can't be written."""
+    temp_path = None
+    try:
+        with open(filepath, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        data['id'] = recipe_id
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(filepath) or '.', prefix='.id-', suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=4)
+        os.replace(temp_path, filepath)
+    except (OSError, ValueError) as e:
+        print(f"Cannot assign an ID to recipe file {filepath}: {e}")
+        if temp_path and os.path.exists(temp_path):
+            os.remove(temp_path)
+        return False
+    return True
+
+
+class RecipeManifest:
+    """SQLite index of the recipe files under one saved_recipes directory."""
+
+    def __init__(self, recipes_dir: str):
+        self.recipes_dir = recipes_dir
+        self.path = os.path.join(recipes_dir, MANIFEST_FILENAME)
+        self._lock = threading.Lock()
+        self._initialized = False
+        self._local = threading.local()
+
+    def _connect(self) -> sqlite3.Connection:
+        """
+        Returns this thread's connection, creating the schema on first use.
+        Connections are kept open, since opening one and loading the schema
+        costs more than an indexed lookup.
+        """
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            return conn
+        os.makedirs(self.recipes_dir, exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=30)
+        if not self._initialized:
+            conn.execute("PRAGMA journal_mode=WAL")
+            (version,) = conn.execute("PRAGMA user_version").fetchone()
+            if version != _USER_VERSION:
+                # Rows are rebuilt by the next sync, since no folder has a recorded scan
+                for table in ("recipes", "folders", "postings", "totals"):
+                    conn.execute(f"DROP TABLE IF EXISTS {table}")
+                conn.execute(f"PRAGMA user_version = {_USER_VERSION}")
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS recipes (
+                       recipe_id TEXT NOT NULL,
+                       folder_id TEXT NOT NULL,
+                       filename TEXT NOT NULL,
+                       name TEXT NOT NULL,
+                       serving_size TEXT,
+                       ingredients_count INTEGER NOT NULL,
+                       instructions_count INTEGER NOT NULL,
+                       mtime_ns INTEGER NOT NULL,
+                       size INTEGER NOT NULL,
+                       term_count INTEGER NOT NULL,
+                       ingredient_ids TEXT NOT NULL,
+                       PRIMARY KEY (folder_id, filename)
+                   )"""
+            )
+            conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_recipes_recipe_id ON recipes (recipe_id)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_recipes_name ON recipes (name)")
+            # Directory mtime of each folder at its last full scan
+            conn.execute("CREATE TABLE IF NOT EXISTS folders (folder_id TEXT PRIMARY KEY, mtime_ns INTEGER NOT NULL)")
+            # Search postings, and the recipe count and total length BM25 needs
+            # Postings carry the recipe's length, so a query reads nothing but its terms' postings
+            conn.execute("CREATE TABLE IF NOT EXISTS postings (term TEXT NOT NULL, recipe_id TEXT NOT NULL, "
+                         "tf INTEGER NOT NULL, length INTEGER NOT NULL, PRIMARY KEY (term, recipe_id)) WITHOUT ROWID")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_postings_recipe_id ON postings (recipe_id)")
+            # generation changes whenever a recipe is added, replaced, moved or removed, so
+            # indexes derived from the recipes know when to rebuild; it starts at a random
+            # value, so a recreated manifest can't match indexes built from the one it replaced
+            conn.execute("CREATE TABLE IF NOT EXISTS totals (id INTEGER PRIMARY KEY CHECK (id = 0), "
+                         "recipe_count INTEGER NOT NULL, term_count INTEGER NOT NULL, generation INTEGER NOT NULL)")
+            conn.execute("INSERT OR IGNORE INTO totals VALUES (0, 0, 0, ?)", (random.getrandbits(48),))
+            conn.execute("CREATE TRIGGER IF NOT EXISTS recipes_inserted AFTER INSERT ON recipes BEGIN "
+                         "UPDATE totals SET recipe_count = recipe_count + 1, term_count = term_count + NEW.term_count, "
+                         "generation = generation + 1; "
+                         "END")
+            conn.execute("CREATE TRIGGER IF NOT EXISTS recipes_deleted AFTER DELETE ON recipes BEGIN "
+                         "DELETE FROM postings WHERE recipe_id = OLD.recipe_id; "
+                         "UPDATE totals SET recipe_count = recipe_count - 1, term_count = term_count - OLD.term_count, "
+                         "generation = generation + 1; "
+                         "END")
+            conn.execute("CREATE TRIGGER IF NOT EXISTS recipes_moved AFTER UPDATE OF folder_id ON recipes BEGIN "
+                         "UPDATE totals SET generation = generation + 1; "
+                         "END")
+            conn.commit()
+            self._initialized = True
+        self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        """Yields a connection inside a transaction that commits on success and rolls back on error."""
+        conn = self._connect()
+        with conn:
+            yield conn
+
+    def _upsert(self, conn: sqlite3.Connection, entry: ManifestEntry, stat: os.stat_result, recipe):
+        terms = recipe_term_frequencies(recipe)
+        length = sum(terms.values())
+        # Deleting the old row (rather than INSERT OR REPLACE) fires the trigger that drops its postings
+        conn.execute("DELETE FROM recipes WHERE (folder_id = ? AND filename = ?) OR recipe_id = ?",
+                     (entry.folder_id, entry.filename, entry.recipe_id))
+        conn.execute(
+            "INSERT INTO recipes (recipe_id, folder_id, filename, name, serving_size, ingredients_count, "
+            "instructions_count, mtime_ns, size, term_count, ingredient_ids) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (entry.recipe_id, entry.folder_id, entry.filename, entry.name, entry.serving_size, entry.ingredients_count,
+             entry.instructions_count, stat.st_mtime_ns, stat.st_size, length,
+             json.dumps(recipe_ingredient_ids(recipe))))
+        conn.executemany("INSERT INTO postings (term, recipe_id, tf, length) VALUES (?, ?, ?, ?)",
+                         [(term, entry.recipe_id, frequency, length) for term, frequency in terms.items()])
+
+    # --- Updates from code that changes recipe files ---
+
+    def record_saved(self, folder_id: str, filename: str, recipe) -> None:
+        """Records a recipe file that was just written."""
+        filepath = os.path.join(self.recipes_dir, folder_id, filename)
+        entry = ManifestEntry(recipe.id, folder_id, filename, recipe.name, recipe.serving_size,
+                              len(recipe.ingredients), len(recipe.instructions))
+        try:
+            stat = os.stat(filepath)
+            with self._lock, self._transaction() as conn:
+                self._upsert(conn, entry, stat, recipe)
+        except (OSError, sqlite3.Error) as e:
+            print(f"Recipe manifest update failed for {filepath}: {e}")
+
+    def record_deleted(self, folder_id: str, filename: str) -> None:
+        try:
+            with self._lock, self._transaction() as conn:
+                conn.execute("DELETE FROM recipes WHERE folder_id = ? AND filename = ?", (folder_id, filename))
+        except sqlite3.Error as e:
+            print(f"Recipe manifest update failed for {folder_id}/{filename}: {e}")
+
+    def record_moved(self, filename: str, source_folder: str, target_folder: str) -> None:
+        try:
+            with self._lock, self._transaction() as conn:
+                conn.execute("DELETE FROM recipes WHERE folder_id = ? AND filename = ?", (target_folder, filename))
+                conn.execute("UPDATE recipes SET folder_id = ? WHERE folder_id = ? AND filename = ?",
+                             (target_folder, source_folder, filename))
+        except sqlite3.Error as e:
+            print(f"Recipe manifest update failed for {source_folder}/{filename}: {e}")
+
+    # --- Reads ---
+
+    def list_recipes(self, folder_id: Optional[str] = None) -> List[ManifestEntry]:
+        """All indexed recipes, or those in one folder, ordered by folder and filename."""
+        return self._select({'folder_id': folder_id})
+
+    def find(self, name: str, folder_id: Optional[str] = None) -> List[ManifestEntry]:
+        """Recipes with exactly this name, optionally within one folder."""
+        return self._select({'name': name, 'folder_id': folder_id})
+
+    def get(self, recipe_id: str) -> Optional[ManifestEntry]:
+        """
+        The recipe with this ID, or None. Answered from the index alone while its
+        file is where the index says; otherwise the folders are synced first.
+        """
+        matches = self._select({'recipe_id': recipe_id}, sync=False)
+        if matches and os.path.exists(self.filepath(matches[0])):
+            return matches[0]
+        matches = self._select({'recipe_id': recipe_id})
+        return matches[0] if matches else None
+
+    def get_many(self, recipe_ids: List[str]) -> Dict[str, ManifestEntry]:
+        """Rows for the given IDs, without syncing first (for IDs that just came from search)."""
+        if not recipe_ids:
+            return {}
+        with self._transaction() as conn:
+            rows = conn.execute(f"SELECT {_ENTRY_COLUMNS} FROM recipes "
+                                f"WHERE recipe_id IN ({', '.join('?' * len(recipe_ids))})", recipe_ids).fetchall()
+        return {row[0]: ManifestEntry(*row) for row in rows}
+
+    def search(self, query: str, limit: int, min_score: float = 0.0,
+               after: Optional[Tuple[float, str]] = None) -> List[Tuple[str, float]]:
+        """Recipe IDs ranked by BM25 for the query, best first, with their scores (see recipe_search_index.rank)."""
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return []
+        self.sync()
+        with self._transaction() as conn:
+            recipe_count, term_count = conn.execute("SELECT recipe_count, term_count FROM totals").fetchone()
+            postings = conn.execute("SELECT term, recipe_id, tf, length FROM postings "
+                                    f"WHERE term IN ({', '.join('?' * len(terms))})", terms).fetchall()
+        average_length = term_count / recipe_count if recipe_count else 0.0
+        return rank(bm25_scores(postings, recipe_count, average_length), limit, min_score, after)
+
+    def generation(self) -> int:
+        """A number that changes whenever a recipe is added, replaced, moved or removed."""
+        self.sync()
+        with self._transaction() as conn:
+            (generation,) = conn.execute("SELECT generation FROM totals").fetchone()
+        return generation
+
+    def stamps(self) -> Dict[str, str]:
+        """Recipe ID -> a stamp of its file's contents (mtime and size), without syncing first."""
+        with self._transaction() as conn:
+            return {recipe_id: f"{mtime_ns}:{size}"
+                    for recipe_id, mtime_ns, size in conn.execute("SELECT recipe_id, mtime_ns, size FROM recipes")}
+
+    def pantry_index(self) -> PantryIndex:
+        """The recipes' ingredient bitsets (see pantry_index.py), rebuilt only after recipes changed."""
+        generation = self.generation()
+
+        def load():
+            with self._transaction() as conn:
+                rows = conn.execute("SELECT recipe_id, ingredient_ids FROM recipes").fetchall()
+            return [(recipe_id, json.loads(ingredient_ids)) for recipe_id, ingredient_ids in rows]
+
+        return pantry_indexes.get(self.path, generation, load)
+
+    def _select(self, filters: Dict[str, Optional[str]], sync: bool = True) -> List[ManifestEntry]:
+        if sync:
+            self.sync()
+        conditions = {column: value for column, value in filters.items() if value is not None}
+        query = f"SELECT {_ENTRY_COLUMNS} FROM recipes"
+        if conditions:
+            query += " WHERE " + " AND ".join(f"{column} = ?" for column in conditions)
+        with self._transaction() as conn:
+            rows = conn.execute(query + " ORDER BY folder_id, filename", tuple(conditions.values())).fetchall()
+        return [ManifestEntry(*row) for row in rows]
+
+    def filepath(self, entry: ManifestEntry) -> str:
+        return os.path.join(self.recipes_dir, entry.folder_id, entry.filename)
+
+    def folder_counts(self) -> Dict[str, int]:
+        self.sync()
+        with self._transaction() as conn:
+            return dict(conn.execute("SELECT folder_id, COUNT(*) FROM recipes GROUP BY folder_id"))
+
+    # --- Keeping in step with the files ---
+
+    def sync(self) -> int:
+        """Rescans folders whose directory changed since their last scan. Returns how many were rescanned."""
+        try:
+            folder_mtimes = {entry.name: entry.stat().st_mtime_ns
+                             for entry in os.scandir(self.recipes_dir) if entry.is_dir()}
+        except FileNotFoundError:
+            folder_mtimes = {}
+
+        with self._lock, self._transaction() as conn:
+            recorded = dict(conn.execute("SELECT folder_id, mtime_ns FROM folders"))
+            indexed = {row[0] for row in conn.execute("SELECT DISTINCT folder_id FROM recipes")}
+            for folder_id in (set(recorded) | indexed) - set(folder_mtimes):
+                conn.execute("DELETE FROM recipes WHERE folder_id = ?", (folder_id,))
+                conn.execute("DELETE FROM folders WHERE folder_id = ?", (folder_id,))
+
+            changed = [folder_id for folder_id, mtime_ns in folder_mtimes.items()
+                       if recorded.get(folder_id) != mtime_ns]
+            for folder_id in changed:
+                self._scan_folder(conn, folder_id, folder_mtimes[folder_id])
+        return len(changed)
+
+    def _scan_folder(self, conn: sqlite3.Connection, folder_id: str, mtime_ns: int):
+        """Brings one folder's rows in line with its files, re-reading only changed files."""
+        folder_path = os.path.join(self.recipes_dir, folder_id)
+        known = {filename: (file_mtime, size) for filename, file_mtime, size in conn.execute(
+            "SELECT filename, mtime_ns, size FROM recipes WHERE folder_id = ?", (folder_id,))}
+
+        present = set()
+        for dir_entry in os.scandir(folder_path):
+            if not dir_entry.name.endswith('.json') or not dir_entry.is_file():
+                continue
+            stat = dir_entry.stat()
+            if known.get(dir_entry.name) == (stat.st_mtime_ns, stat.st_size):
+                present.add(dir_entry.name)
+                continue
+            loaded = _read_entry(folder_id, dir_entry.name, dir_entry.path)
+            if loaded is None:
+                continue
+            entry, recipe = loaded
+            if entry.recipe_id is None or self._id_taken(conn, entry):
+                entry.recipe_id = _path_recipe_id(folder_id, dir_entry.name)
+            self._upsert(conn, entry, stat, recipe)
+            present.add(dir_entry.name)
+
+        conn.executemany("DELETE FROM recipes WHERE folder_id = ? AND filename = ?",
+                         [(folder_id, filename) for filename in set(known) - present])
+        conn.execute("INSERT OR REPLACE INTO folders (folder_id, mtime_ns) VALUES (?, ?)", (folder_id, mtime_ns))
+
+    def _id_taken(self, conn: sqlite3.Connection, entry: ManifestEntry) -> bool:
+        """
+        True if another existing file is indexed under entry's ID (a copied file).
+        A row whose file is gone is a recipe that moved here; it is dropped.
+        """
+        row = conn.execute("SELECT folder_id, filename FROM recipes WHERE recipe_id = ?", (entry.recipe_id,)).fetchone()
+        if row is None or row == (entry.folder_id, entry.filename):
+            return False
+        if os.path.exists(os.path.join(self.recipes_dir, *row)):
+            return True
+        conn.execute("DELETE FROM recipes WHERE recipe_id = ?", (entry.recipe_id,))
+        return False
+
+    def backfill_ids(self) -> int:
+        """
+        Stores each recipe's indexed ID in its file where the file doesn't hold it
+        (see _path_recipe_id). Returns the number of files rewritten.
+        """
+        written = 0
+        for entry in self.list_recipes():
+            filepath = self.filepath(entry)
+            try:
+                with open(filepath, 'r', encoding='utf-8') as f:
+                    stored_id = json.load(f).get('id')
+            except (OSError, ValueError) as e:
+                print(f"Cannot read recipe file {filepath}: {e}")
+                continue
+            if stored_id != entry.recipe_id and _write_recipe_id(filepath, entry.recipe_id):
+                written += 1
+        # Rescan the rewritten files, so their rows carry the new mtimes and sizes
+        self.sync()
+        return written
+
+    def rebuild(self) -> int:
+        """Drops the index and rebuilds it from the recipe files. Returns the number of recipes indexed."""
+        with self._lock, self._transaction() as conn:
+            conn.execute("DELETE FROM postings")
+            conn.execute("DELETE FROM recipes")
+            conn.execute("DELETE FROM folders")
+        self.sync()
+        with self._transaction() as conn:
+            (count,) = conn.execute("SELECT COUNT(*) FROM recipes").fetchone()
+        return count
+
+
+_manifests: Dict[str, RecipeManifest] = {}
+_manifests_lock = threading.Lock()
+
+
+def get_recipe_manifest(recipes_dir: str) -> RecipeManifest:
+    """Returns the shared manifest for a saved_recipes directory."""
+    key = os.path.abspath(recipes_dir)
+    with _manifests_lock:
+        manifest = _manifests.get(key)
+        if manifest is None:
+            manifest = _manifests[key] = RecipeManifest(recipes_dir)
+        return manifest
+
+
+if __name__ == "__main__":
+    import sys
+    import time
+    import shutil
+    import tempfile
+    from recipe_extractor import Recipe
+
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 3000
+    recipes_dir = tempfile.mkdtemp(prefix="manifest-bench-")
+    try:
+        for folder_index in range(5):
+            folder_path = os.path.join(recipes_dir, f"folder_{folder_index}")
+            os.makedirs(folder_path)
+            for index in range(folder_index, count, 5):
+                recipe = Recipe(id=f"recipe-{index}", name=f"Recipe {index}", serving_size="4 servings",
+                                ingredients=[f"{i} cups ingredient {i}" for i in range(12)],
+                                instructions=[f"Step {i}" for i in range(8)])
+                with open(os.path.join(folder_path, f"{recipe.id}.json"), 'w', encoding='utf-8') as f:
+                    json.dump(recipe.model_dump(), f)
+
+        def scan_all():
+            listed = []
+            for folder_id in os.listdir(recipes_dir):
+                folder_path = os.path.join(recipes_dir, folder_id)
+                if os.path.isdir(folder_path):
+                    for filename in os.listdir(folder_path):
+                        if filename.endswith('.json'):
+                            listed.append(_read_entry(folder_id, filename, os.path.join(folder_path, filename)))
+            return listed
+
+        manifest = RecipeManifest(recipes_dir)
+        timings = {}
+        for label, function in (("directory scan", scan_all), ("manifest build", manifest.rebuild),
+                                ("manifest listing", manifest.list_recipes)):
+            start = time.perf_counter()
+            function()
+            timings[label] = time.perf_counter() - start
+        assert len(manifest.list_recipes()) == count
+        for label, elapsed in timings.items():
+            print(f"{label}: {count} recipes in {elapsed * 1000:.1f} ms")
+    finally:
+        shutil.rmtree(recipes_dir)
@@ -0,0 +1,733 @@
+"""
+Recipe storage for MealMate.
+
+Every route that reads or writes a user's recipes and folders goes through a
+RecipeRepository, so where recipes live is a configuration choice:
+
+- FileRecipeRepository (RECIPE_STORAGE=files, the default) keeps the existing
+  layout: JSON files under user_data/<user>/saved_recipes/<folder>/, folders
+  in folders.json via FolderManager, listings served by the recipe manifest.
+- SqlRecipeRepository (RECIPE_STORAGE=database) keeps recipes and folders in
+  the app database (SavedRecipe / RecipeFolder in models.py), so any app node
+  can serve any user.
+
+`flask import-recipes` copies the file layout into the database. Running
+this module benchmarks list/get/search on both backends.
+
+Recipes are addressed by their ID (Recipe.id): the file is <id>.json and
+the database row has the same primary key, so an ID refers to the same
+recipe in both backends. The name-based methods remain for the existing
+routes and resolve to an ID first.
+"""
+
+import os
+import shutil
+import uuid
+from abc import ABC, abstractmethod
+from dataclasses import asdict, dataclass
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from folder_manager import Folder, FolderManager
+from recipe_cache import recipe_cache
+from recipe_extractor import Recipe, new_recipe_id, save_recipe_to_file
+from pantry_index import PantryIndex, pantry_indexes, recipe_ingredient_ids
+from recipe_manifest import get_recipe_manifest
+from recipe_search_index import bm25_scores, rank, recipe_term_frequencies, tokenize
+from recipe_vectors import get_recipe_vectors
+
+RECIPE_STORAGE = os.environ.get("RECIPE_STORAGE", "files")
+
+DEFAULT_FOLDER_ID = "uncategorized"
+DEFAULT_FOLDER_NAME = "Uncategorized"
+
+
+@dataclass
+class RecipeSummary:
+    """What recipe listings show."""
+    id: str
+    folder_id: str
+    name: str
+    serving_size: Optional[str]
+    ingredients_count: int
+    instructions_count: int
+
+    def to_dict(self) -> Dict:
+        return asdict(self)
+
+
+class RecipeRepository(ABC):
+    """A user's recipes and folders. Subclasses implement each operation for one storage backend."""
+
+    def __init__(self, user_id: str):
+        self.user_id = user_id
+
+    @abstractmethod
+    def list_folders(self) -> List[Folder]:
+        """All folders with their recipe counts; the Uncategorized folder always exists."""
+
+    @abstractmethod
+    def create_folder(self, name: str) -> Folder:
+        ...
+
+    @abstractmethod
+    def rename_folder(self, folder_id: str, new_name: str) -> bool:
+        ...
+
+    @abstractmethod
+    def delete_folder(self, folder_id: str) -> bool:
+        """Deletes a folder, moving its recipes to Uncategorized. Returns False for Uncategorized or unknown folders."""
+
+    @abstractmethod
+    def list_recipes(self, folder_id: Optional[str] = None) -> List[RecipeSummary]:
+        ...
+
+    @abstractmethod
+    def get_recipe(self, folder_id: str, name: str) -> Optional[Recipe]:
+        ...
+
+    @abstractmethod
+    def get_recipe_by_id(self, recipe_id: str) -> Optional[Tuple[str, Recipe]]:
+        """Returns (folder_id, recipe) for a recipe ID, or None."""
+
+    @abstractmethod
+    def load_recipes(self, names: List[str]) -> Tuple[Dict[str, Recipe], Dict[str, str]]:
+        """Loads the named recipes from any folder. Returns ({name: Recipe}, {name: recipe ID}); missing names are left out."""
+
+    @abstractmethod
+    def iter_recipes(self) -> Iterator[Recipe]:
+        """Every saved recipe."""
+
+    @abstractmethod
+    def search(self, query: str, limit: int, min_score: float = 0.0,
+               after: Optional[Tuple[float, str]] = None) -> List[Tuple[str, float]]:
+        """
+        Recipe IDs ranked by BM25 for the query, best first, with their scores.
+        min_score and after (a page cursor) are as in recipe_search_index.rank.
+        """
+
+    @abstractmethod
+    def get_summaries(self, recipe_ids: List[str]) -> Dict[str, RecipeSummary]:
+        """Listing fields for the given recipe IDs; unknown IDs are left out."""
+
+    @abstractmethod
+    def pantry_index(self) -> PantryIndex:
+        """Ingredient bitsets of all the user's recipes, for ranking them against a pantry (see pantry_index.py)."""
+
+    @abstractmethod
+    def index_version(self):
+        """A value that changes whenever a recipe is added, changed, moved or removed, for derived indexes to compare."""
+
+    @abstractmethod
+    def recipe_stamps(self) -> Dict[str, str]:
+        """Recipe ID -> a stamp that changes whenever that recipe is saved again."""
+
+    def semantic_search(self, query: str, limit: int, min_score: float = 0.0,
+                        after: Optional[Tuple[float, str]] = None) -> List[Tuple[str, float]]:
+        """
+        Recipe IDs ranked by vector similarity to the query (see recipe_vectors.py),
+        best first, with their scores. Arguments are as for search.
+        """
+        vectors = get_recipe_vectors(f"user_data/{self.user_id}/recipe_vectors")
+        vectors.sync(self)
+        return vectors.search(query, limit, min_score, after)
+
+    @abstractmethod
+    def save_recipe(self, recipe: Recipe, folder_id: str = DEFAULT_FOLDER_ID, enrich: bool = True) -> str:
+        """
+        Saves a recipe into a folder and returns its ID. A recipe without an ID is
+        stored as a new recipe (and given one); a recipe with an ID replaces the
+        stored copy, moving it if the folder differs.
+        """
+
+    @abstractmethod
+    def delete_recipe(self, folder_id: str, name: str) -> bool:
+        ...
+
+    @abstractmethod
+    def delete_recipe_by_id(self, recipe_id: str) -> bool:
+        ...
+
+    @abstractmethod
+    def move_recipe(self, name: str, source_folder: str, target_folder: str) -> bool:
+        ...
+
+    @abstractmethod
+    def move_recipe_by_id(self, recipe_id: str, target_folder: str) -> bool:
+        ...
+
+    @abstractmethod
+    def schedule_enrichment(self, recipe_id: str):
+        """Queues background ingredient parsing for a saved recipe (see recipe_enrichment.py)."""
+
+
+class FileRecipeRepository(RecipeRepository):
+    """Recipes as JSON files under user_data/<user>/saved_recipes/<folder>/."""
+
+    def __init__(self, user_id: str):
+        super().__init__(user_id)
+        self.recipes_dir = f"user_data/{user_id}/saved_recipes"
+        self.folder_manager = FolderManager(
+            folders_file=f"user_data/{user_id}/folders.json",
+            recipes_dir=self.recipes_dir)
+        self.manifest = get_recipe_manifest(self.recipes_dir)
+
+    def list_folders(self) -> List[Folder]:
+        counts = self.manifest.folder_counts()
+        return [folder.model_copy(update={'recipe_count': counts.get(folder.id, 0)})
+                for folder in self.folder_manager.get_all_folders()]
+
+    def create_folder(self, name: str) -> Folder:
+        return self.folder_manager.create_folder(name)
+
+    def rename_folder(self, folder_id: str, new_name: str) -> bool:
+        return self.folder_manager.rename_folder(folder_id, new_name)
+
+    def delete_folder(self, folder_id: str) -> bool:
+        return self.folder_manager.delete_folder(folder_id)
+
+    def list_recipes(self, folder_id: Optional[str] = None) -> List[RecipeSummary]:
+        return [RecipeSummary(entry.recipe_id, entry.folder_id, entry.name, entry.serving_size,
+                              entry.ingredients_count, entry.instructions_count)
+                for entry in self.manifest.list_recipes(folder_id)]
+
+    def _read(self, filepath: str, recipe_id: Optional[str] = None) -> Optional[Recipe]:
+        """
+        Loads a recipe file. recipe_id is the ID it is indexed under, which a file
+        saved before IDs existed doesn't hold yet (see recipe_manifest.py).
+        """
+        try:
+            recipe = recipe_cache.load(filepath, Recipe)
+        except Exception as e:
+            print(f"Error loading recipe from {filepath}: {e}")
+            return None
+        if recipe_id is not None and recipe.id != recipe_id:
+            # A copy: the loaded object is shared through the recipe cache
+            recipe = recipe.model_copy(update={'id': recipe_id})
+        return recipe
+
+    def get_recipe(self, folder_id: str, name: str) -> Optional[Recipe]:
+        for entry in self.manifest.find(name, folder_id):
+            recipe = self._read(self.manifest.filepath(entry), entry.recipe_id)
+            if recipe:
+                return recipe
+        return None
+
+    def get_recipe_by_id(self, recipe_id: str) -> Optional[Tuple[str, Recipe]]:
+        entry = self.manifest.get(recipe_id)
+        if entry is None:
+            return None
+        recipe = self._read(self.manifest.filepath(entry), entry.recipe_id)
+        return (entry.folder_id, recipe) if recipe else None
+
+    def load_recipes(self, names: List[str]) -> Tuple[Dict[str, Recipe], Dict[str, str]]:
+        wanted = set(names)
+        entries_by_name = {}
+        for entry in self.manifest.list_recipes():
+            if entry.name in wanted:
+                entries_by_name[entry.name] = entry
+
+        recipes = {}
+        recipe_ids = {}
+        for entry in entries_by_name.values():
+            recipe = self._read(self.manifest.filepath(entry), entry.recipe_id)
+            if recipe:
+                recipes[recipe.name] = recipe
+                recipe_ids[recipe.name] = entry.recipe_id
+        return recipes, recipe_ids
+
+    def iter_recipes(self) -> Iterator[Recipe]:
+        for entry in self.manifest.list_recipes():
+            recipe = self._read(self.manifest.filepath(entry), entry.recipe_id)
+            if recipe:
+                yield recipe
+
+    def search(self, query: str, limit: int, min_score: float = 0.0,
+               after: Optional[Tuple[float, str]] = None) -> List[Tuple[str, float]]:
+        return self.manifest.search(query, limit, min_score, after)
+
+    def get_summaries(self, recipe_ids: List[str]) -> Dict[str, RecipeSummary]:
+        return {recipe_id: RecipeSummary(entry.recipe_id, entry.folder_id, entry.name, entry.serving_size,
+                                         entry.ingredients_count, entry.instructions_count)
+                for recipe_id, entry in self.manifest.get_many(recipe_ids).items()}
+
+    def pantry_index(self) -> PantryIndex:
+        return self.manifest.pantry_index()
+
+    def index_version(self):
+        return self.manifest.generation()
+
+    def recipe_stamps(self) -> Dict[str, str]:
+        return self.manifest.stamps()
+
+    def save_recipe(self, recipe: Recipe, folder_id: str = DEFAULT_FOLDER_ID, enrich: bool = True) -> str:
+        os.makedirs(self.recipes_dir, exist_ok=True)
+        save_recipe_to_file(recipe, directory=self.recipes_dir, folder_id=folder_id, enrich=enrich)
+        return recipe.id
+
+    def delete_recipe(self, folder_id: str, name: str) -> bool:
+        matches = self.manifest.find(name, folder_id)
+        return bool(matches) and self.delete_recipe_by_id(matches[0].recipe_id)
+
+    def delete_recipe_by_id(self, recipe_id: str) -> bool:
+        entry = self.manifest.get(recipe_id)
+        if entry is None:
+            return False
+        filepath = self.manifest.filepath(entry)
+        os.remove(filepath)
+        recipe_cache.invalidate(filepath)
+        self.manifest.record_deleted(entry.folder_id, entry.filename)
+        return True
+
+    def move_recipe(self, name: str, source_folder: str, target_folder: str) -> bool:
+        matches = self.manifest.find(name, source_folder)
+        return bool(matches) and self.move_recipe_by_id(matches[0].recipe_id, target_folder)
+
+    def move_recipe_by_id(self, recipe_id: str, target_folder: str) -> bool:
+        entry = self.manifest.get(recipe_id)
+        if entry is None:
+            return False
+        if entry.folder_id == target_folder:
+            return True
+
+        target_dir = os.path.join(self.recipes_dir, target_folder)
+        os.makedirs(target_dir, exist_ok=True)
+        filename = entry.filename
+        if os.path.exists(os.path.join(target_dir, filename)):
+            # A file saved before IDs existed can share its name-based filename with
+            # a different recipe in the target folder; fall back to the ID name
+            filename = f"{recipe_id}.json"
+        shutil.move(self.manifest.filepath(entry), os.path.join(target_dir, filename))
+        if filename == entry.filename:
+            self.manifest.record_moved(filename, entry.folder_id, target_folder)
+        else:
+            self.manifest.record_deleted(entry.folder_id, entry.filename)
+            self.manifest.record_saved(target_folder, filename, self._read(os.path.join(target_dir, filename), recipe_id))
+        return True
+
+    def schedule_enrichment(self, recipe_id: str):
+        from recipe_enrichment import schedule_recipe_enrichment
+        entry = self.manifest.get(recipe_id)
+        if entry is None:
+            return None
+        return schedule_recipe_enrichment(self.manifest.filepath(entry))
+
+
+class SqlRecipeRepository(RecipeRepository):
+    """Recipes and folders as rows in the app database. Create it inside an app context."""
+
+    def __init__(self, user_id: str):
+        from flask import current_app
+        super().__init__(user_id)
+        # Kept for enrichment, which runs on a worker thread after the request has finished
+        self.app = current_app._get_current_object()
+
+    def _ensure_default_folder(self):
+        from database import db
+        from models import RecipeFolder
+        if not RecipeFolder.query.filter_by(user_id=self.user_id, folder_id=DEFAULT_FOLDER_ID).first():
+            db.session.add(RecipeFolder(user_id=self.user_id, folder_id=DEFAULT_FOLDER_ID, name=DEFAULT_FOLDER_NAME))
+            db.session.commit()
+
+    def list_folders(self) -> List[Folder]:
+        from database import db
+        from models import RecipeFolder, SavedRecipe
+        self._ensure_default_folder()
+        counts = dict(db.session.query(SavedRecipe.folder_id, db.func.count(SavedRecipe.id))
+                      .filter(SavedRecipe.user_id == self.user_id)
+                      .group_by(SavedRecipe.folder_id).all())
+        folders = RecipeFolder.query.filter_by(user_id=self.user_id).order_by(RecipeFolder.created_at).all()
+        return [Folder(id=folder.folder_id, name=folder.name, created_at=folder.created_at.isoformat(),
+                       recipe_count=counts.get(folder.folder_id, 0))
+                for folder in folders]
+
+    def create_folder(self, name: str) -> Folder:
+        import re
+        from database import db
+        from models import RecipeFolder
+        taken = {folder_id for (folder_id,) in db.session.query(RecipeFolder.folder_id)
+                 .filter(RecipeFolder.user_id == self.user_id)}
+        # Same ID scheme as FolderManager._generate_folder_id
+        base_id = re.sub(r'[^a-z0-9]', '_', name.lower())
+        folder_id = base_id
+        counter = 1
+        while folder_id in taken:
+            folder_id = f"{base_id}_{counter}"
+            counter += 1
+
+        folder = RecipeFolder(user_id=self.user_id, folder_id=folder_id, name=name)
+        db.session.add(folder)
+        db.session.commit()
+        return Folder(id=folder.folder_id, name=folder.name, created_at=folder.created_at.isoformat())
+
+    def rename_folder(self, folder_id: str, new_name: str) -> bool:
+        from database import db
+        from models import RecipeFolder
+        folder = RecipeFolder.query.filter_by(user_id=self.user_id, folder_id=folder_id).first()
+        if not folder:
+            return False
+        folder.name = new_name
+        db.session.commit()
+        return True
+
+    def delete_folder(self, folder_id: str) -> bool:
+        from database import db
+        from models import RecipeFolder, SavedRecipe
+        if folder_id == DEFAULT_FOLDER_ID:
+            return False  # Cannot delete default folder
+        folder = RecipeFolder.query.filter_by(user_id=self.user_id, folder_id=folder_id).first()
+        if not folder:
+            return False
+
+        self._ensure_default_folder()
+        SavedRecipe.query.filter_by(user_id=self.user_id, folder_id=folder_id) \
+            .update({SavedRecipe.folder_id: DEFAULT_FOLDER_ID})
+        db.session.delete(folder)
+        db.session.commit()
+        return True
+
+    def list_recipes(self, folder_id: Optional[str] = None) -> List[RecipeSummary]:
+        from database import db
+        from models import SavedRecipe
+        query = db.session.query(SavedRecipe.id, SavedRecipe.folder_id, SavedRecipe.name, SavedRecipe.serving_size,
+                                 SavedRecipe.ingredients_count, SavedRecipe.instructions_count) \
+            .filter(SavedRecipe.user_id == self.user_id)
+        if folder_id is not None:
+            query = query.filter(SavedRecipe.folder_id == folder_id)
+        return [RecipeSummary(*row) for row in query.order_by(SavedRecipe.folder_id, SavedRecipe.name)]
+
+    @staticmethod
+    def _to_recipe(record) -> Recipe:
+        return Recipe(id=record.id, name=record.name, serving_size=record.serving_size,
+                      ingredients=record.ingredients, instructions=record.instructions,
+                      structured_ingredients=record.structured_ingredients,
+                      structured_ingredients_version=record.structured_ingredients_version)
+
+    def get_recipe(self, folder_id: str, name: str) -> Optional[Recipe]:
+        from models import SavedRecipe
+        record = SavedRecipe.query.filter_by(user_id=self.user_id, folder_id=folder_id, name=name).first()
+        return self._to_recipe(record) if record else None
+
+    def _get_record(self, recipe_id: str):
+        from database import db
+        from models import SavedRecipe
+        record = db.session.get(SavedRecipe, recipe_id)
+        return record if record is not None and record.user_id == self.user_id else None
+
+    def get_recipe_by_id(self, recipe_id: str) -> Optional[Tuple[str, Recipe]]:
+        record = self._get_record(recipe_id)
+        return (record.folder_id, self._to_recipe(record)) if record else None
+
+    def load_recipes(self, names: List[str]) -> Tuple[Dict[str, Recipe], Dict[str, str]]:
+        from models import SavedRecipe
+        if not names:
+            return {}, {}
+        records = SavedRecipe.query.filter(SavedRecipe.user_id == self.user_id,
+                                           SavedRecipe.name.in_(set(names))) \
+            .order_by(SavedRecipe.folder_id, SavedRecipe.created_at).all()
+        recipes = {record.name: self._to_recipe(record) for record in records}
+        keys = {record.name: record.id for record in records}
+        return recipes, keys
+
+    def iter_recipes(self) -> Iterator[Recipe]:
+        from models import SavedRecipe
+        for record in SavedRecipe.query.filter_by(user_id=self.user_id).yield_per(500):
+            yield self._to_recipe(record)
+
+    def save_recipe(self, recipe: Recipe, folder_id: str = DEFAULT_FOLDER_ID, enrich: bool = True) -> str:
+        from database import db
+        from models import RecipeFolder, SavedRecipe
+        if folder_id != DEFAULT_FOLDER_ID and not RecipeFolder.query.filter_by(
+                user_id=self.user_id, folder_id=folder_id).first():
+            # Saving into a folder that doesn't exist yet creates it, as with directories
+            db.session.add(RecipeFolder(user_id=self.user_id, folder_id=folder_id, name=folder_id))
+
+        record = self._get_record(recipe.id) if recipe.id else None
+        if record is None and recipe.id and db.session.get(SavedRecipe, recipe.id) is not None:
+            recipe.id = None  # The ID belongs to another user's recipe; save this one as new
+        record = self._apply(recipe, folder_id, record)
+        recipe.id = record.id
+        self._index_terms([(record, recipe)])
+        db.session.commit()
+        print(f"Recipe '{recipe.name}' saved to database ({folder_id})")
+
+        if enrich:
+            self.schedule_enrichment(record.id)
+        return record.id
+
+    def _apply(self, recipe: Recipe, folder_id: str, record=None):
+        """Copies a recipe onto its row (a new one if record is None) without committing."""
+        from database import db
+        from models import SavedRecipe
+        if record is None:
+            record = SavedRecipe(id=recipe.id or new_recipe_id(), user_id=self.user_id)
+            db.session.add(record)
+        record.folder_id = folder_id
+        record.name = recipe.name
+        record.serving_size = recipe.serving_size
+        record.ingredients = list(recipe.ingredients)
+        record.instructions = list(recipe.instructions)
+        record.structured_ingredients = recipe.structured_ingredients
+        record.structured_ingredients_version = recipe.structured_ingredients_version
+        record.ingredients_count = len(recipe.ingredients)
+        record.instructions_count = len(recipe.instructions)
+        record.ingredient_ids = recipe_ingredient_ids(recipe)
+        return record
+
+    def _index_terms(self, saved: List[Tuple[object, Recipe]]):
+        """Replaces the search postings of (row, recipe) pairs without committing."""
+        from database import db
+        from models import RecipeSearchTerm
+        # Rows must exist before their postings reference them
+        db.session.flush()
+        recipe_ids = [record.id for record, _ in saved]
+        for start in range(0, len(recipe_ids), 500):
+            RecipeSearchTerm.query.filter(RecipeSearchTerm.recipe_id.in_(recipe_ids[start:start + 500])) \
+                .delete(synchronize_session=False)
+
+        postings = []
+        for record, recipe in saved:
+            terms = recipe_term_frequencies(recipe)
+            record.term_count = sum(terms.values())
+            postings.extend({'recipe_id': record.id, 'term': term, 'user_id': self.user_id, 'tf': frequency,
+                             'length': record.term_count}
+                            for term, frequency in terms.items())
+        if postings:
+            db.session.execute(RecipeSearchTerm.__table__.insert(), postings)
+
+    def rebuild_search_index(self) -> int:
+        """Recomputes the search postings and ingredient IDs of all the user's recipes. Returns how many were indexed."""
+        from database import db
+        from models import SavedRecipe
+        records = SavedRecipe.query.filter_by(user_id=self.user_id).all()
+        saved = [(record, self._to_recipe(record)) for record in records]
+        for record, recipe in saved:
+            record.ingredient_ids = recipe_ingredient_ids(recipe)
+        self._index_terms(saved)
+        db.session.commit()
+        return len(records)
+
+    def search(self, query: str, limit: int, min_score: float = 0.0,
+               after: Optional[Tuple[float, str]] = None) -> List[Tuple[str, float]]:
+        from database import db
+        from models import RecipeSearchTerm, SavedRecipe
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return []
+        recipe_count, term_count = db.session.query(
+            db.func.count(SavedRecipe.id), db.func.coalesce(db.func.sum(SavedRecipe.term_count), 0)) \
+            .filter(SavedRecipe.user_id == self.user_id).one()
+        postings = db.session.query(RecipeSearchTerm.term, RecipeSearchTerm.recipe_id, RecipeSearchTerm.tf,
+                                    RecipeSearchTerm.length) \
+            .filter(RecipeSearchTerm.user_id == self.user_id, RecipeSearchTerm.term.in_(terms)).all()
+        average_length = term_count / recipe_count if recipe_count else 0.0
+        return rank(bm25_scores(postings, recipe_count, average_length), limit, min_score, after)
+
+    def get_summaries(self, recipe_ids: List[str]) -> Dict[str, RecipeSummary]:
+        from database import db
+        from models import SavedRecipe
+        if not recipe_ids:
+            return {}
+        rows = db.session.query(SavedRecipe.id, SavedRecipe.folder_id, SavedRecipe.name, SavedRecipe.serving_size,
+                                SavedRecipe.ingredients_count, SavedRecipe.instructions_count) \
+            .filter(SavedRecipe.user_id == self.user_id, SavedRecipe.id.in_(recipe_ids))
+        return {row[0]: RecipeSummary(*row) for row in rows}
+
+    def index_version(self):
+        from database import db
+        from models import SavedRecipe
+        # Saving, editing or deleting a recipe changes the count or the latest update
+        return tuple(db.session.query(db.func.count(SavedRecipe.id), db.func.max(SavedRecipe.updated_at))
+                     .filter(SavedRecipe.user_id == self.user_id).one())
+
+    def recipe_stamps(self) -> Dict[str, str]:
+        from database import db
+        from models import SavedRecipe
+        rows = db.session.query(SavedRecipe.id, SavedRecipe.updated_at).filter(SavedRecipe.user_id == self.user_id)
+        return {recipe_id: str(updated_at) for recipe_id, updated_at in rows}
+
+    def pantry_index(self) -> PantryIndex:
+        from database import db
+        from models import SavedRecipe
+        version = self.index_version()
+
+        def load():
+            rows = db.session.query(SavedRecipe.id, SavedRecipe.ingredient_ids) \
+                .filter(SavedRecipe.user_id == self.user_id)
+            return [(recipe_id, ingredient_ids or []) for recipe_id, ingredient_ids in rows]
+
+        return pantry_indexes.get(('database', self.user_id), version, load)
+
+    def delete_recipe(self, folder_id: str, name: str) -> bool:
+        from models import SavedRecipe
+        record = SavedRecipe.query.filter_by(user_id=self.user_id, folder_id=folder_id, name=name).first()
+        return record is not None and self.delete_recipe_by_id(record.id)
+
+    def delete_recipe_by_id(self, recipe_id: str) -> bool:
+        from database import db
+        from models import RecipeSearchTerm
+        record = self._get_record(recipe_id)
+        if record is None:
+            return False
+        RecipeSearchTerm.query.filter_by(recipe_id=record.id).delete()
+        db.session.delete(record)
+        db.session.commit()
+        return True
+
+    def move_recipe(self, name: str, source_folder: str, target_folder: str) -> bool:
+        from models import SavedRecipe
+        record = SavedRecipe.query.filter_by(user_id=self.user_id, folder_id=source_folder, name=name).first()
+        return record is not None and self.move_recipe_by_id(record.id, target_folder)
+
+    def move_recipe_by_id(self, recipe_id: str, target_folder: str) -> bool:
+        from database import db
+        from models import RecipeFolder
+        record = self._get_record(recipe_id)
+        if record is None:
+            return False
+        if target_folder != DEFAULT_FOLDER_ID and not RecipeFolder.query.filter_by(
+                user_id=self.user_id, folder_id=target_folder).first():
+            db.session.add(RecipeFolder(user_id=self.user_id, folder_id=target_folder, name=target_folder))
+        record.folder_id = target_folder
+        db.session.commit()
+        return True
+
+    def schedule_enrichment(self, recipe_id: str):
+        from recipe_enrichment import _enrichment_executor
+        return _enrichment_executor.submit(_enrich_recipe_record, self.app, recipe_id)
+
+
+def _enrich_recipe_record(app, record_id: str) -> bool:
+    """Parses a stored recipe's ingredients and saves them on its row. Returns True if it was updated."""
+    from database import db
+    from models import SavedRecipe
+    from recipe_enrichment import STRUCTURED_INGREDIENTS_VERSION, enrich_recipe_data
+
+    with app.app_context():
+        record = db.session.get(SavedRecipe, record_id)
+        if record is None:
+            return False
+        if (record.structured_ingredients_version == STRUCTURED_INGREDIENTS_VERSION
+                and len(record.structured_ingredients or []) == len(record.ingredients)):
+            return False
+
+        ingredients = list(record.ingredients)
+        data = enrich_recipe_data({'ingredients': ingredients})
+
+        # Give up if the ingredients were edited while parsing ran
+        db.session.refresh(record)
+        if list(record.ingredients) != ingredients:
+            return False
+        record.structured_ingredients = data['structured_ingredients']
+        record.structured_ingredients_version = data['structured_ingredients_version']
+        record.ingredient_ids = recipe_ingredient_ids(SqlRecipeRepository._to_recipe(record))
+        db.session.commit()
+        print(f"Stored parsed ingredients for recipe {record_id}")
+        return True
+
+
+def get_recipe_repository(user_id: str, storage: Optional[str] = None) -> RecipeRepository:
+    """The repository for a user's recipes, using RECIPE_STORAGE unless storage is given."""
+    storage = storage or RECIPE_STORAGE
+    if storage == "files":
+        return FileRecipeRepository(user_id)
+    if storage == "database":
+        return SqlRecipeRepository(user_id)
+    raise ValueError(f"Unknown RECIPE_STORAGE: {storage!r} (expected 'files' or 'database')")
+
+
+def import_recipes_to_database(user_id: str) -> Tuple[int, int]:
+    """
+    Copies a user's folders and recipe files into the database. Safe to re-run:
+    existing rows are updated in place. Returns (folders imported, recipes imported).
+    """
+    source = FileRecipeRepository(user_id)
+    target = SqlRecipeRepository(user_id)
+    from database import db
+    from models import RecipeFolder, SavedRecipe
+
+    folders = source.list_folders()
+    for folder in folders:
+        record = RecipeFolder.query.filter_by(user_id=user_id, folder_id=folder.id).first()
+        if record is None:
+            from datetime import datetime
+            db.session.add(RecipeFolder(user_id=user_id, folder_id=folder.id, name=folder.name,
+                                        created_at=datetime.fromisoformat(folder.created_at)))
+        else:
+            record.name = folder.name
+    db.session.commit()
+
+    # One transaction for all recipes; rows already imported (same ID) are updated in place
+    existing = {record.id: record for record in SavedRecipe.query.filter_by(user_id=user_id)}
+    saved = {}
+    for entry in source.manifest.list_recipes():
+        recipe = source._read(source.manifest.filepath(entry), entry.recipe_id)
+        if recipe:
+            if recipe.id not in existing and db.session.get(SavedRecipe, recipe.id) is not None:
+                # The ID belongs to another user's recipe (e.g. a copied file). Derive a new
+                # one from it, so re-running the import updates the same row
+                recipe = recipe.model_copy(update={'id': str(uuid.uuid5(uuid.NAMESPACE_URL, f"{user_id}/{recipe.id}"))})
+            existing[recipe.id] = target._apply(recipe, entry.folder_id, existing.get(recipe.id))
+            saved[recipe.id] = (existing[recipe.id], recipe)
+    target._index_terms(list(saved.values()))
+    db.session.commit()
+    return len(folders), len(saved)
+
+
+if __name__ == "__main__":
+    import sys
+    import time
+    import tempfile
+    from flask import Flask
+    from database import db
+    from models import User
+    from smart_recipe_search import search_local_recipes
+
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    workdir = tempfile.mkdtemp(prefix="recipe-repository-bench-")
+    os.chdir(workdir)
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{workdir}/bench.db"
+    db.init_app(app)
+
+    words = ['chicken', 'garlic', 'lemon', 'pasta', 'tomato', 'basil', 'rice', 'beans', 'curry', 'salmon']
+    try:
+        with app.app_context():
+            db.create_all()
+            db.session.add(User(id='bench', email='bench@example.com'))
+            db.session.commit()
+
+            files = FileRecipeRepository('bench')
+            for index in range(count):
+                save_recipe_to_file(
+                    Recipe(name=f"{words[index % 10].title()} {words[index * 7 % 10]} {index}", serving_size="4",
+                           ingredients=[f"{i + 1} cups {words[(index + i) % 10]}" for i in range(10)],
+                           instructions=[f"Step {i + 1}" for i in range(6)]),
+                    directory=files.recipes_dir, folder_id=f"folder_{index % 5}", enrich=False)
+            start = time.perf_counter()
+            print(f"import: {import_recipes_to_database('bench')[1]} recipes in "
+                  f"{(time.perf_counter() - start) * 1000:.0f} ms")
+
+            names = [f"{words[index % 10].title()} {words[index * 7 % 10]} {index}" for index in range(0, count, count // 50)]
+            recipe_ids = [summary.id for summary in files.list_recipes()][::count // 50]
+            for storage in ("files", "database"):
+                repository = get_recipe_repository('bench', storage)
+                timings = {}
+                start = time.perf_counter()
+                listed = repository.list_recipes()
+                timings['list'] = time.perf_counter() - start
+                start = time.perf_counter()
+                for name in names:
+                    index = int(name.rsplit(' ', 1)[1])
+                    assert repository.get_recipe(f"folder_{index % 5}", name) is not None
+                timings['get'] = (time.perf_counter() - start) / len(names)
+                start = time.perf_counter()
+                for recipe_id in recipe_ids:
+                    assert repository.get_recipe_by_id(recipe_id) is not None
+                timings['get by id'] = (time.perf_counter() - start) / len(recipe_ids)
+                start = time.perf_counter()
+                search_local_recipes("garlic lemon pasta", 'bench', repository=repository)
+                timings['search'] = time.perf_counter() - start
+                assert len(listed) == count
+                print(f"{storage:>8}: " + ", ".join(f"{label} {elapsed * 1000:.2f} ms" for label, elapsed in timings.items()))
+    finally:
+        shutil.rmtree(workdir)
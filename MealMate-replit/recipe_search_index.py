@@ -0,0 +1,204 @@
+"""
+Full-text ranking for saved recipe search.
+
+Each saved recipe is indexed as term frequencies over its name, ingredients
+and instructions. The storage backends keep these as postings (term ->
+recipe ID, frequency) next to the recipes: the recipe manifest for files,
+the recipe_search_terms table for the database. A query only reads the
+postings of its own terms and ranks them with BM25, instead of scanning the
+text of every recipe.
+
+Tokens are whole words, lowercased and singularized like ingredient names
+("eggs" -> "egg"), so "egg" no longer matches "eggplant". Words in the
+recipe name count NAME_WEIGHT times.
+
+Results are ordered by score, then recipe ID, and paged with a cursor that
+holds the last hit's (score, ID), so fetching the next page never re-ranks
+or skips hits, and only the requested page is ever selected from the scores.
+"""
+
+import re
+import json
+import math
+import heapq
+import base64
+from collections import Counter
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from ingredient_canonical import singularize
+
+# Bump when tokenization or weighting changes; file indexes are then rebuilt
+# from the recipes, and `flask rebuild-recipe-search` redoes database ones
+SEARCH_INDEX_VERSION = 1
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+NAME_WEIGHT = 3
+
+STOPWORDS = frozenset({
+    'a', 'an', 'and', 'or', 'the', 'of', 'to', 'in', 'on', 'at', 'for', 'with', 'into', 'from', 'by',
+    'until', 'about', 'it', 'is', 'be', 'i', 'me', 'my', 'some', 'recipe', 'recipes',
+})
+
+_WORD_RE = re.compile(r"[^\W_]+")
+
+
+@lru_cache(maxsize=65536)
+def _normalize_token(word: str) -> str:
+    return singularize(word)
+
+
+def tokenize(text: str) -> List[str]:
+    """Words of a text as index terms: lowercased, singularized, stopwords dropped."""
+    return [_normalize_token(word) for word in _WORD_RE.findall(text.lower()) if word not in STOPWORDS]
+
+
+def recipe_term_frequencies(recipe) -> Dict[str, int]:
+    """Term frequencies for a recipe's name, ingredients and instructions."""
+    counts = Counter(tokenize(' '.join(recipe.ingredients)))
+    counts.update(tokenize(' '.join(recipe.instructions)))
+    for term in tokenize(recipe.name):
+        counts[term] += NAME_WEIGHT
+    return dict(counts)
+
+
+def bm25_scores(postings: Iterable[Tuple[str, str, int, int]], doc_count: int,
+                average_length: float) -> Dict[str, float]:
+    """
+    BM25 score per recipe ID. postings holds (term, recipe_id, frequency, recipe
+    length) for every recipe containing a query term, and only for those terms;
+    doc_count and average_length describe all of the user's recipes.
+    """
+    postings = list(postings)
+    idf = {term: math.log(1 + (doc_count - matches + 0.5) / (matches + 0.5))
+           for term, matches in Counter(term for term, _, _, _ in postings).items()}
+
+    scores: Dict[str, float] = {}
+    base_norm = BM25_K1 * (1 - BM25_B)
+    length_norm = BM25_K1 * BM25_B / (average_length or 1.0)
+    for term, recipe_id, frequency, length in postings:
+        scores[recipe_id] = (scores.get(recipe_id, 0.0)
+                             + idf[term] * frequency * (BM25_K1 + 1) / (frequency + base_norm + length_norm * length))
+    return scores
+
+
+def rank(scores: Dict[str, float], limit: int, min_score: float = 0.0,
+         after: Optional[Tuple[float, str]] = None) -> List[Tuple[str, float]]:
+    """
+    The best (recipe_id, score) pairs scoring at least min_score, highest score
+    first. after, the (score, recipe_id) of the last hit on the previous page,
+    skips everything up to and including it. Selects with a heap, in
+    O(n log limit) rather than sorting every match.
+    """
+    candidates = iter(scores.items())
+    if min_score > 0:
+        candidates = ((recipe_id, score) for recipe_id, score in candidates if score >= min_score)
+    if after is not None:
+        after_key = (-after[0], after[1])
+        candidates = ((recipe_id, score) for recipe_id, score in candidates if (-score, recipe_id) > after_key)
+    return heapq.nsmallest(limit, candidates, key=lambda item: (-item[1], item[0]))
+
+
+def encode_cursor(score: float, recipe_id: str) -> str:
+    """An opaque page cursor pointing just after the given hit."""
+    return base64.urlsafe_b64encode(json.dumps([score, recipe_id]).encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor: str) -> Tuple[float, str]:
+    """The (score, recipe_id) a cursor points after. Raises ValueError if it is malformed."""
+    try:
+        score, recipe_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return float(score), str(recipe_id)
+    except (ValueError, TypeError) as e:
+        raise ValueError("Invalid search cursor") from e
+
+
+if __name__ == "__main__":
+    import os
+    import sys
+    import time
+    import random
+    import shutil
+    import tempfile
+    from recipe_extractor import Recipe, save_recipe_to_file
+    from recipe_repository import FileRecipeRepository
+
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    # Ingredients drawn with Zipf-like frequencies, so common words ("salt") are in
+    # most recipes and rare ones in a few, as in a real collection
+    words = ('salt oil garlic onion butter pepper egg sugar flour water milk lemon chicken tomato cream '
+             'cheese rice ginger basil parsley beef pasta potato carrot honey vinegar cumin paprika thyme '
+             'rosemary cilantro lime bean spinach mushroom pork salmon shrimp tofu curry coconut chickpea '
+             'eggplant zucchini cabbage broccoli cauliflower lentil quinoa oat almond walnut yogurt mustard '
+             'cinnamon nutmeg chili scallion celery leek fennel kale beet radish avocado mango apple').split()
+    weights = [1 / (position + 1) for position in range(len(words))]
+    workdir = tempfile.mkdtemp(prefix="recipe-search-bench-")
+    os.chdir(workdir)
+    try:
+        repository = FileRecipeRepository('bench')
+        rng = random.Random(0)
+        for index in range(count):
+            picked = rng.choices(words, weights, k=10)
+            save_recipe_to_file(
+                Recipe(name=f"{picked[0].title()} {picked[1]} bowl {index}", serving_size="4",
+                       ingredients=[f"{i + 1} cups chopped {word}" for i, word in enumerate(picked)],
+                       instructions=[f"Cook the {word} gently for {i + 2} minutes" for i, word in enumerate(picked[:6])]),
+                directory=repository.recipes_dir, folder_id=f"folder_{index % 5}", enrich=False)
+        start = time.perf_counter()
+        repository.manifest.rebuild()
+        print(f"index build: {count} recipes in {(time.perf_counter() - start) * 1000:.0f} ms")
+
+        def linear_scan(query):
+            # What search_local_recipes did before the index: substring checks over every recipe
+            keywords = set(query.lower().split())
+            scores = {}
+            for recipe in repository.iter_recipes():
+                text = (recipe.name + ' ' + ' '.join(recipe.ingredients) + ' ' + ' '.join(recipe.instructions)).lower()
+                score = sum(1 for keyword in keywords if keyword in text)
+                if score:
+                    scores[recipe.id] = score / len(keywords)
+            return rank(scores, 5)
+
+        for query in ("salt", "egg", "garlic lemon pasta", "spinach tofu ginger curry", "eggplant"):
+            timings = {}
+            for label, search in (("linear scan", linear_scan), ("index", lambda q: repository.search(q, 5))):
+                search(query)
+                start = time.perf_counter()
+                for _ in range(5):
+                    search(query)
+                timings[label] = (time.perf_counter() - start) / 5
+            print(f"{query!r}: " + ", ".join(f"{label} {elapsed * 1000:.2f} ms" for label, elapsed in timings.items()))
+
+        # A broad query: full sort vs heap selection, and full bodies vs lightweight hits per page
+        from dataclasses import asdict
+        from smart_recipe_search import search_local_recipes, search_saved_recipes
+        scores = {f"recipe-{index}": (index * 7919 % 10007) / 100.0 for index in range(count)}
+        for label, select in (("sort", lambda: sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:20]),
+                              ("heap", lambda: rank(scores, 20))):
+            start = time.perf_counter()
+            for _ in range(20):
+                selected = select()
+            print(f"top 20 of {count} scores by {label}: {(time.perf_counter() - start) / 20 * 1000:.2f} ms")
+        assert selected == sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:20]
+        full = [asdict(recipe) for recipe in search_local_recipes("salt", 'bench', repository=repository)]
+        hits, _ = search_saved_recipes("salt", 'bench', limit=5, repository=repository)
+        print(f"'salt' page of 5: full bodies {len(json.dumps(full))} bytes, "
+              f"hits {len(json.dumps([asdict(hit) for hit in hits]))} bytes")
+
+        # Paging through every match returns each hit once, in rank order
+        paged, cursor = [], None
+        while True:
+            hits, cursor = search_saved_recipes("eggplant", 'bench', limit=7, cursor=cursor, repository=repository)
+            paged.extend((hit.id, hit.match_score) for hit in hits)
+            if cursor is None:
+                break
+        expected = repository.search("eggplant", count)
+        assert [recipe_id for recipe_id, _ in paged] == [recipe_id for recipe_id, _ in expected]
+
+        # "egg" must not match eggplant-only recipes
+        for recipe_id, _ in repository.search("egg", 50):
+            _, recipe = repository.get_recipe_by_id(recipe_id)
+            assert any('egg' in tokenize(line) for line in [recipe.name, *recipe.ingredients, *recipe.instructions])
+    finally:
+        shutil.rmtree(workdir)
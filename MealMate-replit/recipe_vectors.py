@@ -0,0 +1,397 @@
+"""
+Offline semantic search over saved recipes.
+
+BM25 (recipe_search_index.py) only matches whole words, so "soups" and
+"souper" or "chickpea" and "chick peas" never meet. Here every recipe is
+also a vector: its words and their character trigrams ("<so", "sou", "oup",
+"up>"), hashed into SEMANTIC_VECTOR_DIMENSIONS buckets and weighted 1 +
+log(tf). Rows are L2-normalized float32 in a memory-mapped matrix file per
+user, so a query is one matrix-vector product and a top-k selection, and
+nothing but the touched pages is read into memory.
+
+IDF weighting is applied to the query only (from per-bucket document counts),
+which makes the score a TF-IDF cosine without rows depending on each other:
+saving one recipe rewrites one row. The matrix is synced incrementally
+against the repository (see RecipeRepository.recipe_stamps): new and changed
+recipes are re-vectorized into their rows, deleted recipes free theirs.
+
+Row bookkeeping lives in a SQLite file next to the matrix, so several
+workers can share one index: syncs run in an IMMEDIATE transaction, and a
+worker reloads its view when another one has committed. For the database
+backend the files are a node-local copy rebuilt from the database as needed.
+
+NumPy is required, and it is not among the locked dependencies: in a default
+install numpy_available is False and semantic search is unavailable.
+"""
+
+import os
+import math
+import zlib
+import sqlite3
+import threading
+from collections import Counter
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import numpy as np
+    numpy_available = True
+except ImportError:
+    np = None
+    numpy_available = False
+
+from recipe_search_index import recipe_term_frequencies, tokenize
+
+SEMANTIC_VECTOR_DIMENSIONS = int(os.environ.get("SEMANTIC_VECTOR_DIMENSIONS", "512"))
+
+# Weight of a character trigram relative to its word
+CHAR_NGRAM_WEIGHT = 0.5
+
+# Bump when features or weighting change; existing matrices are then rebuilt
+VECTOR_FEATURES_VERSION = 1
+
+MATRIX_FILENAME = "vectors.f32"
+ROWS_FILENAME = "vectors.sqlite3"
+
+# Rows added to the matrix file at a time when it fills up
+_GROWTH_ROWS = 1024
+
+
+@lru_cache(maxsize=65536)
+def _term_buckets(term: str, dimensions: int) -> Tuple[Tuple[int, ...], Tuple[int, ...]]:
+    """Hash buckets of a term and of its character trigrams."""
+    padded = f"<{term}>"
+    trigrams = [padded[start:start + 3] for start in range(len(padded) - 2)] if len(term) > 1 else []
+    return ((zlib.crc32(f"w:{term}".encode('utf-8')) % dimensions,),
+            tuple(zlib.crc32(f"c:{trigram}".encode('utf-8')) % dimensions for trigram in trigrams))
+
+
+def term_vector(terms: Dict[str, float], dimensions: int = SEMANTIC_VECTOR_DIMENSIONS) -> "np.ndarray":
+    """Unnormalized hashed vector of term frequencies, weighted 1 + log(tf)."""
+    buckets: List[int] = []
+    weights: List[float] = []
+    for term, frequency in terms.items():
+        weight = 1.0 + math.log(frequency)
+        word_buckets, trigram_buckets = _term_buckets(term, dimensions)
+        buckets.extend(word_buckets)
+        weights.append(weight)
+        buckets.extend(trigram_buckets)
+        weights.extend([weight * CHAR_NGRAM_WEIGHT] * len(trigram_buckets))
+    vector = np.zeros(dimensions, dtype=np.float32)
+    np.add.at(vector, np.array(buckets, dtype=np.int64), np.array(weights, dtype=np.float32))
+    return vector
+
+
+def recipe_vector(recipe, dimensions: int = SEMANTIC_VECTOR_DIMENSIONS) -> "np.ndarray":
+    """A recipe's L2-normalized vector (all zeros for a recipe without words)."""
+    vector = term_vector(recipe_term_frequencies(recipe), dimensions)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class RecipeVectorIndex:
+    """Memory-mapped recipe vectors of one user, kept in step with their RecipeRepository."""
+
+    def __init__(self, directory: str, dimensions: int = SEMANTIC_VECTOR_DIMENSIONS):
+        self.directory = directory
+        self.dimensions = dimensions
+        self.matrix_path = os.path.join(directory, MATRIX_FILENAME)
+        self.rows_path = os.path.join(directory, ROWS_FILENAME)
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._data_version = None
+        self._synced_version = None
+        self._matrix = None
+        self._row_ids: List[Optional[str]] = []  # Row -> recipe ID, None for free rows
+        self._live = None  # Row -> whether it holds a recipe; free rows may hold leftovers
+        self._rows: Dict[str, int] = {}
+        self._stamps: Dict[str, str] = {}  # Recipe ID -> stamp it was vectorized at
+        self._document_counts = None  # Per bucket, rows with a non-zero weight there
+
+    def _connect(self) -> sqlite3.Connection:
+        """The index's connection (shared by threads under the lock), creating the files on first use."""
+        if self._conn is not None:
+            return self._conn
+        os.makedirs(self.directory, exist_ok=True)
+        conn = sqlite3.connect(self.rows_path, timeout=30, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        user_version = VECTOR_FEATURES_VERSION * 1_000_000 + self.dimensions
+        conn.execute("BEGIN IMMEDIATE")
+        if conn.execute("PRAGMA user_version").fetchone()[0] != user_version:
+            conn.execute("DROP TABLE IF EXISTS rows")
+            with open(self.matrix_path, 'wb'):
+                pass
+            conn.execute(f"PRAGMA user_version = {user_version}")
+        conn.execute("CREATE TABLE IF NOT EXISTS rows (recipe_id TEXT PRIMARY KEY, "
+                     "row INTEGER NOT NULL UNIQUE, stamp TEXT NOT NULL)")
+        conn.execute("COMMIT")
+        if not os.path.exists(self.matrix_path):
+            open(self.matrix_path, 'wb').close()
+        self._conn = conn
+        return conn
+
+    def _refresh(self, conn: sqlite3.Connection):
+        """Reloads rows and the matrix if another connection committed since the last load."""
+        (data_version,) = conn.execute("PRAGMA data_version").fetchone()
+        if data_version == self._data_version and self._matrix is not None:
+            return
+        self._rows, self._stamps = {}, {}
+        for recipe_id, row, stamp in conn.execute("SELECT recipe_id, row, stamp FROM rows"):
+            self._rows[recipe_id] = row
+            self._stamps[recipe_id] = stamp
+        used = max(self._rows.values(), default=-1) + 1
+        self._open_matrix(used)
+        self._row_ids = [None] * used
+        for recipe_id, row in self._rows.items():
+            self._row_ids[row] = recipe_id
+        self._live = np.zeros(len(self._matrix), dtype=bool)
+        self._live[list(self._rows.values())] = True
+        self._document_counts = np.zeros(self.dimensions, dtype=np.int64)
+        for start in range(0, used, 4096):
+            end = min(start + 4096, used)
+            block = self._matrix[start:end][self._live[start:end]]
+            self._document_counts += np.count_nonzero(block, axis=0)
+        self._data_version = data_version
+
+    def _open_matrix(self, rows_needed: int):
+        """Maps the matrix file, growing it (zero-filled) to hold at least rows_needed rows."""
+        row_bytes = self.dimensions * 4
+        capacity = os.path.getsize(self.matrix_path) // row_bytes
+        if capacity < rows_needed:
+            capacity = rows_needed + _GROWTH_ROWS
+            with open(self.matrix_path, 'r+b') as f:
+                f.truncate(capacity * row_bytes)
+        elif self._matrix is not None and len(self._matrix) == capacity:
+            return
+        self._matrix = (np.memmap(self.matrix_path, dtype=np.float32, mode='r+', shape=(capacity, self.dimensions))
+                        if capacity else np.zeros((0, self.dimensions), dtype=np.float32))
+        if self._live is not None and len(self._live) < capacity:
+            self._live = np.concatenate([self._live, np.zeros(capacity - len(self._live), dtype=bool)])
+
+    def sync(self, repository) -> int:
+        """
+        Re-vectorizes recipes added or changed since the last sync and frees the rows
+        of deleted ones. Costs one version check when nothing changed. Returns the
+        number of rows written.
+        """
+        version = repository.index_version()
+        with self._lock:
+            conn = self._connect()
+            self._refresh(conn)
+            if version == self._synced_version:
+                return 0
+
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._refresh(conn)  # Another worker may have synced while we waited
+                stamps = repository.recipe_stamps()
+                stale = {recipe_id for recipe_id, stamp in stamps.items() if self._stamps.get(recipe_id) != stamp}
+                removed = self._stamps.keys() - stamps.keys()
+
+                for recipe_id in removed:
+                    row = self._rows.pop(recipe_id)
+                    del self._stamps[recipe_id]
+                    self._document_counts -= self._matrix[row] > 0
+                    self._matrix[row] = 0
+                    self._row_ids[row] = None
+                    self._live[row] = False
+                conn.executemany("DELETE FROM rows WHERE recipe_id = ?", [(recipe_id,) for recipe_id in removed])
+
+                written = 0
+                if stale:
+                    # A few changes are loaded one by one; a (re)build reads every recipe once
+                    if len(stale) > 100:
+                        recipes = (recipe for recipe in repository.iter_recipes() if recipe.id in stale)
+                    else:
+                        recipes = (found[1] for found in map(repository.get_recipe_by_id, sorted(stale)) if found)
+                    free_rows = None
+                    for recipe in recipes:
+                        row = self._rows.get(recipe.id)
+                        if row is None:
+                            if free_rows is None:
+                                free_rows = [row for row, recipe_id in enumerate(self._row_ids) if recipe_id is None][::-1]
+                            row = free_rows.pop() if free_rows else len(self._row_ids)
+                            if row == len(self._row_ids):
+                                self._row_ids.append(None)
+                                self._open_matrix(len(self._row_ids))
+                        else:
+                            self._document_counts -= self._matrix[row] > 0
+                        vector = recipe_vector(recipe, self.dimensions)
+                        self._matrix[row] = vector
+                        self._document_counts += vector > 0
+                        self._rows[recipe.id] = row
+                        self._stamps[recipe.id] = stamps[recipe.id]
+                        self._row_ids[row] = recipe.id
+                        self._live[row] = True
+                        conn.execute("INSERT OR REPLACE INTO rows (recipe_id, row, stamp) VALUES (?, ?, ?)",
+                                     (recipe.id, row, stamps[recipe.id]))
+                        written += 1
+                if removed or written:
+                    self._matrix.flush()
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                self._matrix = None  # Rows may be half-written; reload on next use
+                self._data_version = None
+                raise
+            self._synced_version = version
+            return written
+
+    def search(self, query: str, limit: int, min_score: float = 0.0,
+               after: Optional[Tuple[float, str]] = None) -> List[Tuple[str, float]]:
+        """
+        Recipe IDs by cosine similarity to the query, best first, with their scores.
+        Only recipes scoring above zero (and at least min_score) are returned; after
+        is a page cursor as in recipe_search_index.rank.
+        """
+        terms = Counter(tokenize(query))
+        with self._lock:
+            if self._matrix is None or not terms:
+                return []
+            used = len(self._row_ids)
+            matrix = self._matrix[:used]
+            live = self._live[:used].copy()
+            row_ids = list(self._row_ids)
+            document_counts = self._document_counts.copy()
+            recipe_count = len(self._rows)
+
+        query_vector = term_vector(terms, self.dimensions)
+        query_vector *= (np.log((recipe_count + 1) / (document_counts + 1)) + 1).astype(np.float32)
+        norm = np.linalg.norm(query_vector)
+        if not norm or not used:
+            return []
+        scores = matrix @ (query_vector / norm)
+
+        candidates = np.flatnonzero((scores >= max(min_score, np.finfo(np.float32).tiny)) & live)
+        if after is not None:
+            after_score, after_id = after
+            candidates = np.array([row for row in candidates.tolist()
+                                   if scores[row] < after_score
+                                   or (scores[row] == after_score and row_ids[row] > after_id)], dtype=np.int64)
+        if len(candidates) > limit:
+            # Only rows at or above the limit-th best score can make the page
+            cut = len(candidates) - limit
+            threshold = np.partition(scores[candidates], cut)[cut]
+            candidates = candidates[scores[candidates] >= threshold]
+        ranked = sorted(((-float(scores[row]), row_ids[row]) for row in candidates.tolist()))
+        return [(recipe_id, -negative_score) for negative_score, recipe_id in ranked[:limit]]
+
+
+_indexes: Dict[str, RecipeVectorIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_recipe_vectors(directory: str) -> RecipeVectorIndex:
+    """Returns the shared vector index stored in a directory."""
+    key = os.path.abspath(directory)
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is None:
+            index = _indexes[key] = RecipeVectorIndex(directory)
+        return index
+
+
+if __name__ == "__main__":
+    import sys
+    import time
+    import random
+    import shutil
+    import tempfile
+    from recipe_extractor import Recipe
+
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    words = ('salt oil garlic onion butter pepper egg sugar flour water milk lemon chicken tomato cream '
+             'cheese rice ginger basil parsley beef pasta potato carrot honey vinegar cumin paprika thyme '
+             'rosemary cilantro lime bean spinach mushroom pork salmon shrimp tofu curry coconut chickpea '
+             'eggplant zucchini cabbage broccoli cauliflower lentil quinoa oat almond walnut yogurt mustard '
+             'cinnamon nutmeg chili scallion celery leek fennel kale beet radish avocado mango apple soup '
+             'stew roast salad bake grill simmer braise warm hearty spicy creamy crispy').split()
+    weights = [1 / (position + 1) for position in range(len(words))]
+
+    class MemorySource:
+        """Just what RecipeVectorIndex.sync needs from a repository, kept in memory."""
+
+        def __init__(self):
+            self.recipes, self.stamps, self.version = {}, {}, 0
+
+        def put(self, recipe):
+            self.recipes[recipe.id] = recipe
+            self.version += 1
+            self.stamps[recipe.id] = str(self.version)
+
+        def index_version(self):
+            return self.version
+
+        def recipe_stamps(self):
+            return dict(self.stamps)
+
+        def iter_recipes(self):
+            return iter(list(self.recipes.values()))
+
+        def get_recipe_by_id(self, recipe_id):
+            return ('bench', self.recipes[recipe_id]) if recipe_id in self.recipes else None
+
+    rng = random.Random(0)
+
+    def make_recipe(index):
+        picked = rng.choices(words, weights, k=10)
+        return Recipe(id=f"recipe-{index:06d}", name=f"{picked[0].title()} {picked[1]} {picked[-1]}", serving_size="4",
+                      ingredients=[f"{i + 1} cups chopped {word}" for i, word in enumerate(picked)],
+                      instructions=[f"Cook the {word} gently for {i + 2} minutes" for i, word in enumerate(picked[:6])])
+
+    source = MemorySource()
+    for index in range(count):
+        source.put(make_recipe(index))
+    source.put(Recipe(id="recipe-soup", name="Hearty chickpea soup", serving_size="4",
+                      ingredients=["2 cups chick peas", "1 onion", "4 cups stock"], instructions=["Simmer until soft"]))
+
+    directory = tempfile.mkdtemp(prefix="recipe-vectors-bench-")
+    try:
+        index = RecipeVectorIndex(directory)
+        start = time.perf_counter()
+        index.sync(source)
+        print(f"build: {count} recipes x {index.dimensions} dimensions in {time.perf_counter() - start:.1f} s, "
+              f"matrix file {os.path.getsize(index.matrix_path) / 1e6:.0f} MB")
+
+        queries = ["cozy soup for a cold day", "hearty chickpea soups", "spicy coconut curry with tofu",
+                   "lemon garlic salmon", "creamy mushroom pasta", "chocolate"]
+        latencies = []
+        for _ in range(20):
+            for query in queries:
+                start = time.perf_counter()
+                index.sync(source)
+                index.search(query, 10)
+                latencies.append(time.perf_counter() - start)
+        latencies.sort()
+        print(f"query (version check + search) at {count}: p50 {latencies[len(latencies) // 2] * 1000:.2f} ms, "
+              f"p99 {latencies[int(len(latencies) * 0.99)] * 1000:.2f} ms")
+        assert index.search("hearty chickpea soups", 1)[0][0] == "recipe-soup"
+
+        # Incremental: ten edits and a delete rewrite eleven rows, not the matrix
+        for recipe_index in range(10):
+            source.put(make_recipe(recipe_index))
+        del source.recipes["recipe-soup"], source.stamps["recipe-soup"]
+        source.version += 1
+        start = time.perf_counter()
+        written = index.sync(source)
+        print(f"incremental sync: {written} rows written in {(time.perf_counter() - start) * 1000:.1f} ms")
+        assert all(recipe_id != "recipe-soup" for recipe_id, _ in index.search("hearty chickpea soups", 20))
+
+        # Paging with cursors returns each hit once, in order
+        full = index.search("garlic lemon", 50)
+        paged, after = [], None
+        while len(paged) < 50:
+            page = index.search("garlic lemon", 7, after=after)
+            if not page:
+                break
+            paged.extend(page)
+            after = (page[-1][1], page[-1][0])
+        assert paged[:50] == full
+
+        # A fresh index on the same files (another worker) loads them instead of rebuilding
+        start = time.perf_counter()
+        other = RecipeVectorIndex(directory)
+        assert other.sync(source) == 0 and other.search("garlic lemon", 50) == full
+        print(f"load by another worker: {(time.perf_counter() - start) * 1000:.0f} ms")
+    finally:
+        shutil.rmtree(directory)
@@ -2,20 +2,15 @@ import os
 import json
 import glob
 import re
-from dotenv import load_dotenv
-from typing import List, Optional
-import google.generativeai as genai
+from typing import List, Optional, Tuple
 from dataclasses import dataclass, asdict
+from llm_client import llm_client
 
-# Load environment variables
-load_dotenv()
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-if not GEMINI_API_KEY:
-    raise RuntimeError("Please set your GEMINI_API_KEY in a .env file.")
+# Gemini calls go through llm_client
+GENERATION_MODEL_NAME = "gemini-2.0-flash"
 
-# Configure Gemini
-genai.configure(api_key=GEMINI_API_KEY)
-model = genai.GenerativeModel("gemini-2.0-flash")
+# Largest page of saved-recipe search hits returned at once
+MAX_SEARCH_PAGE_SIZE = 50
 
 @dataclass
 class SearchRecipe:
@@ -26,51 +21,99 @@ class SearchRecipe:
     url: str = ""
     match_score: float = 0.0
 
-def search_local_recipes(description: str, user_id: str) -> List[SearchRecipe]:
-    """Search through user's saved recipes."""
-    keywords = set(description.lower().split())
+@dataclass
+class SearchHit:
+    """A saved recipe matching a search, without its ingredients and instructions (fetch those by id)."""
+    id: str
+    folder_id: str
+    name: str
+    serving_size: Optional[str]
+    ingredients_count: int
+    instructions_count: int
+    match_score: float
+
+def search_saved_recipes(description: str, user_id: str, limit: int = 5, min_score: float = 0.0,
+                         cursor: Optional[str] = None, repository=None,
+                         semantic: bool = False) -> Tuple[List[SearchHit], Optional[str]]:
+    """
+    One page of the user's saved recipes matching a description, best BM25 matches
+    first, or most similar first if semantic (see recipe_vectors.py). Returns
+    (hits, next_cursor); pass next_cursor back for the following page, it is None
+    on the last one. Raises ValueError for a malformed cursor, or for semantic
+    search without NumPy.
+    """
+    from recipe_repository import get_recipe_repository
+    from recipe_search_index import decode_cursor, encode_cursor
+    from recipe_vectors import numpy_available
+
+    if semantic and not numpy_available:
+        raise ValueError("Semantic search is not available (NumPy is not installed)")
+    limit = max(1, min(limit, MAX_SEARCH_PAGE_SIZE))
+    after = decode_cursor(cursor) if cursor else None
+    repository = repository or get_recipe_repository(user_id)
+
+    # One extra hit tells whether there is another page
+    search = repository.semantic_search if semantic else repository.search
+    ranked = search(description, limit + 1, min_score=min_score, after=after)
+    page = ranked[:limit]
+    summaries = repository.get_summaries([recipe_id for recipe_id, _ in page])
+    hits = [SearchHit(**asdict(summaries[recipe_id]), match_score=round(score, 4))
+            for recipe_id, score in page if recipe_id in summaries]
+    next_cursor = encode_cursor(page[-1][1], page[-1][0]) if len(ranked) > limit else None
+    return hits, next_cursor
+
+@dataclass
+class PantryHit:
+    """A saved recipe ranked by how much of it can be cooked from on-hand ingredients."""
+    id: str
+    folder_id: str
+    name: str
+    serving_size: Optional[str]
+    ingredients_count: int
+    instructions_count: int
+    coverage: float
+    missing_count: int
+    missing: List[str]
+
+def search_by_pantry(ingredients: List[str], user_id: str, limit: int = 5, min_coverage: float = 0.0,
+                     repository=None) -> List[PantryHit]:
+    """
+    The user's saved recipes that best use the given on-hand ingredients (names or
+    lines, e.g. 'eggs', '2 cups rice'): highest share of the recipe's ingredients
+    on hand first, then fewest missing (see pantry_index.py).
+    """
+    from recipe_repository import get_recipe_repository
+    from pantry_index import ingredient_id
+
+    limit = max(1, min(limit, MAX_SEARCH_PAGE_SIZE))
+    repository = repository or get_recipe_repository(user_id)
+    pantry = {found for found in map(ingredient_id, ingredients) if found}
+    matches = repository.pantry_index().rank(pantry, limit, min_coverage)
+    summaries = repository.get_summaries([match.recipe_id for match in matches])
+    return [PantryHit(**asdict(summaries[match.recipe_id]), coverage=round(match.coverage, 4),
+                      missing_count=match.missing_count, missing=match.missing)
+            for match in matches if match.recipe_id in summaries]
+
+def search_local_recipes(description: str, user_id: str, repository=None) -> List[SearchRecipe]:
+    """Search through user's saved recipes, best BM25 matches first (see recipe_search_index.py)."""
+    from recipe_repository import get_recipe_repository
+
     matches = []
-    
-    # Search in user-specific directory structure
-    user_recipe_dir = f"user_data/{user_id}/saved_recipes"
-    if not os.path.exists(user_recipe_dir):
-        return []
-    
-    # Search through all folders
-    for root, dirs, files in os.walk(user_recipe_dir):
-        for filename in files:
-            if filename.endswith('.json'):
-                filepath = os.path.join(root, filename)
-                try:
-                    with open(filepath, 'r', encoding='utf-8') as f:
-                        data = json.load(f)
-                        recipe = SearchRecipe(
-                            name=data.get('name', ''),
-                            ingredients=data.get('ingredients', []),
-                            instructions=data.get('instructions', []),
-                            serving_size=data.get('serving_size', ''),
-                            url=data.get('url', '')
-                        )
-                        
-                        # Calculate match score
-                        combined_text = (
-                            recipe.name + ' ' + 
-                            ' '.join(recipe.ingredients) + ' ' + 
-                            ' '.join(recipe.instructions)
-                        ).lower()
-                        
-                        score = sum(1 for kw in keywords if kw in combined_text)
-                        if score > 0:
-                            recipe.match_score = score / len(keywords)
-                            matches.append(recipe)
-                            
-                except Exception as e:
-                    print(f"Error reading recipe file {filepath}: {e}")
-                    continue
-    
-    # Sort by match score and return top 5
-    matches.sort(key=lambda x: x.match_score, reverse=True)
-    return matches[:5]
+    repository = repository or get_recipe_repository(user_id)
+    # Only the top 5 hits are loaded
+    for recipe_id, score in repository.search(description, 5):
+        found = repository.get_recipe_by_id(recipe_id)
+        if not found:
+            continue
+        _, saved = found
+        matches.append(SearchRecipe(
+            name=saved.name,
+            ingredients=saved.ingredients,
+            instructions=saved.instructions,
+            serving_size=saved.serving_size or '',
+            match_score=round(score, 4)
+        ))
+    return matches
 
 def search_web_recipes_simple(description: str) -> List[SearchRecipe]:
     """AI-powered recipe search - generates authentic recipes matching user description."""
@@ -108,8 +151,8 @@ Format example:
 
 Respond with ONLY the JSON array, no additional text."""
 
-        response = model.generate_content(query_prompt)
-        return format_multiple_recipes(response.text)
+        response_text = llm_client.generate_text(query_prompt, model_name=GENERATION_MODEL_NAME, task="recipe_generate")
+        return format_multiple_recipes(response_text)
         
     except Exception as e:
         print(f"Error generating complete recipes: {e}")
@@ -149,7 +192,7 @@ def format_multiple_recipes(raw_text):
 def save_search_result_to_file(recipe_data: dict, folder_id: str, user_id: str) -> bool:
     """Save a recipe from search results to user's collection by extracting from URL."""
     try:
-        from recipe_extractor import extract_recipe_from_url, save_recipe_to_file
+        from recipe_extractor import extract_recipe_from_url
         
         # Get the URL from recipe data
         recipe_url = recipe_data.get('url', '')
@@ -176,9 +219,8 @@ def save_search_result_to_file(recipe_data: dict, folder_id: str, user_id: str)
                     instructions=recipe_data.get('instructions', [])
                 )
         
-        # Create user-specific directory
-        user_recipe_dir = f"user_data/{user_id}/saved_recipes"
-        save_recipe_to_file(recipe, user_recipe_dir, folder_id)
+        from recipe_repository import get_recipe_repository
+        get_recipe_repository(user_id).save_recipe(recipe, folder_id)
         return True
         
     except Exception as e:
@@ -463,6 +463,42 @@ function initializeDateInputs() {
 }
 
 
+// Meal plans are generated as a background job; poll it until it finishes
+async function runMealPlanJob(payload) {
+    const response = await fetch('/api/meal-plan-jobs', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        credentials: 'same-origin',
+        body: JSON.stringify(payload)
+    });
+    const job = await response.json();
+    if (!response.ok) {
+        throw new Error(job.error || 'Failed to start meal plan');
+    }
+    
+    while (true) {
+        await new Promise(resolve => setTimeout(resolve, 1000));
+        
+        const statusResponse = await fetch(job.status_url, { credentials: 'same-origin' });
+        const status = await statusResponse.json();
+        if (!statusResponse.ok) {
+            throw new Error(status.error || 'Failed to check meal plan progress');
+        }
+        
+        if (status.status === 'completed') {
+            return status.result;
+        }
+        if (status.status === 'failed') {
+            throw new Error(status.error || 'Failed to generate meal plan');
+        }
+        
+        const subtitle = document.getElementById('loadingSubtitle');
+        if (subtitle && status.progress.total > 0) {
+            subtitle.textContent = `Parsed ${status.progress.parsed} of ${status.progress.total} ingredients...`;
+        }
+    }
+}
+
 async function createMealPlan() {
     const name = document.getElementById('mealPlanName').value.trim();
     const startDate = document.getElementById('startDate').value;
@@ -478,73 +514,61 @@ async function createMealPlan() {
     
     try {
         showLoading('Creating meal plan...', 'Generating grocery list from your recipes...');
-        const response = await fetch('/api/create-meal-plan', {
-            method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
-            credentials: 'same-origin',
-            body: JSON.stringify({
-                name: name,
-                start_date: startDate,
-                end_date: endDate,
-                recipes: selectedRecipeNames
-            })
+        const result = await runMealPlanJob({
+            name: name,
+            start_date: startDate,
+            end_date: endDate,
+            recipes: selectedRecipeNames
         });
         
-        const result = await response.json();
+        cleanupAllModals();
         
-        if (response.ok) {
-            cleanupAllModals();
-            
-            // Display the grocery list immediately
-            if (result.grocery_list) {
-                // First save the grocery list
-                try {
-                    const saveResponse = await fetch('/api/grocery-lists', {
-                        method: 'POST',
-                        headers: { 'Content-Type': 'application/json' },
-                        credentials: 'same-origin',
-                        body: JSON.stringify({
-                            name: `${result.meal_plan.join(', ')} (${result.date_range.start})`,
-                            groceryList: result.grocery_list,
-                            mealPlan: result.meal_plan,
-                            dateRange: result.date_range
-                        })
-                    });
+        // Display the grocery list immediately
+        if (result.grocery_list) {
+            // First save the grocery list
+            try {
+                const saveResponse = await fetch('/api/grocery-lists', {
+                    method: 'POST',
+                    headers: { 'Content-Type': 'application/json' },
+                    credentials: 'same-origin',
+                    body: JSON.stringify({
+                        name: `${result.meal_plan.join(', ')} (${result.date_range.start})`,
+                        groceryList: result.grocery_list,
+                        mealPlan: result.meal_plan,
+                        dateRange: result.date_range
+                    })
+                });
+                
+                if (saveResponse.ok) {
+                    showAlert('Meal plan created and saved successfully! Click "View Lists" to see it.', 'success');
                     
-                    if (saveResponse.ok) {
-                        showAlert('Meal plan created and saved successfully! Click "View Lists" to see it.', 'success');
-                        
-                        // Simple confirmation with the grocery list
-                        const groceryText = result.grocery_list.join('\n• ');
-                        const confirmText = `✅ MEAL PLAN CREATED!\n\n📅 ${result.meal_plan.join(', ')}\n📍 ${result.date_range.start} to ${result.date_range.end}\n\n🛒 GROCERY LIST (${result.grocery_list.length} items):\n• ${groceryText}\n\n✨ Your meal plan has been saved! Click "View Lists" to access it anytime.`;
-                        
-                        // Show in a proper alert that can't fail
-                        if (confirm(confirmText + '\n\nClick OK to continue, or Cancel to copy this list to clipboard.')) {
-                            // User clicked OK - just continue
-                        } else {
-                            // User clicked Cancel - copy to clipboard
-                            try {
-                                navigator.clipboard.writeText(confirmText);
-                                showAlert('Grocery list copied to clipboard!', 'info');
-                            } catch (e) {
-                                // Fallback if clipboard doesn't work
-                                prompt('Copy this grocery list:', confirmText);
-                            }
-                        }
+                    // Simple confirmation with the grocery list
+                    const groceryText = result.grocery_list.join('\n• ');
+                    const confirmText = `✅ MEAL PLAN CREATED!\n\n📅 ${result.meal_plan.join(', ')}\n📍 ${result.date_range.start} to ${result.date_range.end}\n\n🛒 GROCERY LIST (${result.grocery_list.length} items):\n• ${groceryText}\n\n✨ Your meal plan has been saved! Click "View Lists" to access it anytime.`;
+                    
+                    // Show in a proper alert that can't fail
+                    if (confirm(confirmText + '\n\nClick OK to continue, or Cancel to copy this list to clipboard.')) {
+                        // User clicked OK - just continue
                     } else {
-                        showAlert('Meal plan created but failed to save. Try again.', 'warning');
+                        // User clicked Cancel - copy to clipboard
+                        try {
+                            navigator.clipboard.writeText(confirmText);
+                            showAlert('Grocery list copied to clipboard!', 'info');
+                        } catch (e) {
+                            // Fallback if clipboard doesn't work
+                            prompt('Copy this grocery list:', confirmText);
+                        }
                     }
-                } catch (error) {
-                    showAlert('Error saving meal plan: ' + error.message, 'danger');
+                } else {
+                    showAlert('Meal plan created but failed to save. Try again.', 'warning');
                 }
+            } catch (error) {
+                showAlert('Error saving meal plan: ' + error.message, 'danger');
             }
-            
-            await loadFolders();
-            await loadRecipes();
-        } else {
-            cleanupAllModals();
-            throw new Error(result.error || 'Failed to create meal plan');
         }
+        
+        await loadFolders();
+        await loadRecipes();
     } catch (error) {
         cleanupAllModals();
         showAlert('Error creating meal plan: ' + error.message, 'danger');
@@ -1513,53 +1537,41 @@ async function generateMealPlan() {
     
     try {
         showLoading('Generating meal plan...', 'This may take a moment while we parse ingredients and create your grocery list.');
-        const response = await fetch('/api/create-meal-plan', {
-            method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
-            credentials: 'same-origin',
-            body: JSON.stringify({ 
-                recipes: selectedRecipes,
-                start_date: startDate,
-                end_date: endDate
-            })
+        const result = await runMealPlanJob({ 
+            recipes: selectedRecipes,
+            start_date: startDate,
+            end_date: endDate
         });
         
-        const result = await response.json();
-        
-        if (response.ok) {
-            cleanupAllModals();
-            displayGroceryList(result.grocery_list, result.meal_plan, result.date_range);
-            
-            // Automatically save the grocery list to the database
-            setTimeout(async () => {
-                try {
-                    const saveResponse = await fetch('/api/grocery-lists', {
-                        method: 'POST',
-                        headers: { 'Content-Type': 'application/json' },
-                        credentials: 'same-origin',
-                        body: JSON.stringify({
-                            groceryList: result.grocery_list,
-                            mealPlan: result.meal_plan,
-                            dateRange: result.date_range
-                        })
-                    });
-                    
-                    if (saveResponse.ok) {
-                        showAlert('Meal plan generated and grocery list saved successfully!', 'success');
-                    } else {
-                        showAlert('Meal plan generated! Click "Save List" to save for later viewing.', 'info');
-                    }
-                } catch (error) {
+        cleanupAllModals();
+        displayGroceryList(result.grocery_list, result.meal_plan, result.date_range);
+        
+        // Automatically save the grocery list to the database
+        setTimeout(async () => {
+            try {
+                const saveResponse = await fetch('/api/grocery-lists', {
+                    method: 'POST',
+                    headers: { 'Content-Type': 'application/json' },
+                    credentials: 'same-origin',
+                    body: JSON.stringify({
+                        groceryList: result.grocery_list,
+                        mealPlan: result.meal_plan,
+                        dateRange: result.date_range
+                    })
+                });
+                
+                if (saveResponse.ok) {
+                    showAlert('Meal plan generated and grocery list saved successfully!', 'success');
+                } else {
                     showAlert('Meal plan generated! Click "Save List" to save for later viewing.', 'info');
                 }
-                
-                // Update the current plan section on the main page
-                updateCurrentPlanDisplay(result.meal_plan, result.grocery_list, result.date_range);
-            }, 500);
-        } else {
-            cleanupAllModals();
-            throw new Error(result.error || 'Failed to generate meal plan');
-        }
+            } catch (error) {
+                showAlert('Meal plan generated! Click "Save List" to save for later viewing.', 'info');
+            }
+            
+            // Update the current plan section on the main page
+            updateCurrentPlanDisplay(result.meal_plan, result.grocery_list, result.date_range);
+        }, 500);
     } catch (error) {
         cleanupAllModals();
         showAlert('Error generating meal plan: ' + error.message, 'danger');
@@ -0,0 +1,229 @@
+"""
+Unit registry for MealMate's grocery-list consolidation.
+
+Units are registered with a type (weight, volume, spoon, ...), any number of
+aliases, and direct conversion factors between pairs of units. The registry
+computes the transitive closure of those factors up front, so converting
+between any two connected units, or to a type's canonical unit, is a single
+dictionary lookup. Adding a unit or factor rebuilds the closure; that only
+happens at import time in practice.
+"""
+
+import math
+import time
+import random
+from collections import defaultdict, deque
+from typing import Dict, Iterable, Optional, Tuple
+
+# Relative tolerance when checking that two conversion paths agree
+FACTOR_TOLERANCE = 1e-9
+
+
+class UnitRegistry:
+    """Units, aliases and the full table of conversion factors between them."""
+
+    def __init__(self):
+        self._unit_types: Dict[str, str] = {}
+        self._aliases: Dict[str, str] = {}
+        self._canonical_units: Dict[str, Optional[str]] = {}
+        self._edges: Dict[str, Dict[str, float]] = defaultdict(dict)
+        self._factors: Dict[Tuple[str, str], float] = {}
+        # name or alias -> (standard unit, canonical unit or None, factor to canonical)
+        self._lookup: Dict[str, Tuple[str, Optional[str], float]] = {}
+
+    @classmethod
+    def from_tables(cls, canonical_units: Dict[str, Optional[str]], unit_types: Dict[str, str],
+                    conversion_factors: Dict[str, Dict[str, float]], aliases: Dict[str, str]) -> "UnitRegistry":
+        """
+        Builds a registry from meal_planner-style tables: canonical unit per type,
+        unit -> type (aliases included), {from: {to: factor}} and alias -> unit.
+        """
+        registry = cls()
+        for unit_type, canonical in canonical_units.items():
+            registry._canonical_units[unit_type] = canonical
+        for unit, unit_type in unit_types.items():
+            if unit not in aliases:
+                registry._unit_types[unit] = unit_type
+        for alias, unit in aliases.items():
+            registry._aliases[alias] = unit
+        for from_unit, targets in conversion_factors.items():
+            for to_unit, factor in targets.items():
+                registry._add_edge(from_unit, to_unit, factor)
+        registry._rebuild()
+        return registry
+
+    def add_unit(self, unit: str, unit_type: str, aliases: Iterable[str] = (),
+                 conversions: Optional[Dict[str, float]] = None):
+        """
+        Registers a unit with its type, aliases and factors to existing units,
+        e.g. add_unit('quart', 'volume', ['qt'], {'cup': 4}).
+        Raises ValueError if the new factors contradict existing ones.
+        """
+        unit = unit.strip().lower()
+        snapshot = self._snapshot()
+        try:
+            self._unit_types[unit] = unit_type
+            for alias in aliases:
+                self._aliases[alias.strip().lower()] = unit
+            for to_unit, factor in (conversions or {}).items():
+                self._add_edge(unit, self.normalize(to_unit), factor)
+            self._rebuild()
+        except ValueError:
+            self._restore(snapshot)
+            raise
+
+    def add_conversion(self, from_unit: str, to_unit: str, factor: float):
+        """Adds a direct factor (1 from_unit = factor to_unit) and recomputes the closure."""
+        snapshot = self._snapshot()
+        try:
+            self._add_edge(self.normalize(from_unit), self.normalize(to_unit), factor)
+            self._rebuild()
+        except ValueError:
+            self._restore(snapshot)
+            raise
+
+    def set_canonical_unit(self, unit_type: str, unit: Optional[str]):
+        self._canonical_units[unit_type] = unit
+        self._rebuild()
+
+    def _snapshot(self):
+        return (dict(self._unit_types), dict(self._aliases),
+                {unit: dict(targets) for unit, targets in self._edges.items()})
+
+    def _restore(self, snapshot):
+        """Undoes a rejected change; the closure and lookup were not replaced yet."""
+        self._unit_types, self._aliases, edges = snapshot
+        self._edges = defaultdict(dict, edges)
+
+    def _add_edge(self, from_unit: str, to_unit: str, factor: float):
+        if factor <= 0:
+            raise ValueError(f"Conversion factor from {from_unit} to {to_unit} must be positive")
+        self._edges[from_unit][to_unit] = factor
+        self._edges[to_unit][from_unit] = 1 / factor
+
+    def _rebuild(self):
+        """Recomputes every pairwise factor and the per-name lookup table."""
+        factors: Dict[Tuple[str, str], float] = {}
+        for start in self._edges:
+            reached = {start: 1.0}
+            queue = deque([start])
+            while queue:
+                unit = queue.popleft()
+                for neighbour, step in self._edges[unit].items():
+                    factor = reached[unit] * step
+                    if neighbour not in reached:
+                        reached[neighbour] = factor
+                        queue.append(neighbour)
+                    elif not math.isclose(reached[neighbour], factor, rel_tol=FACTOR_TOLERANCE):
+                        raise ValueError(
+                            f"Inconsistent conversions from {start} to {neighbour}: "
+                            f"{reached[neighbour]} vs {factor}")
+            for unit, factor in reached.items():
+                factors[(start, unit)] = factor
+        self._factors = factors
+
+        lookup: Dict[str, Tuple[str, Optional[str], float]] = {}
+        for unit, unit_type in self._unit_types.items():
+            canonical = self._canonical_units.get(unit_type)
+            if canonical and (unit, canonical) in factors:
+                lookup[unit] = (unit, canonical, factors[(unit, canonical)])
+            else:
+                lookup[unit] = (unit, None, 1.0)
+        for alias, unit in self._aliases.items():
+            lookup[alias] = lookup.get(unit, (unit, None, 1.0))
+        self._lookup = lookup
+
+    def normalize(self, unit: str) -> str:
+        """Returns the standard name for a unit or alias ('lbs' -> 'pound'); unknown units are just lowercased."""
+        normalized = unit.strip().lower()
+        entry = self._lookup.get(normalized)
+        return entry[0] if entry else self._aliases.get(normalized, normalized)
+
+    def unit_type(self, unit: str) -> Optional[str]:
+        return self._unit_types.get(self.normalize(unit))
+
+    def factor(self, from_unit: str, to_unit: str) -> Optional[float]:
+        """Returns how many to_unit make one from_unit, or None if they don't convert."""
+        return self._factors.get((self.normalize(from_unit), self.normalize(to_unit)))
+
+    def convert(self, quantity: float, from_unit: str, to_unit: str) -> Optional[float]:
+        factor = self.factor(from_unit, to_unit)
+        return None if factor is None else quantity * factor
+
+    def to_canonical(self, quantity: float, unit: str) -> Tuple[float, str]:
+        """
+        Converts to the canonical unit of the unit's type. Units that are unknown
+        or have no path to their canonical unit come back normalized but unconverted.
+        """
+        normalized = unit.strip().lower()
+        entry = self._lookup.get(normalized)
+        if entry is None:
+            return quantity, normalized
+        standard, canonical, factor = entry
+        if canonical is None:
+            return quantity, standard
+        return quantity * factor, canonical
+
+    def check_round_trips(self, samples: int = 1000, seed: int = 0) -> int:
+        """
+        Converts random quantities between random connected pairs of units and back,
+        and through a third unit, checking the results agree. Returns the number of
+        checks run; raises AssertionError on the first mismatch.
+        """
+        rng = random.Random(seed)
+        pairs = list(self._factors)
+        checks = 0
+        for _ in range(samples):
+            from_unit, to_unit = rng.choice(pairs)
+            quantity = rng.uniform(0.001, 1000)
+            there = quantity * self._factors[(from_unit, to_unit)]
+            back = there * self._factors[(to_unit, from_unit)]
+            assert math.isclose(back, quantity, rel_tol=1e-9), (from_unit, to_unit, quantity, back)
+
+            via = rng.choice([unit for (start, unit) in pairs if start == to_unit])
+            direct = quantity * self._factors[(from_unit, via)]
+            chained = there * self._factors[(to_unit, via)]
+            assert math.isclose(direct, chained, rel_tol=1e-9), (from_unit, to_unit, via)
+            checks += 2
+
+        for alias in self._aliases:
+            assert self.normalize(alias) in self._unit_types, alias
+            checks += 1
+        return checks
+
+
+if __name__ == "__main__":
+    from meal_planner import (CANONICAL_UNITS, UNIT_CONVERSION_FACTORS, UNIT_TYPES_MAP,
+                              convert_to_canonical_unit, unit_registry)
+
+    def two_hop_convert(quantity: float, unit: str) -> Tuple[float, str]:
+        """The direct-or-inverse lookup convert_to_canonical_unit used before the registry."""
+        normalized_unit = unit.strip().lower()
+        unit_type = UNIT_TYPES_MAP.get(normalized_unit)
+        if not unit_type:
+            return quantity, normalized_unit
+        canonical_unit_name = CANONICAL_UNITS.get(unit_type)
+        if not canonical_unit_name or normalized_unit == canonical_unit_name:
+            return quantity, canonical_unit_name or normalized_unit
+        if canonical_unit_name in UNIT_CONVERSION_FACTORS.get(normalized_unit, {}):
+            return quantity * UNIT_CONVERSION_FACTORS[normalized_unit][canonical_unit_name], canonical_unit_name
+        if normalized_unit in UNIT_CONVERSION_FACTORS.get(canonical_unit_name, {}):
+            return quantity / UNIT_CONVERSION_FACTORS[canonical_unit_name][normalized_unit], canonical_unit_name
+        return quantity, normalized_unit
+
+    print(f"Round-trip checks passed: {unit_registry.check_round_trips()}")
+
+    units = list(UNIT_TYPES_MAP) + ['pinch of', 'bunch']
+    for unit in units:
+        old, new = two_hop_convert(1.0, unit), convert_to_canonical_unit(1.0, unit)
+        if old != new:
+            print(f"  {unit!r}: {old} -> {new}")
+
+    iterations = 20000
+    for label, convert in (("two-hop lookup", two_hop_convert), ("unit registry", convert_to_canonical_unit)):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            for unit in units:
+                convert(2.5, unit)
+        elapsed = time.perf_counter() - start
+        print(f"{label}: {elapsed / (iterations * len(units)) * 1e9:.0f} ns per conversion")